@@ -57,6 +57,36 @@ def start(host, port, workers, reload, api_key, deepgram_api_key):
     log.info("Starting VoiceCast server in foreground.")
     main_app(host, port, workers, api_key, deepgram_api_key)
 
+@cli.command()
+@click.option("--file", "phrases_file", default=settings.PREWARM_PHRASES_FILE, help="Phrase file, one phrase per line.")
+@click.option("--voice", default=None, help="Voice to render the phrases with. Defaults to DEEPGRAM_MODEL.")
+@click.option("--concurrency", default=settings.PREWARM_CONCURRENCY, help="Maximum concurrent TTS requests.")
+@click.option("--force", is_flag=True, default=False, help="Re-render phrases that are already cached.")
+@click.option("--deepgram-api-key", help="Deepgram API key.")
+def prewarm(phrases_file, voice, concurrency, force, deepgram_api_key):
+    """Render the phrase library and template fragments into the audio cache."""
+    import asyncio
+    from src.services.tts_service import TTSService
+    from src.services.prewarm_service import PrewarmService, load_phrases
+    from src.services.template_service import TemplateService
+
+    if deepgram_api_key:
+        settings.DEEPGRAM_API_KEY = deepgram_api_key
+
+    tts_service = TTSService(settings)
+    phrases = load_phrases(phrases_file) if phrases_file else []
+    fragments = TemplateService(tts_service, settings).fragment_texts()
+    if not phrases and not fragments:
+        raise click.UsageError("Nothing to prewarm. Use --file or set PREWARM_PHRASES_FILE or TEMPLATES_FILE.")
+
+    setup_logging(settings)
+    prewarm_service = PrewarmService(tts_service, settings)
+    result = asyncio.run(
+        prewarm_service.prewarm_library(phrases, fragments, voice=voice, concurrency=concurrency, force=force)
+    )
+    click.echo(f"Rendered {result['rendered']}, already cached {result['cached']}, failed {result['failed']}.")
+    if result["failed"]:
+        raise SystemExit(1)
 
 
 
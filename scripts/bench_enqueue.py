@@ -0,0 +1,82 @@
+"""Measure the per-request overhead of the POST /api/v1/tts enqueue path.
+
+The app is called in-process through httpx's ASGI transport, so the numbers
+cover routing, middleware, dependencies, authentication, validation and
+queueing, but no network or TTS work: device discovery is replaced by one
+fake device and queue processing is disabled.
+
+    python scripts/bench_enqueue.py --requests 5000
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import click
+import httpx
+import structlog
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.api.app import create_app  # noqa: E402
+from src.config.settings import Settings  # noqa: E402
+from src.services.device_registry import DeviceRegistry  # noqa: E402
+from src.services.fair_queue import FairQueue  # noqa: E402
+from src.services.queue_service import QueueService  # noqa: E402
+
+API_KEY = "bench-api-key"
+DEVICE_NAME = "Bench Speaker"
+
+async def _no_processing(self):
+    self.queue = FairQueue()
+    self.processing = False
+
+async def _discover_bench_device(self):
+    self._devices[DEVICE_NAME.lower()] = {"friendly_name": DEVICE_NAME, "host": "127.0.0.1", "port": 8009}
+
+async def run(requests: int, warmup: int) -> list:
+    # Settings read from the environment match the app settings
+    os.environ.update(API_KEY=API_KEY, DEEPGRAM_API_KEY="bench")
+    settings = Settings(
+        RATE_LIMIT_REQUESTS=10 ** 9,
+        AUDIO_OUTPUT_DIR=tempfile.mkdtemp(prefix="voicecast-bench-"),
+        PREWARM_ON_STARTUP=False,
+    )
+    app = create_app(settings, skip_logging=True, skip_watchdog=True)
+    body = {"text": "The washing machine has finished.", "device_name": DEVICE_NAME}
+    headers = {"X-API-Key": API_KEY}
+    transport = httpx.ASGITransport(app=app)
+    # The app state is set up by the real lifespan, only device discovery is replaced
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(warmup):
+            response = await client.post("/api/v1/tts", json=body, headers=headers)
+            response.raise_for_status()
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter_ns()
+            await client.post("/api/v1/tts", json=body, headers=headers)
+            timings.append((time.perf_counter_ns() - start) / 1000)
+    return timings
+
+@click.command()
+@click.option("--requests", default=2000, help="Number of measured requests.")
+@click.option("--warmup", default=200, help="Number of requests sent before measuring.")
+def main(requests: int, warmup: int):
+    # Only the cost of the request path is of interest, not log output
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    logging.disable(logging.WARNING)
+    QueueService._process_queue = _no_processing
+    DeviceRegistry.discover_devices = _discover_bench_device
+
+    timings = sorted(asyncio.run(run(requests, warmup)))
+    click.echo(f"requests: {requests}")
+    click.echo(f"mean:     {statistics.mean(timings):8.1f} us")
+    click.echo(f"p50:      {timings[len(timings) // 2]:8.1f} us")
+    click.echo(f"p99:      {timings[int(len(timings) * 0.99)]:8.1f} us")
+    click.echo(f"req/s:    {1_000_000 / statistics.mean(timings):8.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,25 @@
 import os
 from fastapi import FastAPI, Request, Depends
 from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
 from src.config.settings import Settings
-from src.api.routes import tts, health, admin, devices
+from src.api.routes import tts, health, admin, devices, tasks, ws
 from src.api.middleware import LoggingMiddleware
+from src.api.audio import create_audio_app
+from src.api.media_server import MediaServer
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
 from dotenv import load_dotenv
 import structlog # Import structlog
 from src.services.device_registry import DeviceRegistry
 from src.services.cast_service import CastService
 from src.services.watchdog_service import watchdog_loop
+from src.services.tts_service import TTSService
+from src.services.tts_backends import shutdown_process_pool
+from src.services.prewarm_service import PrewarmService, load_phrases
+from src.services.template_service import TemplateService
+from src.services.queue_service import QueueService
+from src.services.audio_janitor import AudioJanitor
+from src.services.rate_limiter import RateLimiter
+from src.services.idempotency import IdempotencyStore
 from contextlib import asynccontextmanager
 import asyncio
 
@@ -23,6 +28,11 @@ async def lifespan(app: FastAPI, settings: Settings, skip_watchdog: bool = False
     # Load the ML model
     app.state.device_registry = DeviceRegistry(settings)
     app.state.cast_service = CastService(settings)
+    app.state.tts_service = TTSService(settings)
+    app.state.template_service = TemplateService(app.state.tts_service, settings)
+    # One queue for the app, so tasks for a device are played in order and their status can be looked up
+    app.state.queue_service = QueueService(app.state.tts_service, app.state.cast_service, settings, app.state.template_service)
+    app.state.idempotency_store = IdempotencyStore(settings.IDEMPOTENCY_TTL, settings.IDEMPOTENCY_MAX_KEYS)
     await app.state.device_registry.discover_devices()
 
     # Start the watchdog service
@@ -31,12 +41,42 @@ async def lifespan(app: FastAPI, settings: Settings, skip_watchdog: bool = False
         watchdog_task = asyncio.create_task(watchdog_loop(app.state.device_registry, settings))
 
     log = structlog.get_logger(__name__)
+
+    # Serve audio from a dedicated listener
+    media_server = None
+    if settings.MEDIA_SERVER_ENABLED:
+        media_server = MediaServer(settings)
+        if await media_server.start():
+            app.state.queue_service.media_port = settings.MEDIA_PORT
+        else:
+            log.warning("Serving audio from the API server instead", port=settings.PORT)
+
+    # Delete old audio files in the background
+    janitor_task = asyncio.create_task(AudioJanitor(settings).run())
+
+    # Render the phrase library and template fragments into the audio cache in the background
+    prewarm_task = None
+    if settings.PREWARM_ON_STARTUP:
+        phrases = []
+        if settings.PREWARM_PHRASES_FILE:
+            try:
+                phrases = load_phrases(settings.PREWARM_PHRASES_FILE)
+            except OSError as e:
+                log.error("Could not load prewarm phrase file", path=settings.PREWARM_PHRASES_FILE, error=str(e))
+        fragments = app.state.template_service.fragment_texts()
+        if phrases or fragments:
+            prewarm_service = PrewarmService(app.state.tts_service, settings)
+            prewarm_task = asyncio.create_task(prewarm_service.prewarm_library(phrases, fragments))
     try:
         yield
     finally:
         # Clean up the ML model and release the resources
         app.state.device_registry = None
         app.state.cast_service = None
+        app.state.tts_service = None
+        app.state.template_service = None
+        app.state.queue_service = None
+        app.state.idempotency_store = None
 
         # Cancel the watchdog task
         if watchdog_task:
@@ -46,6 +86,25 @@ async def lifespan(app: FastAPI, settings: Settings, skip_watchdog: bool = False
             except asyncio.CancelledError:
                 log.info("Watchdog task cancelled.")
 
+        # Cancel the prewarm task if it is still running
+        if prewarm_task and not prewarm_task.done():
+            prewarm_task.cancel()
+            try:
+                await prewarm_task
+            except asyncio.CancelledError:
+                log.info("Prewarm task cancelled.")
+
+        janitor_task.cancel()
+        try:
+            await janitor_task
+        except asyncio.CancelledError:
+            log.info("Audio janitor task cancelled.")
+
+        if media_server:
+            await media_server.stop()
+
+        shutdown_process_pool()
+
 def create_app(settings: Settings, skip_logging: bool = False, skip_watchdog: bool = False) -> FastAPI:
     load_dotenv()
     if not skip_logging:
@@ -58,11 +117,6 @@ def create_app(settings: Settings, skip_logging: bool = False, skip_watchdog: bo
     log = structlog.get_logger(__name__) # Get logger after setup_logging is called
     log.info(f"Creating app with settings: {settings.model_dump_json()}")
 
-    limiter = Limiter(
-        key_func=get_remote_address,
-        default_limits=[f"{settings.RATE_LIMIT_REQUESTS} per {settings.RATE_LIMIT_WINDOW} seconds"]
-    )
-
     from src.api.security import verify_cloudflare_access
 
     app = FastAPI(
@@ -76,9 +130,7 @@ def create_app(settings: Settings, skip_logging: bool = False, skip_watchdog: bo
     )
 
     app.state.settings = settings
-    app.state.limiter = limiter
-    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-    app.add_middleware(SlowAPIMiddleware)
+    app.state.rate_limiter = RateLimiter(settings)
 
     @app.exception_handler(Exception)
     async def unhandled_exception_handler(request: Request, exc: Exception):
@@ -96,13 +148,19 @@ def create_app(settings: Settings, skip_logging: bool = False, skip_watchdog: bo
         allow_headers=["*"],
     )
 
-    app.add_middleware(LoggingMiddleware) # Use class-based middleware
+    app.add_middleware(
+        LoggingMiddleware,
+        sample_rate=settings.LOG_REQUEST_SAMPLE_RATE,
+        slow_request_ms=settings.LOG_SLOW_REQUEST_MS,
+    )
 
-    app.mount("/audio", StaticFiles(directory=settings.AUDIO_OUTPUT_DIR), name="audio")
+    app.mount("/audio", create_audio_app(settings), name="audio")
 
     app.include_router(tts.router, prefix="/api/v1", tags=["tts"])
     app.include_router(health.router, prefix="/api/v1", tags=["health"])
     app.include_router(admin.router, prefix="/api/v1", tags=["admin"])
     app.include_router(devices.router, prefix="/api/v1", tags=["devices"])
+    app.include_router(tasks.router, prefix="/api/v1", tags=["tasks"])
+    app.include_router(ws.router, prefix="/api/v1", tags=["tts"])
 
     return app
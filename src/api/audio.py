@@ -0,0 +1,122 @@
+import asyncio
+import mimetypes
+import os
+import re
+from typing import Optional, Tuple
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.routing import Route
+from src.config.settings import Settings
+from src.services.audio_store import DIGEST_LENGTH, AudioStore, HotAudio, audio_etag
+
+# Audio is served under a name with the digest of its content, so the content
+# behind a URL never changes and devices and proxies may cache it for as long
+# as they like.
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+AUDIO_MEDIA_TYPES = {"wav": "audio/wav", "mp3": "audio/mpeg"}
+# The cache key, the content digest and the extension of a served file
+AUDIO_NAME = re.compile(rf"([0-9a-f]{{64}})\.([0-9a-f]{{{DIGEST_LENGTH}}})\.([a-z0-9]+)")
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a Range header into a ``(start, end)`` slice of a ``size``-byte body.
+
+    Returns None when the whole body should be sent: for malformed headers
+    and, as allowed by RFC 9110, for requests with multiple ranges.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, sep, last = ranges.strip().partition("-")
+    if not sep or not (first + last).isdigit():
+        return None
+    if not first:
+        if int(last) == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - int(last)), size
+    start = int(first)
+    end = min(int(last) + 1, size) if last else size
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, end
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def create_audio_app(settings: Settings) -> Starlette:
+    """Create the ASGI app that serves stored audio to Cast devices.
+
+    Cast devices cannot authenticate, so the app is mounted outside the API
+    routers and only serves well-formed names made of a cache key and a
+    content digest. A name whose digest does not match the stored audio,
+    e.g. because it was rendered again since, is not found. Responses
+    carry a strong ETag and immutable caching headers; Range
+    requests are answered with 206. Recently written files are served from
+    the store's in-memory hot tier; files on disk are sent with the ASGI
+    ``pathsend`` extension where the server supports it, so they are not
+    copied through Python.
+    """
+    store = AudioStore(settings)
+
+    def serve_from_memory(request: Request, hot: HotAudio, headers: dict, media_type: Optional[str]) -> Response:
+        size = len(hot.data)
+        headers["Accept-Ranges"] = "bytes"
+        status_code, start, end = 200, 0, size
+        http_range = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if http_range and (if_range is None or if_range == hot.etag):
+            try:
+                byte_range = parse_range(http_range, size)
+            except RangeNotSatisfiable:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+            if byte_range:
+                start, end = byte_range
+                status_code = 206
+                headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        # The memoryview is only copied for partial responses
+        body = hot.data.obj if (start, end) == (0, size) else bytes(hot.data[start:end])
+        response = Response(body, status_code=status_code, headers=headers, media_type=media_type)
+        if request.method == "HEAD":
+            response.body = b""
+        return response
+
+    async def serve_audio(request: Request) -> Response:
+        shard, name = request.path_params["shard"], request.path_params["name"]
+        match = AUDIO_NAME.fullmatch(name)
+        if not match or name[:2] != shard:
+            return Response(status_code=404)
+        key, digest, extension = match.groups()
+        file_path = os.path.join(store.root, shard, f"{key}.{extension}")
+        if store.index.is_deleting(file_path):
+            return Response(status_code=404)
+        etag = audio_etag(digest)
+        hot = store.hot.get(file_path)
+        if hot is not None and hot.etag != etag:
+            # The file may have been rendered again by another worker process
+            hot = None
+        if hot is None:
+            try:
+                stat_result = os.stat(file_path)
+                known = store.digests.get(file_path, stat_result)
+                if (known or await asyncio.to_thread(store.digest, file_path)) != digest:
+                    return Response(status_code=404)
+            except FileNotFoundError:
+                return Response(status_code=404)
+
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        media_type = AUDIO_MEDIA_TYPES.get(extension) or mimetypes.guess_type(name)[0]
+        if hot is not None:
+            return serve_from_memory(request, hot, headers, media_type)
+        return FileResponse(file_path, headers=headers, media_type=media_type, stat_result=stat_result)
+
+    return Starlette(routes=[Route("/{shard}/{name}", serve_audio, methods=["GET", "HEAD"])])
@@ -2,21 +2,33 @@ from src.services.tts_service import TTSService
 from src.services.cast_service import CastService
 from src.services.queue_service import QueueService # Import QueueService
 from src.services.device_registry import DeviceRegistry
-from src.config.settings import Settings, get_settings
-from fastapi import Depends, Request
+from src.services.template_service import TemplateService
+from src.services.idempotency import IdempotencyStore
+from src.config.settings import Settings
+from fastapi import Request
+from starlette.requests import HTTPConnection
 
-def get_tts_service(settings: Settings = Depends(get_settings)) -> TTSService:
-    return TTSService(settings)
+# The dependencies are coroutines, so FastAPI resolves them on the event loop
+# instead of handing each one to the thread pool.
 
-def get_cast_service(request: Request) -> CastService:
+async def get_app_settings(connection: HTTPConnection) -> Settings:
+    # Also resolved for WebSocket connections, by the app-wide Cloudflare Access check
+    return connection.app.state.settings
+
+async def get_tts_service(request: Request) -> TTSService:
+    return request.app.state.tts_service
+
+async def get_cast_service(request: Request) -> CastService:
     return request.app.state.cast_service
 
-def get_queue_service(
-    tts_service: TTSService = Depends(get_tts_service),
-    cast_service: CastService = Depends(get_cast_service),
-    settings: Settings = Depends(get_settings)
-) -> QueueService:
-    return QueueService(tts_service, cast_service, settings)
+async def get_template_service(request: Request) -> TemplateService:
+    return request.app.state.template_service
 
-def get_device_registry(request: Request) -> DeviceRegistry:
+async def get_queue_service(request: Request) -> QueueService:
+    return request.app.state.queue_service
+
+async def get_device_registry(request: Request) -> DeviceRegistry:
     return request.app.state.device_registry
+
+async def get_idempotency_store(request: Request) -> IdempotencyStore:
+    return request.app.state.idempotency_store
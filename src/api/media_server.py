@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from typing import Optional
+import uvicorn
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from src.api.audio import create_audio_app
+from src.config.settings import Settings
+import structlog
+
+log = structlog.get_logger(__name__)
+
+class MediaServer:
+    """Serves audio to Cast devices from a dedicated listener.
+
+    The server runs its own event loop in a background thread, so large
+    audio downloads to several speakers do not compete with API requests
+    and the watchdog on the main loop. Audio keeps its ``/audio/...`` path,
+    only the port differs.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        app = Starlette(routes=[Mount("/audio", app=create_audio_app(settings))])
+        self.server = uvicorn.Server(uvicorn.Config(
+            app,
+            host=settings.MEDIA_HOST or settings.HOST,
+            port=settings.MEDIA_PORT,
+            limit_concurrency=settings.MEDIA_MAX_CONNECTIONS,
+            log_config=None,
+            access_log=False,
+        ))
+        self.thread: Optional[threading.Thread] = None
+
+    async def start(self, timeout: float = 5.0) -> bool:
+        """Start the server and wait until it accepts connections."""
+        self.thread = threading.Thread(target=self._run, name="media-server", daemon=True)
+        self.thread.start()
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or asyncio.get_running_loop().time() > deadline:
+                log.error("Media server failed to start", port=self.settings.MEDIA_PORT)
+                return False
+            await asyncio.sleep(0.05)
+        log.info("Media server started", port=self.settings.MEDIA_PORT)
+        return True
+
+    def _run(self):
+        try:
+            self.server.run()
+        except SystemExit:
+            # uvicorn exits when it cannot bind; start() reports the failure
+            pass
+
+    async def stop(self):
+        if self.thread is None:
+            return
+        self.server.should_exit = True
+        await asyncio.to_thread(self.thread.join, 5.0)
+        self.thread = None
+        log.info("Media server stopped.")
@@ -1,13 +1,61 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+import random
 import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import structlog # Import structlog
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        log = structlog.get_logger(__name__) # Get logger after setup_logging is called
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        log.info(f"Request: {request.method} {request.url} - Response: {response.status_code} in {process_time:.2f}ms")
-        return response
\ No newline at end of file
+log = structlog.get_logger(__name__)
+
+class LoggingMiddleware:
+    """Log the method, path, status and duration of HTTP requests.
+
+    A pure ASGI middleware, so requests are not buffered or run in an extra
+    task. Successful requests are logged with probability ``sample_rate``;
+    requests slower than ``slow_request_ms``, error responses and requests
+    that raise are always logged.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = 1.0, slow_request_ms: float = 1000.0):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter_ns()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            self._log(scope, status_code, start, failed=True)
+            raise
+        self._log(scope, status_code, start)
+
+    def _log(self, scope: Scope, status_code: int, start: int, failed: bool = False):
+        duration_ms = (time.perf_counter_ns() - start) / 1_000_000
+        slow = duration_ms >= self.slow_request_ms
+        if failed or status_code >= 500:
+            method = log.error
+        elif slow or status_code >= 400:
+            method = log.warning
+        elif self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+            method = log.info
+        else:
+            return
+        method(
+            "Request",
+            method=scope["method"],
+            path=scope["path"],
+            status_code=status_code,
+            duration_ms=round(duration_ms, 2),
+            slow=slow,
+        )
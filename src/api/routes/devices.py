@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, Request
-from src.api.security import get_api_key
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from src.api.dependencies import get_app_settings, get_device_registry, get_queue_service
+from src.api.security import rate_limit
+from src.config.settings import Settings
 from src.services.device_registry import DeviceRegistry
+from src.services.queue_service import QueueService
+from src.services.rate_limiter import ApiKey
 
-router = APIRouter(dependencies=[Depends(get_api_key)])
+router = APIRouter(dependencies=[Depends(rate_limit)])
 
 @router.get("/devices")
 async def get_devices(request: Request):
@@ -14,3 +18,26 @@ async def refresh_devices(request: Request):
     device_registry: DeviceRegistry = request.app.state.device_registry
     await device_registry.refresh_devices()
     return {"message": "Device discovery refresh triggered."}
+
+@router.post("/devices/{device_name}/replay")
+async def replay_device(
+    device_name: str,
+    request: Request,
+    count: int = Query(1, ge=1),
+    queue_service: QueueService = Depends(get_queue_service),
+    settings: Settings = Depends(get_app_settings),
+    device_registry: DeviceRegistry = Depends(get_device_registry),
+    api_key: ApiKey = Depends(rate_limit),
+):
+    """Play the last ``count`` announcements of a device again, from the audio store."""
+    if count > settings.REPLAY_HISTORY_SIZE:
+        raise HTTPException(status_code=422, detail={"error": "Too many announcements to replay", "max_count": settings.REPLAY_HISTORY_SIZE})
+    device = device_registry.get_device_by_name(device_name)
+    if not device:
+        raise HTTPException(status_code=404, detail={"error": "No device available with the given device name"})
+
+    port = request.url.port or settings.PORT
+    task_ids = queue_service.replay_device(device["friendly_name"], count, port, api_key.name, api_key.weight)
+    if not task_ids:
+        raise HTTPException(status_code=404, detail={"error": "No announcements to replay"})
+    return {"message": f"{len(task_ids)} announcements queued for replay", "task_ids": task_ids}
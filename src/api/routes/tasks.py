@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from src.api.dependencies import get_app_settings, get_queue_service
+from src.api.security import rate_limit
+from src.config.settings import Settings
+from src.services.queue_service import QueueService
+from src.services.rate_limiter import ApiKey
+from typing import Optional
+
+router = APIRouter(dependencies=[Depends(rate_limit)])
+
+@router.get("/tasks/{task_id}")
+async def get_task(task_id: str, queue_service: QueueService = Depends(get_queue_service), api_key: ApiKey = Depends(rate_limit)):
+    """Return the status of a queued or recently finished announcement of the caller."""
+    task = queue_service.get_task(task_id, api_key.name)
+    if not task:
+        raise HTTPException(status_code=404, detail={"error": "No task available with the given ID"})
+    return task
+
+@router.post("/tasks/{task_id}/replay")
+async def replay_task(
+    task_id: str,
+    request: Request,
+    queue_service: QueueService = Depends(get_queue_service),
+    settings: Settings = Depends(get_app_settings),
+    api_key: ApiKey = Depends(rate_limit),
+):
+    """Play a recent announcement again on its devices, from the audio store."""
+    replay_id = queue_service.replay_task(task_id, request.url.port or settings.PORT, api_key.name, api_key.weight)
+    if not replay_id:
+        raise HTTPException(status_code=404, detail={"error": "No played announcement with the given ID"})
+    return {"message": "Announcement queued for replay", "task_id": replay_id}
+
+@router.delete("/tasks/{task_id}")
+async def cancel_task(task_id: str, queue_service: QueueService = Depends(get_queue_service), api_key: ApiKey = Depends(rate_limit)):
+    """Cancel a scheduled or queued announcement of the caller, or one that is not playing yet."""
+    if queue_service.cancel(task_id, api_key.name):
+        return queue_service.get_task(task_id, api_key.name)
+    task = queue_service.get_task(task_id, api_key.name)
+    if not task:
+        raise HTTPException(status_code=404, detail={"error": "No task available with the given ID"})
+    raise HTTPException(status_code=409, detail={"error": "Task can no longer be cancelled", "status": task["status"]})
+
+@router.delete("/tasks")
+async def purge_tasks(
+    device_name: Optional[str] = None,
+    tag: Optional[str] = None,
+    queue_service: QueueService = Depends(get_queue_service),
+    api_key: ApiKey = Depends(rate_limit),
+):
+    """Cancel all pending announcements of the caller for a device and/or with a tag."""
+    if device_name is None and tag is None:
+        raise HTTPException(status_code=422, detail={"error": "Set device_name or tag"})
+    task_ids = queue_service.purge(device_name=device_name, tag=tag, tenant=api_key.name)
+    return {"message": f"{len(task_ids)} tasks cancelled", "task_ids": task_ids}
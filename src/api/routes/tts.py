@@ -1,41 +1,272 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from src.models.requests import TTSRequest
-from src.api.dependencies import get_queue_service, get_device_registry
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from src.models.requests import TTSBatchRequest, TTSRequest, TemplateTTSRequest
+from src.api.dependencies import get_app_settings, get_queue_service, get_device_registry, get_template_service, get_idempotency_store
 from src.services.queue_service import QueueService
-from src.config.settings import Settings, get_settings
+from src.services.template_service import TemplateService
+from pydantic import ValidationError
+from src.config.settings import Settings
 from src.services.device_registry import DeviceRegistry
-from src.api.security import get_api_key
+from src.services.idempotency import IdempotencyStore, request_fingerprint
+from src.services.rate_limiter import ApiKey, RateLimiter
+from src.api.security import enforce_limits, get_rate_limiter, rate_limit
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+import asyncio
 import structlog # Import structlog
+import time
 
-router = APIRouter(dependencies=[Depends(get_api_key)])
+router = APIRouter(dependencies=[Depends(rate_limit)])
+log = structlog.get_logger(__name__)
+
+def resolve_device_name(device_name: str, device_registry: DeviceRegistry) -> str:
+    """Return the friendly name of the requested device, which its queue lane is keyed on."""
+    device = device_registry.get_device_by_name(device_name)
+    if not device:
+        raise HTTPException(status_code=404, detail={"error": "No device available with the given device name"})
+    return device["friendly_name"]
+
+def resolve_device_names(device_names: List[str], device_registry: DeviceRegistry) -> List[str]:
+    """Return the friendly names of the requested devices, in request order and without duplicates."""
+    devices = {name: device_registry.get_device_by_name(name) for name in device_names}
+    missing = [name for name, device in devices.items() if not device]
+    if missing:
+        raise HTTPException(status_code=404, detail={"error": "No device available with the given device name", "devices": missing})
+    return list(dict.fromkeys(device["friendly_name"] for device in devices.values()))
+
+@asynccontextmanager
+async def reserve_idempotency_key(
+    idempotency_store: IdempotencyStore,
+    api_key: ApiKey,
+    idempotency_key: Optional[str],
+    fingerprint: bytes,
+    response: Response,
+) -> AsyncIterator[Optional[str]]:
+    """Hold the ``Idempotency-Key`` of a request while it is being queued.
+
+    Yields the task ID of an earlier request with the same key, if there is
+    one. Retries that arrive while the first request is still being queued
+    wait for its task ID; if it fails, its key is released and the next
+    retry is queued instead. Keys are scoped to the API key. Reusing a key
+    for a different request is rejected with a 422.
+    """
+    if not idempotency_key:
+        yield None
+        return
+    key = (api_key.name, idempotency_key)
+    while True:
+        result = idempotency_store.get(key)
+        if result is not None:
+            if result.fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail={"error": "Idempotency key was already used for a different request"})
+            response.headers["Idempotent-Replayed"] = "true"
+            yield result.task_id
+            return
+        pending = idempotency_store.reserve(key, fingerprint)
+        if pending is None:
+            break
+        if pending.fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail={"error": "Idempotency key was already used for a different request"})
+        # Shielded, so a retry that gives up does not fail the request it waits for
+        await asyncio.shield(pending.done)
+    try:
+        yield None
+    finally:
+        idempotency_store.release(key)
+
+def ensure_schedule_capacity(tasks: List[dict], queue_service: QueueService, settings: Settings):
+    """Refuse scheduled tasks once SCHEDULE_MAX_PENDING tasks are waiting for their delivery time."""
+    scheduled = sum(1 for task in tasks if "deliver_at" in task)
+    if scheduled and len(queue_service.scheduler) + scheduled > settings.SCHEDULE_MAX_PENDING:
+        raise HTTPException(status_code=503, detail={"error": "Too many scheduled announcements", "max_pending": settings.SCHEDULE_MAX_PENDING})
+
+def build_tts_task(
+    tts_request: TTSRequest,
+    port: int,
+    settings: Settings,
+    device_registry: DeviceRegistry,
+    api_key: Optional[ApiKey] = None,
+) -> dict:
+    """Validate the target devices of a TTS request and return its queue task.
+
+    The task is queued as a task of ``api_key``, which shares the queue
+    fairly with the other API keys. A request with ``deliver_at`` or
+    ``delay`` becomes a scheduled task, unless its time has already come.
+    """
+    if not tts_request.voice:
+        tts_request.voice = settings.DEEPGRAM_MODEL
+
+    now = time.time()
+    if tts_request.deliver_at is not None:
+        deliver_at = tts_request.deliver_at.timestamp()
+    else:
+        deliver_at = now + (tts_request.delay or 0)
+    if deliver_at - now > settings.SCHEDULE_MAX_DELAY:
+        raise HTTPException(status_code=422, detail={"error": "Delivery time is too far in the future", "max_delay": settings.SCHEDULE_MAX_DELAY})
+
+    if tts_request.device_name:
+        tts_request.device_name = resolve_device_name(tts_request.device_name, device_registry)
+
+    task = {"tts_request": tts_request, "port": port}
+    if deliver_at > now:
+        task["deliver_at"] = deliver_at
+    if tts_request.tags:
+        task["tags"] = tts_request.tags
+    if api_key:
+        task.update(tenant=api_key.name, weight=api_key.weight)
+    if tts_request.device_names:
+        task["device_names"] = resolve_device_names(tts_request.device_names, device_registry)
+    return task
 
 @router.post("/tts")
 async def text_to_speech(
     request: Request,
+    response: Response,
     tts_request: TTSRequest,
     queue_service: QueueService = Depends(get_queue_service),
-    settings: Settings = Depends(get_settings),
+    settings: Settings = Depends(get_app_settings),
     device_registry: DeviceRegistry = Depends(get_device_registry),
+    api_key: ApiKey = Depends(rate_limit),
+    limiter: RateLimiter = Depends(get_rate_limiter),
+    idempotency_store: IdempotencyStore = Depends(get_idempotency_store),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
 ):
-    """Receive text and generate speech, then cast to a device."""
-    log = structlog.get_logger(__name__) # Get logger after setup_logging is called
+    """Receive text and generate speech, then cast to a device.
 
-    if not tts_request.voice:
-        tts_request.voice = settings.DEEPGRAM_MODEL
+    A retry with the same ``Idempotency-Key`` header returns the task ID of
+    the first request instead of queueing the announcement again.
+    """
+    task = build_tts_task(tts_request, request.url.port or settings.PORT, settings, device_registry, api_key)
+    fingerprint = request_fingerprint(tts_request.model_dump_json())
+    async with reserve_idempotency_key(idempotency_store, api_key, idempotency_key, fingerprint, response) as task_id:
+        if task_id:
+            log.info("Replaying idempotent TTS request", task_id=task_id)
+            return {"message": "TTS request added to queue", "task_id": task_id}
+        ensure_schedule_capacity([task], queue_service, settings)
+        await enforce_limits(limiter, api_key, response, tokens=0, units=1)
 
-    if tts_request.device_name and not device_registry.get_device_by_name(tts_request.device_name):
-        raise HTTPException(status_code=404, detail={"error": "No device available with the given device name"})
+        try:
+            log.info("Received TTS request", text=tts_request.text)
+            task_id = queue_service.add_to_queue(task)
+            if idempotency_key:
+                idempotency_store.put((api_key.name, idempotency_key), fingerprint, task_id)
+
+            return {"message": "TTS request added to queue", "task_id": task_id}
+        except Exception as e:
+            log.error("Error adding TTS request to queue", error=repr(e))
+            raise HTTPException(status_code=500, detail="An error occurred while adding request to queue.")
+
+
+@router.post("/tts/batch")
+async def batch_text_to_speech(
+    request: Request,
+    response: Response,
+    batch_request: TTSBatchRequest,
+    queue_service: QueueService = Depends(get_queue_service),
+    settings: Settings = Depends(get_app_settings),
+    device_registry: DeviceRegistry = Depends(get_device_registry),
+    api_key: ApiKey = Depends(rate_limit),
+    limiter: RateLimiter = Depends(get_rate_limiter),
+):
+    """Queue several announcements with one request.
+
+    Every item is validated on its own; the result lists a task ID or the
+    errors for each item, in request order.
+    """
+    if len(batch_request.items) > settings.TTS_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail={"error": "Too many items in batch", "max_items": settings.TTS_BATCH_MAX_ITEMS})
+
+    port = request.url.port or settings.PORT
+    results = []
+    tasks = []
+    for index, item in enumerate(batch_request.items):
+        try:
+            task = build_tts_task(TTSRequest.model_validate(item), port, settings, device_registry, api_key)
+        except ValidationError as e:
+            results.append({"index": index, "error": "Invalid TTS request", "errors": e.errors(include_url=False)})
+            continue
+        except HTTPException as e:
+            results.append({"index": index, **e.detail})
+            continue
+        results.append({"index": index})
+        tasks.append(task)
+    if tasks:
+        ensure_schedule_capacity(tasks, queue_service, settings)
+        await enforce_limits(limiter, api_key, response, tokens=0, units=len(tasks))
 
     try:
-        log.info("Received TTS request", text=tts_request.text)
-        
-        task = {
-            "tts_request": tts_request,
-            "port": request.url.port or settings.PORT,
-        }
-        task_id = queue_service.add_to_queue(task)
-
-        return {"message": "TTS request added to queue", "task_id": task_id}
+        log.info("Received TTS batch request", items=len(batch_request.items), queued=len(tasks))
+        task_ids = iter(queue_service.add_batch(tasks) if tasks else [])
     except Exception as e:
-        log.error("Error adding TTS request to queue", error=repr(e))
+        log.error("Error adding TTS batch request to queue", error=repr(e))
         raise HTTPException(status_code=500, detail="An error occurred while adding request to queue.")
+
+    for result in results:
+        if "error" not in result:
+            result["task_id"] = next(task_ids)
+    return {"message": f"{len(tasks)} of {len(results)} TTS requests added to queue", "results": results}
+
+
+@router.post("/tts/template")
+async def template_to_speech(
+    request: Request,
+    response: Response,
+    template_request: TemplateTTSRequest,
+    queue_service: QueueService = Depends(get_queue_service),
+    template_service: TemplateService = Depends(get_template_service),
+    settings: Settings = Depends(get_app_settings),
+    device_registry: DeviceRegistry = Depends(get_device_registry),
+    api_key: ApiKey = Depends(rate_limit),
+    limiter: RateLimiter = Depends(get_rate_limiter),
+    idempotency_store: IdempotencyStore = Depends(get_idempotency_store),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+):
+    """Compose a templated announcement from cached fragments, then cast it to a device."""
+    fingerprint = request_fingerprint(template_request.model_dump_json())
+    async with reserve_idempotency_key(idempotency_store, api_key, idempotency_key, fingerprint, response) as task_id:
+        if task_id:
+            log.info("Replaying idempotent template TTS request", task_id=task_id)
+            return {"message": "TTS request added to queue", "task_id": task_id}
+
+        template = template_service.get_template(template_request.template)
+        if not template:
+            raise HTTPException(status_code=404, detail={"error": "No template available with the given name"})
+
+        missing_slots = template.missing_slots(template_request.slots)
+        if missing_slots:
+            raise HTTPException(status_code=422, detail={"error": "Missing template slots", "slots": missing_slots})
+
+        device_name = resolve_device_name(template_request.device_name, device_registry) if template_request.device_name else None
+        device_names = resolve_device_names(template_request.device_names, device_registry) if template_request.device_names else None
+
+        try:
+            tts_request = TTSRequest(
+                text=template.render(template_request.slots),
+                voice=template_request.voice or settings.DEEPGRAM_MODEL,
+                device_name=device_name,
+            )
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail={"error": "Rendered template is not a valid TTS request", "errors": e.errors(include_url=False)})
+        await enforce_limits(limiter, api_key, response, tokens=0, units=1)
+
+        try:
+            log.info("Received template TTS request", template=template_request.template, slots=template_request.slots)
+
+            task = {
+                "tts_request": tts_request,
+                "template": template_request,
+                "port": request.url.port or settings.PORT,
+                "tenant": api_key.name,
+                "weight": api_key.weight,
+            }
+            if device_names:
+                task["device_names"] = device_names
+            if template_request.tags:
+                task["tags"] = template_request.tags
+            task_id = queue_service.add_to_queue(task)
+            if idempotency_key:
+                idempotency_store.put((api_key.name, idempotency_key), fingerprint, task_id)
+
+            return {"message": "TTS request added to queue", "task_id": task_id}
+        except Exception as e:
+            log.error("Error adding template TTS request to queue", error=repr(e))
+            raise HTTPException(status_code=500, detail="An error occurred while adding request to queue.")
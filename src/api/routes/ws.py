@@ -0,0 +1,144 @@
+import asyncio
+import json
+from typing import Optional, Set
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from src.api.routes.tts import build_tts_task, ensure_schedule_capacity
+from src.models.requests import TTSRequest
+from src.services.rate_limiter import ApiKey
+import structlog
+
+router = APIRouter()
+log = structlog.get_logger(__name__)
+
+# Task statuses after which a task no longer counts against the pending limit
+FINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+class SubmissionChannel:
+    """Serves the TTS submissions of one WebSocket connection.
+
+    Every submission is answered with an ack carrying its task ID, or with
+    an error, and counts against the rate limit and daily quota of the
+    connection's API key. Status changes of the tasks submitted on the
+    connection are sent as events. Submissions are refused while
+    WS_MAX_PENDING_TASKS of the connection's tasks have not finished, and a
+    client that does not read its messages is disconnected once
+    WS_SEND_QUEUE_SIZE messages are waiting to be sent.
+    """
+
+    def __init__(self, websocket: WebSocket, api_key: ApiKey):
+        state = websocket.app.state
+        self.websocket = websocket
+        self.api_key = api_key
+        self.limiter = state.rate_limiter
+        self.settings = state.settings
+        self.queue_service = state.queue_service
+        self.device_registry = state.device_registry
+        self.port = websocket.url.port or self.settings.PORT
+        self.pending: Set[str] = set()
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=self.settings.WS_SEND_QUEUE_SIZE)
+        self.overflowed = asyncio.Event()
+
+    async def serve(self):
+        self.queue_service.add_listener(self.on_status)
+        sender = asyncio.create_task(self._send_messages())
+        receiver = asyncio.create_task(self._receive_messages())
+        overflow = asyncio.create_task(self.overflowed.wait())
+        for task in (sender, receiver):
+            task.add_done_callback(self._task_done)
+        try:
+            await asyncio.wait({sender, receiver, overflow}, return_when=asyncio.FIRST_COMPLETED)
+            if self.overflowed.is_set():
+                log.warning("Closing WebSocket of a client that does not keep up", pending=len(self.pending))
+                await self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        finally:
+            self.queue_service.remove_listener(self.on_status)
+            for task in (sender, receiver, overflow):
+                task.cancel()
+
+    @staticmethod
+    def _task_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            log.error("WebSocket channel failed", task=task.get_coro().__qualname__, error=repr(task.exception()))
+
+    def on_status(self, task_status: dict):
+        task_id = task_status["task_id"]
+        if task_id not in self.pending:
+            return
+        if task_status["status"] in FINAL_STATUSES:
+            self.pending.discard(task_id)
+        self._send({"type": "status", **task_status})
+
+    def _send(self, message: dict):
+        try:
+            self.outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed.set()
+
+    async def _send_messages(self):
+        try:
+            while True:
+                await self.websocket.send_json(await self.outbox.get())
+        except (WebSocketDisconnect, RuntimeError):
+            # The client went away; the receiver sees the disconnect as well
+            pass
+
+    async def _receive_messages(self):
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("text") is None:
+                await self.websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+                return
+            try:
+                await self._submit(message["text"])
+            except Exception as e:
+                log.error("Error handling WebSocket message", error=repr(e))
+                self._send({"type": "error", "error": "An error occurred while handling the message."})
+
+    async def _submit(self, text: str):
+        try:
+            message = json.loads(text)
+        except ValueError:
+            self._send({"type": "error", "error": "Message is not valid JSON"})
+            return
+        if not isinstance(message, dict) or message.get("type") != "tts":
+            self._send({"type": "error", "error": "Unknown message type"})
+            return
+        reference: Optional[str] = message.pop("id", None)
+        message.pop("type")
+        reply = {"id": reference} if reference is not None else {}
+
+        if len(self.pending) >= self.settings.WS_MAX_PENDING_TASKS:
+            self._send({"type": "error", **reply, "error": "Too many pending tasks", "max_pending": self.settings.WS_MAX_PENDING_TASKS})
+            return
+        try:
+            task = build_tts_task(TTSRequest.model_validate(message), self.port, self.settings, self.device_registry, self.api_key)
+            ensure_schedule_capacity([task], self.queue_service, self.settings)
+        except ValidationError as e:
+            self._send({"type": "error", **reply, "error": "Invalid TTS request", "errors": e.errors(include_url=False)})
+            return
+        except HTTPException as e:
+            self._send({"type": "error", **reply, **e.detail})
+            return
+        decision = await self.limiter.acquire(self.api_key, tokens=1, units=1)
+        if not decision.allowed:
+            error = {"quota": "Daily quota exceeded", "busy": "Rate limiter is busy"}.get(decision.reason, "Rate limit exceeded")
+            self._send({"type": "error", **reply, "error": error, "retry_after": round(decision.retry_after, 3)})
+            return
+
+        task_id = self.queue_service.add_to_queue(task)
+        # The ack stands in for the queued status, which was set before the task ID was known
+        self.pending.add(task_id)
+        self._send({"type": "ack", **reply, "task_id": task_id})
+
+@router.websocket("/ws")
+async def submission_channel(websocket: WebSocket):
+    """Stream TTS submissions and task status events over one connection."""
+    api_key = websocket.app.state.rate_limiter.authenticate(websocket.headers.get("x-api-key"))
+    if api_key is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    await SubmissionChannel(websocket, api_key).serve()
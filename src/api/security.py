@@ -1,39 +1,71 @@
-from fastapi import Security, HTTPException, Depends, Request
+from fastapi import Security, HTTPException, Depends, Response
 from fastapi.security.api_key import APIKeyHeader
-from starlette.status import HTTP_403_FORBIDDEN
-from src.config.settings import Settings, get_settings
-import structlog # Import structlog
+from starlette.requests import HTTPConnection
+from starlette.status import HTTP_403_FORBIDDEN, HTTP_429_TOO_MANY_REQUESTS, HTTP_503_SERVICE_UNAVAILABLE
+from src.api.dependencies import get_app_settings
+from src.config.settings import Settings
+from src.services.rate_limiter import ApiKey, RateLimiter
 import secrets
 
 API_KEY_HEADER = APIKeyHeader(name="X-API-Key", auto_error=False)
-CF_CLIENT_ID_HEADER = APIKeyHeader(name="CF-Access-Client-Id", auto_error=False)
-CF_CLIENT_SECRET_HEADER = APIKeyHeader(name="CF-Access-Client-Secret", auto_error=False)
-
-async def get_api_key(settings: Settings = Depends(get_settings), api_key_header: str = Security(API_KEY_HEADER)):
-    log = structlog.get_logger(__name__) # Get logger after setup_logging is called
-    log.info(f"API Key from settings: {settings.API_KEY}")
-    log.info(f"API Key from header: {api_key_header}")
-    if not api_key_header or not secrets.compare_digest(api_key_header, settings.API_KEY):
+
+def credentials_match(given: str, expected: str) -> bool:
+    """Compare credentials in constant time.
+
+    The values are compared as bytes, as ``secrets.compare_digest`` rejects
+    non-ASCII strings.
+    """
+    return secrets.compare_digest(given.encode(), expected.encode())
+
+async def get_rate_limiter(connection: HTTPConnection) -> RateLimiter:
+    return connection.app.state.rate_limiter
+
+async def get_api_key(limiter: RateLimiter = Depends(get_rate_limiter), api_key_header: str = Security(API_KEY_HEADER)) -> ApiKey:
+    api_key = limiter.authenticate(api_key_header)
+    if api_key is None:
         raise HTTPException(
             status_code=HTTP_403_FORBIDDEN, detail="Could not validate credentials"
         )
-    return api_key_header
-
-async def verify_cloudflare_access(
-    request: Request,
-    settings: Settings = Depends(get_settings),
-    cf_client_id: str = Security(CF_CLIENT_ID_HEADER),
-    cf_client_secret: str = Security(CF_CLIENT_SECRET_HEADER),
-):
-    log = structlog.get_logger(__name__)
+    return api_key
+
+async def enforce_limits(limiter: RateLimiter, api_key: ApiKey, response: Response, tokens: int = 1, units: int = 0):
+    """Charge a request against the key's rate limit and daily quota.
+
+    Sets the remaining-quota headers on ``response``; raises a 429 when the
+    key is over its limit, and a 503 when the limits cannot be checked.
+    """
+    decision = await limiter.acquire(api_key, tokens, units)
+    headers = limiter.headers(api_key, decision)
+    if decision.reason == "busy":
+        raise HTTPException(status_code=HTTP_503_SERVICE_UNAVAILABLE, detail={"error": "Rate limiter is busy"}, headers=headers)
+    if not decision.allowed:
+        error = "Daily quota exceeded" if decision.reason == "quota" else "Rate limit exceeded"
+        raise HTTPException(status_code=HTTP_429_TOO_MANY_REQUESTS, detail={"error": error}, headers=headers)
+    response.headers.update(headers)
+
+async def rate_limit(
+    response: Response,
+    limiter: RateLimiter = Depends(get_rate_limiter),
+    api_key: ApiKey = Depends(get_api_key),
+) -> ApiKey:
+    """Authenticate the request and charge it against the key's rate limit."""
+    await enforce_limits(limiter, api_key, response)
+    return api_key
+
+async def verify_cloudflare_access(connection: HTTPConnection, settings: Settings = Depends(get_app_settings)):
+    # The headers are read from the connection, as this check also guards WebSocket routes
     if settings.CLOUDFLARE_ACCESS_CLIENT_ID and settings.CLOUDFLARE_ACCESS_CLIENT_SECRET:
-        log.info("Cloudflare Access verification enabled.")
+        cf_client_id = connection.headers.get("cf-access-client-id")
+        cf_client_secret = connection.headers.get("cf-access-client-secret")
         if not cf_client_id or not cf_client_secret:
             raise HTTPException(
                 status_code=HTTP_403_FORBIDDEN, detail="Missing Cloudflare Access headers"
             )
-        if cf_client_id != settings.CLOUDFLARE_ACCESS_CLIENT_ID or cf_client_secret != settings.CLOUDFLARE_ACCESS_CLIENT_SECRET:
+        # Check both values, so the response time does not tell which one is wrong
+        id_matches = credentials_match(cf_client_id, settings.CLOUDFLARE_ACCESS_CLIENT_ID)
+        secret_matches = credentials_match(cf_client_secret, settings.CLOUDFLARE_ACCESS_CLIENT_SECRET)
+        if not (id_matches and secret_matches):
             raise HTTPException(
                 status_code=HTTP_403_FORBIDDEN, detail="Invalid Cloudflare Access credentials"
             )
-    return True
\ No newline at end of file
+    return True
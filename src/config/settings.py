@@ -20,6 +20,10 @@ class Settings(BaseSettings):
     DEBUG: bool = False
     RELOAD: bool = False
     WORKERS: int = 1
+    MEDIA_SERVER_ENABLED: bool = False
+    MEDIA_HOST: Optional[str] = None
+    MEDIA_PORT: int = 8081
+    MEDIA_MAX_CONNECTIONS: int = 32
 
     # FastAPI Configuration
     TITLE: str = "VoiceCast TTS Daemon API"
@@ -28,10 +32,23 @@ class Settings(BaseSettings):
     DOCS_URL: str = "/docs"
     REDOC_URL: str = "/redoc"
 
+    # TTS Backend Configuration
+    TTS_BACKEND: str = "deepgram"
+    TTS_FALLBACK_BACKEND: Optional[str] = None
+    LOCAL_TTS_WORKERS: int = 2
+
     # Deepgram Configuration
     DEEPGRAM_API_KEY: str
     DEEPGRAM_MODEL: str = "aura-2-helena-en"
     DEEPGRAM_TIMEOUT: float = 30.0
+    DEEPGRAM_HEDGE_ENABLED: bool = False
+    DEEPGRAM_HEDGE_PERCENTILE: float = 95.0
+    DEEPGRAM_HEDGE_MIN_SAMPLES: int = 20
+    DEEPGRAM_BREAKER_FAILURE_RATE: float = 0.5
+    DEEPGRAM_BREAKER_WINDOW: int = 20
+    DEEPGRAM_BREAKER_MIN_CALLS: int = 5
+    DEEPGRAM_BREAKER_RESET_TIMEOUT: float = 30.0
+    TTS_FALLBACK_CHIME: bool = True
 
     # Google Cast Configuration
     GOOGLE_CAST_DEVICE_NAME: Optional[str] = None
@@ -40,14 +57,50 @@ class Settings(BaseSettings):
     CAST_RETRY_WAIT: float = 5.0
     CAST_CONNECTION_TIMEOUT: float = 15.0
     CAST_PLAYBACK_TIMEOUT: float = 60.0
+    CAST_WARM_SESSION: bool = False
+    CAST_WARM_IDLE_TIMEOUT: float = 300.0
+    CAST_GROUP_START_DELAY: float = 0.25
 
     # Audio Configuration
     AUDIO_OUTPUT_DIR: str = os.path.join(PROJECT_ROOT, "audio")
     AUDIO_RETENTION_DAYS: int = 7
-    AUDIO_MAX_FILES: int = 50
+    AUDIO_MAX_FILES: int = 1000
+    AUDIO_MAX_BYTES: int = 524288000
+    AUDIO_JANITOR_INTERVAL: int = 300
     AUDIO_FORMAT: str = "wav"
+    AUDIO_SAMPLE_RATE: int = 24000
+    AUDIO_TRIM_SILENCE: bool = True
+    AUDIO_SILENCE_THRESHOLD_DB: float = -50.0
+    AUDIO_SILENCE_PADDING_MS: int = 50
+    AUDIO_NORMALIZE_LOUDNESS: bool = True
+    AUDIO_TARGET_LOUDNESS: float = -16.0
+    AUDIO_PREPEND_CHIME: bool = False
     AUDIO_CACHE_ENABLED: bool = True
     AUDIO_CACHE_MAX_SIZE: int = 100
+    AUDIO_HOT_CACHE_BYTES: int = 33554432
+
+    # Prewarm Configuration
+    PREWARM_PHRASES_FILE: Optional[str] = None
+    PREWARM_ON_STARTUP: bool = True
+    PREWARM_CONCURRENCY: int = 4
+
+    # Queue Configuration
+    QUEUE_MERGE_ENABLED: bool = False
+    QUEUE_MERGE_MAX_MESSAGES: int = 5
+    QUEUE_MERGE_GAP_MS: int = 400
+    TTS_BATCH_MAX_ITEMS: int = 100
+    TTS_SYNTHESIS_CONCURRENCY: int = 4
+    WS_MAX_PENDING_TASKS: int = 1000
+    WS_SEND_QUEUE_SIZE: int = 5000
+    IDEMPOTENCY_TTL: float = 86400.0
+    IDEMPOTENCY_MAX_KEYS: int = 10000
+    SCHEDULE_SYNTHESIS_LEAD: float = 30.0
+    SCHEDULE_MAX_DELAY: float = 604800.0
+    SCHEDULE_MAX_PENDING: int = 50000
+    REPLAY_HISTORY_SIZE: int = 10
+
+    # Template Configuration
+    TEMPLATES_FILE: Optional[str] = None
 
     # Logging Configuration
     LOG_LEVEL: str = "INFO"
@@ -55,6 +108,8 @@ class Settings(BaseSettings):
     LOG_MAX_SIZE: int = 10485760
     LOG_BACKUP_COUNT: int = 5
     LOG_FORMAT: str = "json"
+    LOG_REQUEST_SAMPLE_RATE: float = 1.0
+    LOG_SLOW_REQUEST_MS: float = 1000.0
 
     # Daemon Configuration
     PID_FILE: str = os.path.join(PROJECT_ROOT, "voicecast-daemon.pid")
@@ -69,6 +124,9 @@ class Settings(BaseSettings):
     # Rate Limiting
     RATE_LIMIT_REQUESTS: int = 100
     RATE_LIMIT_WINDOW: int = 60
+    RATE_LIMIT_DAILY_QUOTA: int = 0
+    RATE_LIMIT_DB: Optional[str] = None
+    API_KEYS_FILE: Optional[str] = None
 
     # Watchdog Configuration
     DISCORD_WEBHOOK_URL: Optional[str] = None
@@ -1,8 +1,40 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from datetime import datetime, timezone
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Any, Dict, List, Optional
 
 class TTSRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=1000)
     voice: Optional[str] = None
     speed: Optional[float] = Field(1.0, ge=0.5, le=2.0)
     device_name: Optional[str] = None
+    device_names: Optional[List[str]] = Field(None, min_length=1)
+    # Labels for cancelling announcements together, e.g. "door"
+    tags: Optional[List[str]] = None
+    # Play the announcement at a given time, or a number of seconds from now
+    deliver_at: Optional[datetime] = None
+    delay: Optional[float] = Field(None, ge=0)
+
+    @field_validator("deliver_at")
+    @classmethod
+    def assume_utc(cls, deliver_at: Optional[datetime]) -> Optional[datetime]:
+        if deliver_at and deliver_at.tzinfo is None:
+            return deliver_at.replace(tzinfo=timezone.utc)
+        return deliver_at
+
+    @model_validator(mode="after")
+    def check_schedule(self) -> "TTSRequest":
+        if self.deliver_at is not None and self.delay is not None:
+            raise ValueError("Set either deliver_at or delay, not both")
+        return self
+
+class TTSBatchRequest(BaseModel):
+    # Items are validated one by one, so a bad item does not reject the batch
+    items: List[Dict[str, Any]] = Field(..., min_length=1)
+
+class TemplateTTSRequest(BaseModel):
+    template: str = Field(..., min_length=1)
+    slots: Dict[str, str] = {}
+    voice: Optional[str] = None
+    device_name: Optional[str] = None
+    device_names: Optional[List[str]] = Field(None, min_length=1)
+    tags: Optional[List[str]] = None
@@ -0,0 +1,233 @@
+import asyncio
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from src.config.settings import Settings
+import structlog
+
+if TYPE_CHECKING:
+    from src.services.audio_store import HotAudioCache
+
+# Recency is persisted to the file's mtime at most this often, so the index
+# rebuilt after a restart still reflects recent use.
+TOUCH_PERSIST_INTERVAL = 3600.0
+
+class AudioIndex:
+    """In-memory index of the files in the audio directory, least recently used first.
+
+    The directory is scanned once; after that writers record new files and
+    cache hits touch existing ones, so enforcing the retention policy never
+    needs another scan. The index is used from the event loop only; the
+    janitor's deleting thread shares just the set of files being deleted.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._total_bytes = 0
+        self._pins = Counter()
+        self._deleting = set()
+        self._deleting_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._entries
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def scan(self, directory: str):
+        """Index every audio file below ``directory``, oldest first."""
+        self.merge(self.list_files(directory))
+
+    @staticmethod
+    def list_files(directory: str) -> List[Tuple[float, str, int]]:
+        """Return ``(mtime, path, size)`` of every audio file below ``directory``, oldest first.
+
+        Only reads the file system, so it can run in a worker thread.
+        """
+        found = []
+        pending = [directory]
+        while pending:
+            try:
+                with os.scandir(pending.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False) and not entry.name.endswith(".part"):
+                            stat = entry.stat(follow_symlinks=False)
+                            found.append((stat.st_mtime, entry.path, stat.st_size))
+            except FileNotFoundError:
+                continue
+        return sorted(found)
+
+    def merge(self, found: List[Tuple[float, str, int]]):
+        """Add the files of a scan, as used before the files recorded or touched since it started."""
+        entries = OrderedDict((path, (size, mtime)) for mtime, path, size in found if path not in self._entries)
+        self._total_bytes += sum(size for size, _ in entries.values())
+        entries.update(self._entries)
+        self._entries = entries
+
+    def record(self, path: str, size: Optional[int] = None):
+        """Record a newly written file as the most recently used one."""
+        if size is None:
+            size = os.path.getsize(path)
+        self._set(path, size, time.time())
+
+    def touch(self, path: str):
+        """Mark a file as used, e.g. on a cache hit."""
+        entry = self._entries.get(path)
+        now = time.time()
+        if entry is None:
+            try:
+                self.record(path)
+            except OSError:
+                pass
+            return
+        size, last_used = entry
+        if now - last_used > TOUCH_PERSIST_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        self._set(path, size, now)
+
+    def discard(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
+
+    def pin(self, path: str):
+        """Protect a file from deletion, e.g. while it is queued or playing."""
+        self._pins[path] += 1
+
+    def unpin(self, path: str):
+        self._pins[path] -= 1
+        if self._pins[path] <= 0:
+            del self._pins[path]
+
+    def is_pinned(self, path: str) -> bool:
+        return path in self._pins
+
+    def begin_delete(self, paths: List[str]):
+        """Drop files from the index and mark them as being deleted."""
+        with self._deleting_lock:
+            self._deleting.update(paths)
+        for path in paths:
+            self.discard(path)
+
+    def is_deleting(self, path: str) -> bool:
+        return path in self._deleting
+
+    def cancel_delete(self, path: str):
+        """Keep a file that is about to be written again from being deleted."""
+        with self._deleting_lock:
+            self._deleting.discard(path)
+
+    def delete(self, path: str) -> bool:
+        """Delete a file marked by ``begin_delete``, unless the deletion was cancelled meanwhile.
+
+        Called from the janitor's thread. Returns whether the file was deleted.
+        """
+        with self._deleting_lock:
+            if path not in self._deleting:
+                return False
+            self._deleting.discard(path)
+            # Removed under the lock, so a writer that cancels the deletion
+            # writes its file either before the check or after the removal
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return True
+
+    def expired(self, max_age: float = 0, max_files: int = 0, max_bytes: int = 0, now: Optional[float] = None) -> List[str]:
+        """Return the files to delete, least recently used first.
+
+        A file is expired when it has not been used for ``max_age`` seconds
+        or when it is among the least recently used ones while the directory
+        holds more than ``max_files`` files or ``max_bytes`` bytes. Pinned
+        files are never returned. A limit of 0 disables it.
+        """
+        now = time.time() if now is None else now
+        files = len(self._entries)
+        total_bytes = self._total_bytes
+        expired = []
+        for path, (size, last_used) in self._entries.items():
+            too_old = max_age and now - last_used > max_age
+            too_many = max_files and files > max_files
+            too_large = max_bytes and total_bytes > max_bytes
+            if not (too_old or too_many or too_large):
+                break
+            if self.is_pinned(path):
+                continue
+            expired.append(path)
+            files -= 1
+            total_bytes -= size
+        return expired
+
+    def _set(self, path: str, size: int, last_used: float):
+        self.discard(path)
+        self._entries[path] = (size, last_used)
+        self._total_bytes += size
+
+_audio_index = None
+
+def get_audio_index() -> AudioIndex:
+    """Returns the process-wide index of the audio directory."""
+    global _audio_index
+    if _audio_index is None:
+        _audio_index = AudioIndex()
+    return _audio_index
+
+class AudioJanitor:
+    """Deletes audio files according to the retention settings, from disk and from the hot tier."""
+
+    def __init__(self, settings: Settings, index: Optional[AudioIndex] = None, hot: Optional["HotAudioCache"] = None):
+        # Imported here, as the audio store builds on the index
+        from src.services.audio_store import get_hot_cache
+        self.settings = settings
+        self.index = index if index is not None else get_audio_index()
+        self.hot = hot if hot is not None else get_hot_cache(settings)
+        self.log = structlog.get_logger(__name__)
+
+    async def run_once(self) -> int:
+        """Delete expired files and return how many were deleted."""
+        expired = self.index.expired(
+            max_age=self.settings.AUDIO_RETENTION_DAYS * 86400,
+            max_files=self.settings.AUDIO_MAX_FILES,
+            max_bytes=self.settings.AUDIO_MAX_BYTES,
+        )
+        if not expired:
+            return 0
+        # Files being deleted are no cache hits, and writing one again cancels its deletion
+        self.index.begin_delete(expired)
+        for path in expired:
+            self.hot.discard(path)
+        await asyncio.to_thread(self._delete, expired)
+        self.log.info("Deleted expired audio files", files=len(expired), remaining=len(self.index), total_bytes=self.index.total_bytes)
+        return len(expired)
+
+    async def run(self):
+        """Index the audio directory, then enforce the retention settings periodically."""
+        # The directory is read in a thread and merged into the index on the event loop
+        found = await asyncio.to_thread(AudioIndex.list_files, self.settings.AUDIO_OUTPUT_DIR)
+        self.index.merge(found)
+        self.log.info("Indexed audio directory", files=len(self.index), total_bytes=self.index.total_bytes)
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.log.error("Audio janitor pass failed", error=str(e))
+            await asyncio.sleep(self.settings.AUDIO_JANITOR_INTERVAL)
+
+    def _delete(self, paths: List[str]):
+        for path in paths:
+            try:
+                self.index.delete(path)
+            except OSError as e:
+                self.log.warning("Could not delete audio file", path=path, error=str(e))
@@ -0,0 +1,217 @@
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+from src.config.settings import Settings
+from src.services.audio_janitor import AudioIndex, get_audio_index
+
+# Hex digits of the content digest in served file names
+DIGEST_LENGTH = 16
+
+def content_digest(data: bytes) -> str:
+    """Return the digest of audio content used in served file names."""
+    return hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+
+def audio_etag(digest: str) -> str:
+    """Return the strong ETag of audio with the given content digest."""
+    return f'"{digest}"'
+
+class HotAudio(NamedTuple):
+    data: memoryview
+    etag: str
+
+class HotAudioCache:
+    """Bounded in-memory LRU of recently written audio files.
+
+    Fresh announcements are fetched by Cast devices right after they are
+    synthesized, often with several Range requests; serving them from
+    memory avoids disk reads, which are slow on SD-card-backed devices.
+    The cache is shared with the media server thread.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, HotAudio]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get(self, path: str) -> Optional[HotAudio]:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+            return entry
+
+    def put(self, path: str, data: bytes, etag: str):
+        with self._lock:
+            self._discard(path)
+            if len(data) > self.max_bytes:
+                return
+            self._entries[path] = HotAudio(memoryview(data).toreadonly(), etag)
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted.data)
+
+    def discard(self, path: str):
+        with self._lock:
+            self._discard(path)
+
+    def _discard(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._total_bytes -= len(entry.data)
+
+_hot_cache = None
+
+class AudioDigests:
+    """Remembers the content digests of stored files, so they are only hashed once.
+
+    A digest is kept along with the inode, size and modification time of
+    the file, so a file replaced since, e.g. by another worker process, is
+    hashed again. The digests are shared with the media server thread.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int, int], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _version(stat_result: os.stat_result) -> Tuple[int, int, int]:
+        return stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns
+
+    def get(self, path: str, stat_result: os.stat_result) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != self._version(stat_result):
+                return None
+            self._entries.move_to_end(path)
+            return entry[1]
+
+    def put(self, path: str, stat_result: os.stat_result, digest: str):
+        with self._lock:
+            self._entries.pop(path, None)
+            self._entries[path] = (self._version(stat_result), digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+_audio_digests = None
+
+def get_audio_digests() -> AudioDigests:
+    """Returns the process-wide content digests of stored files."""
+    global _audio_digests
+    if _audio_digests is None:
+        _audio_digests = AudioDigests()
+    return _audio_digests
+
+def get_hot_cache(settings: Settings) -> HotAudioCache:
+    """Returns the process-wide hot tier of the audio store."""
+    global _hot_cache
+    if _hot_cache is None:
+        _hot_cache = HotAudioCache(settings.AUDIO_HOT_CACHE_BYTES)
+    return _hot_cache
+
+class AudioStore:
+    """Audio files below AUDIO_OUTPUT_DIR, named after the cache key they were rendered for.
+
+    The key hashes the inputs of a rendering, not the audio itself, so
+    rendering a key again (e.g. with ``force``) replaces the bytes under the
+    same name. Audio is therefore served under a name that adds a digest of
+    its content (see ``url_path``), which always refers to the same bytes.
+    Files are spread over 256 subdirectories by the first two characters of
+    the key, which keeps directories small with hundreds of thousands of
+    files. Written files are also kept in a bounded in-memory hot tier,
+    with disk as the cold tier.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        index: Optional[AudioIndex] = None,
+        hot: Optional[HotAudioCache] = None,
+        digests: Optional[AudioDigests] = None,
+    ):
+        self.settings = settings
+        self.root = settings.AUDIO_OUTPUT_DIR
+        self.index = index if index is not None else get_audio_index()
+        self.hot = hot if hot is not None else get_hot_cache(settings)
+        self.digests = digests if digests is not None else get_audio_digests()
+
+    def path(self, key: str) -> str:
+        """Return the path the audio stored under ``key`` lives at."""
+        return os.path.join(self.root, key[:2], f"{key}.{self.settings.AUDIO_FORMAT}")
+
+    def relative_path(self, path: str) -> str:
+        """Return ``path`` relative to the store, with forward slashes for use in URLs."""
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def url_path(self, path: str) -> str:
+        """Return the name ``path`` is served under: its relative path with the digest of its content.
+
+        Reads and hashes the file unless its digest is known, so it should
+        run in a worker thread.
+        """
+        name, extension = os.path.splitext(self.relative_path(path))
+        return f"{name}.{self.digest(path)}{extension}"
+
+    def digest(self, path: str) -> str:
+        """Return the content digest of the file at ``path``, hashing it unless it is known."""
+        with open(path, "rb") as f:
+            # The open file is stat'ed, so the digest matches the version that is read
+            stat_result = os.fstat(f.fileno())
+            digest = self.digests.get(path, stat_result)
+            if digest is None:
+                digest = content_digest(f.read())
+                self.digests.put(path, stat_result, digest)
+        return digest
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the path of the audio stored under ``key``, or None if there is none."""
+        file_path = self.path(key)
+        # A file the janitor is deleting is a miss; writing it again cancels the deletion
+        if not self.index.is_deleting(file_path) and os.path.isfile(file_path):
+            self.index.touch(file_path)
+            return file_path
+        return None
+
+    def put(self, key: str, data: bytes) -> str:
+        """Store ``data`` under ``key`` and return its path."""
+        file_path = self.write(key, data)
+        self.index.record(file_path, len(data))
+        return file_path
+
+    def write(self, key: str, data: bytes) -> str:
+        """Write ``data`` under ``key`` without recording it in the index, and return its path.
+
+        Unlike ``put``, this can run in a worker thread; the caller records
+        the file on the event loop. The data is written to a temporary file
+        first and renamed into place, so a partially written file is never
+        served as a cache hit or fetched by a Cast device.
+        """
+        file_path = self.path(key)
+        self.index.cancel_delete(file_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        digest = content_digest(data)
+        self.digests.put(file_path, os.stat(file_path), digest)
+        if self.hot.max_bytes:
+            self.hot.put(file_path, data, audio_etag(digest))
+        return file_path
@@ -1,8 +1,10 @@
 import pychromecast
+from pychromecast.config import APP_MEDIA_RECEIVER
 from src.config.settings import Settings
 from src.utils.logger import log
 import asyncio
-from src.utils.network_utils import get_local_ip
+from typing import Dict, Optional
+from src.utils.network_utils import get_local_ip, get_source_ip
 from src.utils.singleton import get_cast_browser, get_zeroconf_instance
 
 class CastService:
@@ -11,6 +13,9 @@ class CastService:
         self.device_name = self.settings.GOOGLE_CAST_DEVICE_NAME
         self.chromecast = None
         self._host_ip = None
+        self._warm_sessions: Dict[str, pychromecast.Chromecast] = {}
+        self._warm_locks: Dict[str, asyncio.Lock] = {}
+        self._release_handles: Dict[str, asyncio.TimerHandle] = {}
 
     @property
     def host_ip(self):
@@ -21,8 +26,43 @@ class CastService:
                 self._host_ip = self.settings.HOST
         return self._host_ip
 
+    def device_host(self, device_name: str = None) -> Optional[str]:
+        """Return the IP address of a discovered Cast device, or None if it is unknown."""
+        target_device_name = device_name or self.device_name
+        if self.chromecast and self.chromecast.name == target_device_name:
+            return self.chromecast.cast_info.host
+        _, listener = get_cast_browser()
+        cast_info = next((c for c in listener.devices if c.friendly_name == target_device_name), None)
+        return cast_info.host if cast_info else None
+
+    def audio_url(self, path: str, port: int, device_name: str = None) -> str:
+        """Return the URL a Cast device fetches stored audio from.
+
+        EXTERNAL_URL is used when set. Otherwise, when listening on all
+        interfaces, the URL uses the local address on the route to the
+        device, so speakers on other networks of a multi-homed host get a
+        reachable URL.
+        """
+        if self.settings.EXTERNAL_URL:
+            return f"{self.settings.EXTERNAL_URL.rstrip('/')}/audio/{path}"
+        host = self.host_ip
+        if self.settings.HOST == "0.0.0.0":
+            device_host = self.device_host(device_name)
+            if device_host:
+                host = get_source_ip(device_host)
+        if ":" in host:
+            host = f"[{host}]"
+        return f"http://{host}:{port}/audio/{path}"
+
     async def discover_and_connect(self, device_name: str = None):
         """Discover and connect to a Google Cast device asynchronously."""
+        chromecast = await self._discover(device_name)
+        if chromecast is None:
+            return False
+        self.chromecast = chromecast
+        return True
+
+    async def _discover(self, device_name: str = None) -> Optional[pychromecast.Chromecast]:
         log.info("Discovering Google Cast devices...")
 
         browser, listener = get_cast_browser()
@@ -40,30 +80,95 @@ class CastService:
 
             if not cast_info:
                 log.warning(f"Device '{target_device_name}' not found.")
-                return False
+                return None
 
-            self.chromecast = await asyncio.to_thread(
+            chromecast = await asyncio.to_thread(
                 pychromecast.get_chromecast_from_cast_info, cast_info, zconf
             )
-            await asyncio.to_thread(self.chromecast.wait)
-            log.info(f"Connected to {self.chromecast.name}")
-            return True
+            await asyncio.to_thread(chromecast.wait)
+            log.info(f"Connected to {chromecast.name}")
+            return chromecast
 
         except Exception as e:
             log.error(f"An error occurred during device discovery: {e}")
-            return False
+            return None
+
+    async def warm_up(self, device_name: str = None) -> Optional[pychromecast.Chromecast]:
+        """Connect to a device and launch the Default Media Receiver on it.
+
+        The session is kept open until the device has been unused for
+        CAST_WARM_IDLE_TIMEOUT seconds, so following announcements skip the
+        receiver launch, the slowest part of a Cast round trip.
+        """
+        target_device_name = device_name or self.device_name
+        lock = self._warm_locks.setdefault(target_device_name, asyncio.Lock())
+        async with lock:
+            chromecast = self._warm_sessions.get(target_device_name)
+            if chromecast is None or not chromecast.socket_client.is_connected:
+                chromecast = await self._discover(target_device_name)
+                if chromecast is None:
+                    return None
+                self._warm_sessions[target_device_name] = chromecast
+            if chromecast.app_id != APP_MEDIA_RECEIVER:
+                log.info(f"Launching the media receiver on {target_device_name}")
+                try:
+                    await asyncio.to_thread(chromecast.start_app, APP_MEDIA_RECEIVER)
+                except Exception as e:
+                    # play_media launches the receiver itself if this failed
+                    log.warning(f"Could not launch the media receiver on {target_device_name}: {e}")
+            self._schedule_release(target_device_name)
+            return chromecast
+
+    def _schedule_release(self, device_name: str):
+        handle = self._release_handles.pop(device_name, None)
+        if handle:
+            handle.cancel()
+        self._release_handles[device_name] = asyncio.get_running_loop().call_later(
+            self.settings.CAST_WARM_IDLE_TIMEOUT, lambda: asyncio.create_task(self.release(device_name))
+        )
+
+    async def release(self, device_name: str):
+        """Quit the media receiver on a warm device and disconnect from it."""
+        handle = self._release_handles.pop(device_name, None)
+        if handle:
+            handle.cancel()
+        chromecast = self._warm_sessions.get(device_name)
+        if chromecast is None:
+            return
+        status = chromecast.media_controller.status
+        if status.player_is_playing or status.player_is_paused:
+            # Still in use, check again later
+            self._schedule_release(device_name)
+            return
+        del self._warm_sessions[device_name]
+        if self.chromecast is chromecast:
+            self.chromecast = None
+        log.info(f"Releasing idle session on {device_name}")
+        try:
+            if chromecast.app_id == APP_MEDIA_RECEIVER:
+                await asyncio.to_thread(chromecast.quit_app)
+            await asyncio.to_thread(chromecast.disconnect)
+        except Exception as e:
+            log.warning(f"Error releasing session on {device_name}: {e}")
 
     async def play_audio(self, audio_url: str, device_name: str = None):
         """Play audio on the connected Google Cast device."""
         log.info(f"Attempting to play audio from URL: {audio_url}")
-        if not self.chromecast or not self.chromecast.is_idle or (device_name and self.chromecast.name != device_name):
-            if not await self.discover_and_connect(device_name):
+        if self.settings.CAST_WARM_SESSION:
+            chromecast = await self.warm_up(device_name)
+            if not chromecast:
                 log.error("Could not connect to device for playback.")
-                return
-        
-        await asyncio.sleep(1) # Add a small delay
+                return False
+        else:
+            if not self.chromecast or not self.chromecast.is_idle or (device_name and self.chromecast.name != device_name):
+                if not await self.discover_and_connect(device_name):
+                    log.error("Could not connect to device for playback.")
+                    return False
 
-        mc = self.chromecast.media_controller
+            await asyncio.sleep(1) # Add a small delay
+            chromecast = self.chromecast
+
+        mc = chromecast.media_controller
 
         # Stop any currently playing media
         if mc.status.player_is_playing or mc.status.player_is_paused:
@@ -75,5 +180,77 @@ class CastService:
         mc.play_media(audio_url, "audio/wav")
         mc.block_until_active()
         log.info("Audio playback started.")
+        if self.settings.CAST_WARM_SESSION:
+            self._schedule_release(device_name or self.device_name)
+        return True
+
+    async def play_group(self, audio_urls: Dict[str, str]) -> dict:
+        """Play audio on several devices with a shared start time.
+
+        ``audio_urls`` maps each device name to the URL it fetches the audio
+        from. Every device is connected, has the media receiver launched and
+        loads the audio paused; once all have loaded, playback is started on
+        all of them at the same moment. Devices that could not be reached or
+        did not load the audio in time are left out and reported. Returns when
+        each device was seen playing, in milliseconds after the shared start,
+        and the skew between the first and the last device.
+        """
+        names = list(audio_urls)
+        connect = self.warm_up if self.settings.CAST_WARM_SESSION else self._discover
+        chromecasts = await asyncio.gather(*(connect(name) for name in names))
+        connected = {name: chromecast for name, chromecast in zip(names, chromecasts) if chromecast}
+        unreachable = [name for name in names if name not in connected]
+        if unreachable:
+            log.error(f"Could not connect to {', '.join(unreachable)} for playback.")
+
+        try:
+            loaded = await asyncio.gather(*(self._load_paused(chromecast, audio_urls[name]) for name, chromecast in connected.items()))
+            ready = {name: chromecast for (name, chromecast), ok in zip(connected.items(), loaded) if ok}
+            not_loaded = [name for name in connected if name not in ready]
+            if not_loaded:
+                log.error(f"Audio did not load on {', '.join(not_loaded)}, leaving them out of playback.")
+
+            start_at = asyncio.get_running_loop().time() + self.settings.CAST_GROUP_START_DELAY
+            started = await asyncio.gather(*(self._start_at(chromecast, start_at) for chromecast in ready.values()))
+            log.info(f"Audio playback started on {len(ready)} devices.")
+        finally:
+            if not self.settings.CAST_WARM_SESSION:
+                await asyncio.gather(*(asyncio.to_thread(chromecast.disconnect) for chromecast in connected.values()), return_exceptions=True)
+
+        offsets = {name: offset for name, offset in zip(ready, started)}
+        seen = [offset for offset in offsets.values() if offset is not None]
+        return {
+            "devices": offsets,
+            "skew_ms": round(max(seen) - min(seen), 1) if seen else None,
+            "unreachable": unreachable,
+            "not_loaded": not_loaded,
+        }
+
+    async def _load_paused(self, chromecast: pychromecast.Chromecast, audio_url: str) -> bool:
+        """Load the audio on a device without playing it, and return whether it loaded in time."""
+        mc = chromecast.media_controller
+        if mc.status.player_is_playing or mc.status.player_is_paused:
+            mc.stop()
+        mc.play_media(audio_url, "audio/wav", autoplay=False)
+        return await self._wait_for(lambda: mc.status.player_state in ("PAUSED", "PLAYING"), self.settings.CAST_PLAYBACK_TIMEOUT)
+
+    async def _start_at(self, chromecast: pychromecast.Chromecast, start_at: float) -> Optional[float]:
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(max(0.0, start_at - loop.time()))
+        mc = chromecast.media_controller
+        mc.play()
+        if not await self._wait_for(lambda: mc.status.player_is_playing, self.settings.CAST_PLAYBACK_TIMEOUT):
+            return None
+        return round((loop.time() - start_at) * 1000, 1)
+
+    @staticmethod
+    async def _wait_for(condition, timeout: float, interval: float = 0.01) -> bool:
+        """Poll ``condition`` until it holds or ``timeout`` seconds have passed."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not condition():
+            if asyncio.get_running_loop().time() >= deadline:
+                return False
+            await asyncio.sleep(interval)
+        return True
 
     
@@ -0,0 +1,147 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, Iterator, Optional
+
+class _Lane:
+    """The per-tenant queues of one lane, served by deficit round robin."""
+
+    def __init__(self):
+        self.queues: "OrderedDict[Hashable, Deque[Any]]" = OrderedDict()
+        self.credit: Dict[Hashable, float] = {}
+        self.length = 0
+
+    def push(self, tenant: Hashable, item: Any):
+        if tenant not in self.queues:
+            # A tenant that was idle starts without credit, at the end of the round
+            self.queues[tenant] = deque()
+            self.credit[tenant] = 0.0
+        self.queues[tenant].append(item)
+        self.length += 1
+
+    def pop(self, weights: Dict[Hashable, float]) -> Any:
+        while True:
+            tenant = next(iter(self.queues))
+            if self.credit[tenant] < 1:
+                self.credit[tenant] += weights.get(tenant, 1.0)
+                if self.credit[tenant] < 1:
+                    self.queues.move_to_end(tenant)
+                    continue
+            self.credit[tenant] -= 1
+            queue = self.queues[tenant]
+            item = queue.popleft()
+            self.length -= 1
+            if not queue:
+                del self.queues[tenant]
+                del self.credit[tenant]
+            elif self.credit[tenant] < 1:
+                # The tenant has used its share of this round
+                self.queues.move_to_end(tenant)
+            return item
+
+class FairQueue:
+    """A queue that shares its capacity fairly between tenants.
+
+    Items are queued in lanes, such as the devices they are played on, and
+    within a lane per tenant. Lanes take turns, and within a lane tenants
+    are served by deficit round robin: every round, a tenant may take as
+    many items as its weight, so a tenant that queues a burst only delays
+    its own items. Items of one tenant in one lane keep their order.
+    """
+
+    def __init__(self):
+        self._lanes: "OrderedDict[Hashable, _Lane]" = OrderedDict()
+        self._weights: Dict[Hashable, float] = {}
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate over the queued items, lane by lane and tenant by tenant."""
+        for lane in self._lanes.values():
+            for queue in lane.queues.values():
+                yield from queue
+
+    def push(self, lane: Hashable, tenant: Hashable, item: Any, weight: float = 1.0):
+        if weight <= 0:
+            raise ValueError("weight must be positive")
+        self._weights[tenant] = weight
+        self._lanes.setdefault(lane, _Lane()).push(tenant, item)
+        self._length += 1
+
+    def pop(self) -> Any:
+        """Remove and return the next item. Raises IndexError when the queue is empty."""
+        if not self._lanes:
+            raise IndexError("pop from an empty FairQueue")
+        lane = next(iter(self._lanes))
+        item = self.pop_lane(lane)
+        if lane in self._lanes:
+            self._lanes.move_to_end(lane)
+        return item
+
+    def pop_lane(self, lane: Hashable) -> Any:
+        """Remove and return the next item of a lane. Raises IndexError when the lane is empty."""
+        queues = self._lanes.get(lane)
+        if queues is None:
+            raise IndexError("pop from an empty lane")
+        item = queues.pop(self._weights)
+        self._length -= 1
+        if not queues.length:
+            del self._lanes[lane]
+        return item
+
+    def lane_length(self, lane: Hashable) -> int:
+        queues = self._lanes.get(lane)
+        return queues.length if queues else 0
+
+class FairSemaphore:
+    """A semaphore that hands out its slots fairly between tenants.
+
+    Waiting tenants are served by deficit round robin in proportion to their
+    weights, so a tenant waiting for many slots does not hold back a tenant
+    that needs only one.
+    """
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters = FairQueue()
+
+    async def acquire(self, tenant: Optional[Hashable] = None, weight: float = 1.0):
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.push(None, tenant, future, weight)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before the cancellation
+                self.release()
+            else:
+                future.cancel()
+            raise
+
+    def release(self):
+        while self._waiters:
+            future = self._waiters.pop()
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+    def slot(self, tenant: Optional[Hashable] = None, weight: float = 1.0) -> "_Slot":
+        """Return an async context manager that holds a slot for ``tenant``."""
+        return _Slot(self, tenant, weight)
+
+class _Slot:
+    def __init__(self, semaphore: FairSemaphore, tenant: Optional[Hashable], weight: float):
+        self.semaphore = semaphore
+        self.tenant = tenant
+        self.weight = weight
+
+    async def __aenter__(self):
+        await self.semaphore.acquire(self.tenant, self.weight)
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, NamedTuple, Optional
+
+def request_fingerprint(body: str) -> bytes:
+    """Return a digest of a request body, to tell a retry from a different request with a reused key."""
+    return hashlib.sha256(body.encode()).digest()
+
+class IdempotentResult(NamedTuple):
+    fingerprint: bytes
+    task_id: str
+    expires: float
+
+class PendingRequest(NamedTuple):
+    fingerprint: bytes
+    # Resolved once the request has been queued or has given up its key
+    done: asyncio.Future
+
+class IdempotencyStore:
+    """Remembers the task queued for each idempotency key for ``ttl`` seconds.
+
+    At most ``max_keys`` keys are kept; the oldest are dropped first. As
+    every key lives for the same time, the oldest key is also the first to
+    expire, so expired keys are dropped from the front in O(1).
+
+    A key is reserved while its first request is being queued, so retries
+    sent in the meantime can wait for its task ID instead of queueing the
+    announcement again.
+    """
+
+    def __init__(self, ttl: float, max_keys: int):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._results: "OrderedDict[Hashable, IdempotentResult]" = OrderedDict()
+        self._pending: Dict[Hashable, PendingRequest] = {}
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: Hashable, now: Optional[float] = None) -> Optional[IdempotentResult]:
+        self._expire(time.monotonic() if now is None else now)
+        return self._results.get(key)
+
+    def reserve(self, key: Hashable, fingerprint: bytes) -> Optional[PendingRequest]:
+        """Reserve a key for a request that is being queued.
+
+        Returns None when the key was free and is now reserved, or the
+        pending request that holds it.
+        """
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = PendingRequest(fingerprint, asyncio.get_running_loop().create_future())
+        return pending
+
+    def release(self, key: Hashable):
+        """Free a reserved key, e.g. when its request failed; does nothing once the result was put."""
+        pending = self._pending.pop(key, None)
+        if pending is not None and not pending.done.done():
+            pending.done.set_result(None)
+
+    def put(self, key: Hashable, fingerprint: bytes, task_id: str, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        self._results.pop(key, None)
+        self._results[key] = IdempotentResult(fingerprint, task_id, now + self.ttl)
+        while len(self._results) > self.max_keys:
+            self._results.popitem(last=False)
+        self.release(key)
+
+    def _expire(self, now: float):
+        while self._results:
+            key, result = next(iter(self._results.items()))
+            if result.expires > now:
+                break
+            del self._results[key]
@@ -0,0 +1,83 @@
+import asyncio
+from typing import List, Optional
+from src.config.settings import Settings
+from src.models.requests import TTSRequest
+from src.services.tts_service import TTSService
+import structlog
+
+def load_phrases(path: str) -> List[str]:
+    """Load the phrase library from a text file, one phrase per line.
+
+    Blank lines and lines starting with ``#`` are ignored, and duplicate
+    phrases are only returned once.
+    """
+    phrases = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            phrase = line.strip()
+            if not phrase or phrase.startswith("#") or phrase in seen:
+                continue
+            seen.add(phrase)
+            phrases.append(phrase)
+    return phrases
+
+class PrewarmService:
+    """Renders a library of common phrases into the audio cache."""
+
+    def __init__(self, tts_service: TTSService, settings: Settings):
+        self.tts_service = tts_service
+        self.settings = settings
+        self.log = structlog.get_logger(__name__)
+
+    async def prewarm(
+        self,
+        phrases: List[str],
+        voice: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        force: bool = False,
+        chime: Optional[bool] = None,
+    ) -> dict:
+        """Render every phrase that is not cached yet for the given voice.
+
+        Cache entries are keyed by voice and post-processing, so after the
+        configured model or processing changes every phrase misses and is
+        rendered again. ``chime`` overrides AUDIO_PREPEND_CHIME, as for
+        ``TTSService.generate_audio``.
+        """
+        voice = voice or self.settings.DEEPGRAM_MODEL
+        variant = self.tts_service.postprocess_variant(chime)
+        semaphore = asyncio.Semaphore(concurrency or self.settings.PREWARM_CONCURRENCY)
+        result = {"rendered": 0, "cached": 0, "failed": 0}
+
+        async def render(phrase: str):
+            if not force and self.tts_service.get_cached_audio(phrase, voice, variant):
+                result["cached"] += 1
+                return
+            async with semaphore:
+                try:
+                    await self.tts_service.generate_audio(TTSRequest(text=phrase, voice=voice), force=force, fallback=False, chime=chime)
+                    result["rendered"] += 1
+                except Exception as e:
+                    result["failed"] += 1
+                    self.log.warning("Failed to prewarm phrase", text=phrase, error=str(e))
+
+        phrases = list(dict.fromkeys(phrases))
+        self.log.info("Prewarming phrase library", phrases=len(phrases), voice=voice)
+        await asyncio.gather(*(render(phrase) for phrase in phrases))
+        self.log.info("Finished prewarming phrase library", voice=voice, **result)
+        return result
+
+    async def prewarm_library(self, phrases: List[str], fragments: List[str], **options) -> dict:
+        """Render the phrase library and the template fragments, and return the combined counts.
+
+        Templates compose their fragments without the attention chime, so the
+        fragments are rendered without it.
+        """
+        result = {"rendered": 0, "cached": 0, "failed": 0}
+        for texts, chime in ((phrases, None), (fragments, False)):
+            if texts:
+                for outcome, count in (await self.prewarm(texts, chime=chime, **options)).items():
+                    result[outcome] += count
+        return result
+
@@ -1,45 +1,506 @@
 import asyncio
-from collections import deque
+import hashlib
+from collections import OrderedDict, deque
 from src.services.tts_service import TTSService
 from src.services.cast_service import CastService
+from src.services.template_service import TemplateService
+from src.services.audio_store import AudioStore
+from src.services.fair_queue import FairQueue, FairSemaphore
+from src.services.scheduler import Scheduler
+from src.utils.wav_utils import concat_wav
 from src.config.settings import Settings
+from datetime import datetime, timezone
+from typing import Callable, Coroutine, Deque, Dict, List, Optional, Set, Tuple
 import structlog # Import structlog
-import os # Import os
+import os
 import uuid
 
+# Number of finished tasks whose status is kept for lookups
+MAX_TASK_HISTORY = 1000
+
 class QueueService:
-    def __init__(self, tts_service: TTSService, cast_service: CastService, settings: Settings):
-        self.queue = deque()
+    def __init__(self, tts_service: TTSService, cast_service: CastService, settings: Settings, template_service: Optional[TemplateService] = None):
+        self.queue = FairQueue()
         self.tts_service = tts_service
         self.cast_service = cast_service
+        self.template_service = template_service
         self.settings = settings
         self.processing = False
+        self.tasks: "OrderedDict[str, dict]" = OrderedDict()
+        # The API key name each task was queued under, kept as long as its status
+        self._tenants: Dict[str, Optional[str]] = {}
+        self._synthesis_slots: Optional[FairSemaphore] = None
+        self._listeners: List[Callable[[dict], None]] = []
+        # Tasks with a delivery time wait here until they are due
+        self.scheduler = Scheduler(settings.SCHEDULE_SYNTHESIS_LEAD, self._prepare_scheduled, self._release_scheduled)
+        # Tasks that can still be cancelled, indexed by device and tag. Cancelled
+        # tasks stay in the queue and are skipped when they come up.
+        self._cancellable: Dict[str, dict] = {}
+        self._by_device: Dict[str, Dict[str, None]] = {}
+        self._by_tag: Dict[str, Dict[str, None]] = {}
+        self._processing: Dict[str, None] = {}
+        self._synthesis_users: Dict[asyncio.Task, int] = {}
+        # Fire-and-forget tasks, e.g. session warm-ups, referenced until they finish
+        self._background: Set[asyncio.Task] = set()
+        # The audio of played tasks, and the last REPLAY_HISTORY_SIZE task IDs played per device
+        self._played: "OrderedDict[str, dict]" = OrderedDict()
+        self._device_history: Dict[str, Deque[str]] = {}
+        self.store = AudioStore(settings)
+        # The port of the media server, set once it has started; audio is served by the API server until then
+        self.media_port: Optional[int] = None
         self.log = structlog.get_logger(__name__) # Get logger after setup_logging is called
 
     def add_to_queue(self, task: dict) -> str:
-        task_id = str(uuid.uuid4())
+        if "deliver_at" in task:
+            return self._schedule(task)
+        task_id = self._enqueue(task)
+        if self.settings.CAST_WARM_SESSION:
+            # Launch the receivers while the audio is being synthesized
+            for device_name in self._targets(task):
+                self._spawn(self.cast_service.warm_up(device_name))
+        self._start_processing()
+        return task_id
+
+    def add_batch(self, tasks: List[dict]) -> List[str]:
+        """Queue several tasks at once and return their task IDs.
+
+        The tasks are queued in one step, so submissions from other clients
+        cannot end up between them. Synthesis for the whole batch starts
+        right away, and tasks with the same text, voice and speed share a
+        single synthesis. Tasks with a delivery time are scheduled instead.
+        """
+        syntheses = {}
+        for task in tasks:
+            if task.get("template") or "deliver_at" in task or "audio" in task:
+                continue
+            tts_request = task["tts_request"]
+            key = (tts_request.text, tts_request.voice, tts_request.speed)
+            if key not in syntheses:
+                syntheses[key] = asyncio.create_task(self._synthesize(task))
+            self._use_synthesis(task, syntheses[key])
+
+        task_ids = [self._schedule(task) if "deliver_at" in task else self._enqueue(task) for task in tasks]
+        self.log.info("Added batch to queue", tasks=len(tasks), syntheses=len(syntheses))
+        if self.settings.CAST_WARM_SESSION:
+            queued = [task for task in tasks if "deliver_at" not in task]
+            for device_name in dict.fromkeys(target for task in queued for target in self._targets(task)):
+                self._spawn(self.cast_service.warm_up(device_name))
+        self._start_processing()
+        return task_ids
+
+    def _enqueue(self, task: dict, task_id: Optional[str] = None) -> str:
+        task_id = task_id or str(uuid.uuid4())
         self.log.info("Adding task to queue", task_id=task_id)
-        self.queue.append((task_id, task))
-        if not self.processing:
-            asyncio.create_task(self._process_queue())
+        self.queue.push(self._targets(task), task.get("tenant"), (task_id, task), task.get("weight", 1.0))
+        self._tenants[task_id] = task.get("tenant")
+        self._index(task_id, task)
+        self._set_status(task_id, "queued", devices=list(self._targets(task)))
+        return task_id
+
+    def _schedule(self, task: dict) -> str:
+        task_id = str(uuid.uuid4())
+        self.log.info("Scheduling task", task_id=task_id, deliver_at=task["deliver_at"])
+        self.scheduler.schedule(task_id, task["deliver_at"], task)
+        self._tenants[task_id] = task.get("tenant")
+        self._index(task_id, task)
+        self._set_status(task_id, **self._scheduled_status(task))
         return task_id
 
+    def _scheduled_status(self, task: dict) -> dict:
+        deliver_at = datetime.fromtimestamp(task["deliver_at"], timezone.utc).isoformat()
+        return {"status": "scheduled", "devices": list(self._targets(task)), "deliver_at": deliver_at}
+
+    def _prepare_scheduled(self, task_id: str, task: dict):
+        """Synthesize a scheduled task and launch its receivers shortly before it is due."""
+        self.log.info("Preparing scheduled task", task_id=task_id)
+        if not task.get("template"):
+            self._use_synthesis(task, asyncio.create_task(self._synthesize(task)))
+        if self.settings.CAST_WARM_SESSION:
+            for device_name in self._targets(task):
+                self._spawn(self.cast_service.warm_up(device_name))
+
+    def _release_scheduled(self, task_id: str, task: dict):
+        self._enqueue(task, task_id)
+        self._start_processing()
+
+    def _start_processing(self):
+        # Set before the worker runs, so tasks added in the same loop iteration do not start a second one
+        if not self.processing:
+            self.processing = True
+            self._spawn(self._process_queue())
+
+    def _spawn(self, coroutine: Coroutine) -> asyncio.Task:
+        """Run a coroutine in the background, keeping a reference to it and logging its failure."""
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+        return task
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.log.error("Background task failed", task=task.get_coro().__qualname__, error=str(task.exception()))
+
+    def get_task(self, task_id: str, tenant: Optional[str] = None) -> Optional[dict]:
+        """Return the status of a scheduled, queued or recently finished task.
+
+        With ``tenant`` set, tasks queued under other API keys are not found.
+        """
+        if not self._owned(task_id, tenant):
+            return None
+        task_status = self.tasks.get(task_id)
+        if task_status is None and task_id in self.scheduler:
+            # Scheduled tasks outlive the status history
+            task_status = {"task_id": task_id, **self._scheduled_status(self.scheduler.get(task_id))}
+        return task_status
+
+    def _owned(self, task_id: str, tenant: Optional[str]) -> bool:
+        return tenant is None or self._tenants.get(task_id) == tenant
+
+    def cancel(self, task_id: str, tenant: Optional[str] = None) -> bool:
+        """Cancel a scheduled or queued task, or a task whose audio is not yet playing.
+
+        Returns False when the task is unknown, already being played, or,
+        with ``tenant`` set, queued under another API key. The task's
+        synthesis is cancelled unless other tasks share it.
+        """
+        if not self._owned(task_id, tenant):
+            return False
+        task = self._cancellable.pop(task_id, None)
+        if task is None:
+            return False
+        task["cancelled"] = True
+        self._unindex(task_id, task)
+        if task_id not in self._processing:
+            self.scheduler.cancel(task_id)
+            self._release_synthesis(task, cancel=True)
+            self._release_audio(task)
+        self.log.info("Cancelled task", task_id=task_id)
+        self._set_status(task_id, "cancelled")
+        return True
+
+    def purge(self, device_name: Optional[str] = None, tag: Optional[str] = None, tenant: Optional[str] = None) -> List[str]:
+        """Cancel the tasks for a device and/or with a tag, and return their IDs.
+
+        With ``tenant`` set, only the tasks queued under that API key are cancelled.
+        """
+        matches = None
+        if device_name is not None:
+            matches = dict(self._by_device.get(device_name.lower(), {}))
+        if tag is not None:
+            tagged = self._by_tag.get(tag, {})
+            matches = dict(tagged) if matches is None else {task_id: None for task_id in matches if task_id in tagged}
+        return [task_id for task_id in matches or () if self.cancel(task_id, tenant)]
+
+    def replay_task(self, task_id: str, port: int, tenant: Optional[str] = None, weight: float = 1.0) -> Optional[str]:
+        """Queue the audio of a played task again, on the same devices.
+
+        The replay is queued under ``tenant``; with ``tenant`` set, only
+        tasks that were queued under it can be replayed. Returns the ID of the new task, or
+        None when the task is not in the history or its audio is gone.
+        """
+        played = self._played.get(task_id)
+        if played is None or (tenant is not None and played["tenant"] != tenant) or not self._audio_available(played["audio"]):
+            return None
+        return self.add_to_queue(self._replay(task_id, played, list(played["targets"]), port, tenant, weight))
+
+    def replay_device(self, device_name: str, count: int, port: int, tenant: Optional[str] = None, weight: float = 1.0) -> List[str]:
+        """Queue the last ``count`` announcements played on a device again, oldest first.
+
+        The audio is taken from the audio store, so nothing is synthesized.
+        """
+        task_ids = list(self._device_history.get(device_name.lower(), ()))[-count:]
+        replays = [
+            self._replay(task_id, self._played[task_id], [device_name], port, tenant, weight)
+            for task_id in task_ids
+            if task_id in self._played and self._audio_available(self._played[task_id]["audio"])
+        ]
+        return self.add_batch(replays) if replays else []
+
+    def _replay(self, task_id: str, played: dict, device_names: List[str], port: int, tenant: Optional[str], weight: float) -> dict:
+        task = {
+            "tts_request": played["tts_request"],
+            "port": port,
+            "device_names": device_names,
+            "audio": played["audio"],
+            "replay_of": task_id,
+            "tenant": tenant,
+            "weight": weight,
+        }
+        self._hold_audio(task, played["audio"])
+        return task
+
+    def _audio_available(self, path: str) -> bool:
+        return not self.store.index.is_deleting(path) and os.path.exists(path)
+
+    def _hold_audio(self, task: dict, path: str):
+        """Pin the audio of a waiting task, so the janitor keeps it until the task is played or cancelled."""
+        if "held_audio" not in task and not task.get("cancelled"):
+            self.store.index.pin(path)
+            task["held_audio"] = path
+
+    def _release_audio(self, task: dict):
+        path = task.pop("held_audio", None)
+        if path:
+            self.store.index.unpin(path)
+
+    def _record_played(self, task_id: str, task: dict, audio_path: str):
+        if "replay_of" in task:
+            return
+        targets = self._targets(task)
+        self._played[task_id] = {"tts_request": task["tts_request"], "audio": audio_path, "targets": targets, "tenant": task.get("tenant")}
+        while len(self._played) > MAX_TASK_HISTORY:
+            self._played.popitem(last=False)
+        for device in self._device_keys(task):
+            history = self._device_history.get(device)
+            if history is None:
+                history = self._device_history[device] = deque(maxlen=self.settings.REPLAY_HISTORY_SIZE)
+            history.append(task_id)
+
+    def _index(self, task_id: str, task: dict):
+        self._cancellable[task_id] = task
+        for device in self._device_keys(task):
+            self._by_device.setdefault(device, {})[task_id] = None
+        for tag in task.get("tags") or ():
+            self._by_tag.setdefault(tag, {})[task_id] = None
+
+    def _unindex(self, task_id: str, task: dict):
+        self._cancellable.pop(task_id, None)
+        for index, keys in ((self._by_device, self._device_keys(task)), (self._by_tag, task.get("tags") or ())):
+            for key in keys:
+                task_ids = index.get(key)
+                if task_ids is not None:
+                    task_ids.pop(task_id, None)
+                    if not task_ids:
+                        del index[key]
+
+    def _device_keys(self, task: dict) -> List[str]:
+        # Device names are matched case-insensitively, like in the device registry
+        return [(name or self.settings.GOOGLE_CAST_DEVICE_NAME or "").lower() for name in self._targets(task)]
+
+    def _use_synthesis(self, task: dict, synthesis: asyncio.Task):
+        task["synthesis"] = synthesis
+        self._synthesis_users[synthesis] = self._synthesis_users.get(synthesis, 0) + 1
+        # Audio synthesized ahead of time waits in the store until the task is played
+        synthesis.add_done_callback(lambda synthesis: self._hold_synthesized(task, synthesis))
+
+    def _hold_synthesized(self, task: dict, synthesis: asyncio.Task):
+        if not synthesis.cancelled() and synthesis.exception() is None:
+            self._hold_audio(task, synthesis.result())
+
+    def _release_synthesis(self, task: dict, cancel: bool = False) -> Optional[asyncio.Task]:
+        """Detach a task from its synthesis, which is cancelled with ``cancel`` once no task uses it."""
+        synthesis = task.pop("synthesis", None)
+        if synthesis is None:
+            return None
+        users = self._synthesis_users.pop(synthesis, 1) - 1
+        if users:
+            self._synthesis_users[synthesis] = users
+        elif cancel:
+            if synthesis.done():
+                if not synthesis.cancelled():
+                    # Retrieve the error, so it is not reported as never retrieved
+                    synthesis.exception()
+            else:
+                synthesis.cancel()
+        return synthesis
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """Call ``listener`` with a copy of the task status on every status change."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[dict], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _set_status(self, task_id: str, status: str, **details):
+        task_status = self.tasks.pop(task_id, {"task_id": task_id})
+        task_status.update(details, status=status)
+        self.tasks[task_id] = task_status
+        while len(self.tasks) > MAX_TASK_HISTORY:
+            evicted, _ = self.tasks.popitem(last=False)
+            if evicted not in self.scheduler:
+                self._tenants.pop(evicted, None)
+        for listener in list(self._listeners):
+            listener(dict(task_status))
+
+    @staticmethod
+    def _targets(task: dict) -> Tuple[Optional[str], ...]:
+        """Return the devices a task is played on."""
+        return tuple(task.get("device_names") or [task["tts_request"].device_name])
+
     async def _process_queue(self):
         self.processing = True
-        while self.queue:
-            task_id, task = self.queue.popleft()
-            tts_request = task["tts_request"]
-            port = task["port"]
-            device_name = tts_request.device_name # Extract device_name from tts_request
+        try:
+            while self.queue:
+                batch = self._next_batch()
+                if not batch:
+                    continue
+                try:
+                    await self._process_batch(batch)
+                finally:
+                    for _, task in batch:
+                        self._release_audio(task)
+        finally:
+            # A worker that fails or is cancelled must not keep the next one from starting
+            self.processing = False
 
+    async def _process_batch(self, batch: List[Tuple[str, dict]]):
+        first_task = batch[0][1]
+        port = self.media_port or first_task["port"]
+        targets = self._targets(first_task)
+        device_name = targets[0] if len(targets) == 1 else ", ".join(targets)
+        if len(batch) > 1:
+            # Synthesize merged messages at the same time; they are still handled in order below
+            for _, task in batch:
+                if not task.get("cancelled") and "audio" not in task and "synthesis" not in task:
+                    self._use_synthesis(task, asyncio.create_task(self._render(task)))
+
+        generated = []
+        for task_id, task in batch:
+            if task.get("cancelled"):
+                # Cancelled while an earlier task of the batch was synthesized
+                self._release_synthesis(task, cancel=True)
+                continue
+            tts_request = task["tts_request"]
             self.log.info("Processing task from queue", task_id=task_id, text=tts_request.text, device_name=device_name)
+            self._set_status(task_id, "processing")
             try:
-                audio_file_full_path = await self.tts_service.generate_audio(tts_request)
-                audio_filename = os.path.basename(audio_file_full_path)
-                audio_url = f"http://{self.cast_service.host_ip}:{port}/audio/{audio_filename}"
-
-                await self.cast_service.play_audio(audio_url, device_name)
-                self.log.info("Finished processing task from queue", task_id=task_id, text=tts_request.text, device_name=device_name)
+                generated.append((task_id, task, await self._generate_audio(task)))
             except Exception as e:
+                if task.get("cancelled"):
+                    continue
+                self._unindex(task_id, task)
                 self.log.error("Error processing task from queue", task_id=task_id, text=tts_request.text, device_name=device_name, error=str(e))
-        self.processing = False
+                self._set_status(task_id, "failed", error=str(e))
+        self._processing.clear()
+
+        # Tasks cancelled while their audio was synthesized are not loaded on the devices
+        processed = []
+        audio_paths = []
+        for task_id, task, audio_path in generated:
+            if task.get("cancelled"):
+                self.log.info("Skipping cancelled task", task_id=task_id)
+                continue
+            self._unindex(task_id, task)
+            processed.append((task_id, task, audio_path))
+            audio_paths.append(audio_path)
+        if not audio_paths:
+            return
+
+        audio_file_full_path = None
+        try:
+            if len(audio_paths) > 1:
+                audio_file_full_path = await self._merge_audio(audio_paths)
+                self.log.info("Merged queued messages into one media load", messages=len(audio_paths), device_name=device_name)
+            else:
+                audio_file_full_path = audio_paths[0]
+            # Keep the audio janitor away from the file while it is played
+            self.store.index.pin(audio_file_full_path)
+            url_path = await asyncio.to_thread(self.store.url_path, audio_file_full_path)
+
+            details = {}
+            if len(targets) > 1:
+                playback = await self.cast_service.play_group(
+                    {target: self.cast_service.audio_url(url_path, port, target) for target in targets}
+                )
+                details["playback"] = playback
+                played = bool(playback["devices"])
+            else:
+                audio_url = self.cast_service.audio_url(url_path, port, targets[0])
+                played = await self.cast_service.play_audio(audio_url, targets[0])
+            for task_id, task, audio_path in processed:
+                tts_request = task["tts_request"]
+                if played:
+                    self.log.info("Finished processing task from queue", task_id=task_id, text=tts_request.text, device_name=device_name)
+                    self._record_played(task_id, task, audio_path)
+                    self._set_status(task_id, "completed", **details)
+                else:
+                    self.log.error("Error processing task from queue", task_id=task_id, text=tts_request.text, device_name=device_name, error="Device unreachable")
+                    self._set_status(task_id, "failed", error="Device unreachable", **details)
+        except Exception as e:
+            for task_id, task, _ in processed:
+                tts_request = task["tts_request"]
+                self.log.error("Error processing task from queue", task_id=task_id, text=tts_request.text, device_name=device_name, error=str(e))
+                self._set_status(task_id, "failed", error=str(e))
+        finally:
+            if audio_file_full_path:
+                # The devices keep fetching the file after playback starts
+                asyncio.get_running_loop().call_later(
+                    self.settings.CAST_PLAYBACK_TIMEOUT, self.store.index.unpin, audio_file_full_path
+                )
+
+    def _next_batch(self) -> List[Tuple[str, dict]]:
+        """Take the next task off the queue.
+
+        With QUEUE_MERGE_ENABLED, further tasks queued for the same devices
+        are taken as well, so they are played in one media load.
+        """
+        first = self._pop_task()
+        if first is None:
+            return []
+        batch = [first]
+        if not self.settings.QUEUE_MERGE_ENABLED or self.settings.AUDIO_FORMAT != "wav":
+            return batch
+        targets = self._targets(first[1])
+        while len(batch) < self.settings.QUEUE_MERGE_MAX_MESSAGES:
+            entry = self._pop_task(targets)
+            if entry is None:
+                break
+            batch.append(entry)
+        return batch
+
+    def _pop_task(self, lane: Optional[Tuple[Optional[str], ...]] = None) -> Optional[Tuple[str, dict]]:
+        """Take the next task that was not cancelled off the queue, or off one lane of it."""
+        while self.queue.lane_length(lane) if lane is not None else self.queue:
+            task_id, task = self.queue.pop() if lane is None else self.queue.pop_lane(lane)
+            if not task.get("cancelled"):
+                self._processing[task_id] = None
+                return task_id, task
+        return None
+
+    async def _synthesize(self, task: dict) -> str:
+        """Synthesize the audio of a task.
+
+        At most TTS_SYNTHESIS_CONCURRENCY syntheses run at the same time, and
+        the slots are shared between tenants in proportion to their weights.
+        """
+        if self._synthesis_slots is None:
+            self._synthesis_slots = FairSemaphore(self.settings.TTS_SYNTHESIS_CONCURRENCY)
+        async with self._synthesis_slots.slot(task.get("tenant"), task.get("weight", 1.0)):
+            return await self.tts_service.generate_audio(task["tts_request"])
+
+    async def _generate_audio(self, task: dict) -> str:
+        if "audio" in task:
+            # A replay plays stored audio again
+            return task["audio"]
+        synthesis = task.get("synthesis")
+        if synthesis:
+            try:
+                return await synthesis
+            finally:
+                # Until it is released, cancelling a task that shares the synthesis leaves it running
+                self._release_synthesis(task)
+        return await self._render(task)
+
+    async def _render(self, task: dict) -> str:
+        """Compose the audio of a template task, or synthesize the text of any other."""
+        tts_request = task["tts_request"]
+        template_request = task.get("template")
+        if template_request and self.template_service:
+            return await self.template_service.compose(
+                template_request.template, template_request.slots, tts_request.voice
+            )
+        return await self._synthesize(task)
+
+    async def _merge_audio(self, audio_paths: List[str]) -> str:
+        """Join the audio of several messages, separated by QUEUE_MERGE_GAP_MS of silence."""
+        def read(path: str) -> bytes:
+            with open(path, "rb") as f:
+                return f.read()
+
+        parts = await asyncio.to_thread(lambda: [read(path) for path in audio_paths])
+        merged = concat_wav(parts, gap=self.settings.QUEUE_MERGE_GAP_MS / 1000)
+        # A part can be re-rendered under the same name, so the merge is identified by the parts' content
+        digests = "\n".join(hashlib.sha256(part).hexdigest() for part in parts)
+        return self.tts_service.save_audio(merged, digests, "merge", f"merge:{self.settings.QUEUE_MERGE_GAP_MS}")
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from src.config.settings import Settings
+import structlog
+
+log = structlog.get_logger(__name__)
+
+DAY = 86400
+# How long a client is asked to wait when the bucket database stays locked
+BUSY_RETRY_AFTER = 1.0
+
+class ApiKey:
+    """An API key with its own request rate, burst and daily synthesis quota.
+
+    ``rate`` is in requests per second; 0 disables the rate limit, as does
+    a ``daily_quota`` of 0 for the quota. ``weight`` is the key's share of
+    the queue and of TTS synthesis relative to other keys.
+    """
+
+    def __init__(self, name: str, key: str, rate: float, burst: int, daily_quota: int = 0, weight: float = 1.0):
+        if weight <= 0:
+            raise ValueError(f"API key {name!r} must have a positive weight")
+        self.name = name
+        self.secret = key.encode()
+        self.rate = rate
+        self.burst = burst
+        self.daily_quota = daily_quota
+        self.weight = weight
+
+def load_api_keys(path: str, settings: Settings) -> List[ApiKey]:
+    """Load additional API keys from a JSON file.
+
+    The file maps key names to ``{"key": ..., "requests": ..., "window": ...,
+    "burst": ..., "daily_quota": ..., "weight": ...}``. Everything but
+    ``key`` and ``weight`` defaults to the RATE_LIMIT_* settings; ``burst``
+    defaults to ``requests`` and ``weight`` to 1.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    keys = []
+    for name, definition in data.items():
+        requests = definition.get("requests", settings.RATE_LIMIT_REQUESTS)
+        window = definition.get("window", settings.RATE_LIMIT_WINDOW)
+        keys.append(ApiKey(
+            name,
+            definition["key"],
+            rate=requests / window if requests > 0 else 0.0,
+            burst=definition.get("burst", requests),
+            daily_quota=definition.get("daily_quota", settings.RATE_LIMIT_DAILY_QUOTA),
+            weight=definition.get("weight", 1.0),
+        ))
+    return keys
+
+class RateDecision(NamedTuple):
+    """The outcome of a request; ``reason`` is "rate", "quota" or "busy" when it is denied."""
+
+    allowed: bool
+    tokens: float
+    quota_used: int
+    retry_after: float = 0.0
+    reason: Optional[str] = None
+
+def take(
+    api_key: ApiKey,
+    state: Optional[Tuple[float, float, int, int]],
+    tokens: int,
+    units: int,
+    now: float,
+) -> Tuple[RateDecision, Tuple[float, float, int, int]]:
+    """Apply a request to a bucket state of ``(tokens, updated, day, quota_used)``.
+
+    Returns the decision and the new state. The bucket refills lazily from
+    the time it was last updated, so every request is O(1).
+    """
+    available, updated, day, used = state or (float(api_key.burst), now, 0, 0)
+    if api_key.rate > 0:
+        available = min(float(api_key.burst), available + max(0.0, now - updated) * api_key.rate)
+    today = int(now // DAY)
+    if day != today:
+        day, used = today, 0
+
+    if api_key.daily_quota and units and used + units > api_key.daily_quota:
+        decision = RateDecision(False, available, used, (today + 1) * DAY - now, "quota")
+    elif api_key.rate > 0 and tokens > available:
+        decision = RateDecision(False, available, used, (tokens - available) / api_key.rate, "rate")
+    else:
+        if api_key.rate > 0:
+            available -= tokens
+        used += units
+        decision = RateDecision(True, available, used)
+    return decision, (available, now, day, used)
+
+class MemoryBucketStore:
+    """Keeps the buckets of this process."""
+
+    blocking = False
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float, int, int]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, api_key: ApiKey, tokens: int, units: int, now: float) -> RateDecision:
+        with self._lock:
+            decision, self._buckets[api_key.name] = take(api_key, self._buckets.get(api_key.name), tokens, units, now)
+        return decision
+
+class SQLiteBucketStore:
+    """Keeps the buckets in a SQLite database, shared by all worker processes.
+
+    Each request is one short write transaction on a single row. It may
+    wait up to a second for another process's transaction, so it is run in
+    a worker thread. A request that still finds the database locked is
+    denied as "busy".
+    """
+
+    blocking = True
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "name TEXT PRIMARY KEY, tokens REAL, updated REAL, day INTEGER, used INTEGER)"
+        )
+        self._lock = threading.Lock()
+
+    def acquire(self, api_key: ApiKey, tokens: int, units: int, now: float) -> RateDecision:
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    state = self._conn.execute(
+                        "SELECT tokens, updated, day, used FROM buckets WHERE name = ?", (api_key.name,)
+                    ).fetchone()
+                    decision, state = take(api_key, state, tokens, units, now)
+                    self._conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?)", (api_key.name, *state))
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    if self._conn.in_transaction:
+                        self._conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.OperationalError as e:
+                log.warning("Rate limit database is busy", key=api_key.name, error=str(e))
+                return RateDecision(False, 0.0, 0, BUSY_RETRY_AFTER, "busy")
+        return decision
+
+class RateLimiter:
+    """Authenticates API keys and applies their rate limits and quotas."""
+
+    def __init__(self, settings: Settings, keys: Optional[List[ApiKey]] = None, store=None):
+        self.settings = settings
+        if keys is None:
+            requests = settings.RATE_LIMIT_REQUESTS
+            keys = [ApiKey(
+                "default",
+                settings.API_KEY,
+                rate=requests / settings.RATE_LIMIT_WINDOW if requests > 0 else 0.0,
+                burst=requests,
+                daily_quota=settings.RATE_LIMIT_DAILY_QUOTA,
+            )]
+            if settings.API_KEYS_FILE:
+                keys += load_api_keys(settings.API_KEYS_FILE, settings)
+        self.keys = keys
+        if store is None:
+            if settings.RATE_LIMIT_DB:
+                store = SQLiteBucketStore(settings.RATE_LIMIT_DB)
+            else:
+                if settings.WORKERS > 1:
+                    log.warning("Rate limits are kept per worker process, set RATE_LIMIT_DB to share them")
+                store = MemoryBucketStore()
+        self.store = store
+
+    def authenticate(self, key: Optional[str]) -> Optional[ApiKey]:
+        """Return the API key matching ``key``, compared in constant time."""
+        if not key:
+            return None
+        given = key.encode()
+        match = None
+        for api_key in self.keys:
+            # Every key is compared, so the response time does not tell which one matched
+            if secrets.compare_digest(given, api_key.secret):
+                match = api_key
+        return match
+
+    async def acquire(self, api_key: ApiKey, tokens: int = 1, units: int = 0) -> RateDecision:
+        """Take ``tokens`` requests from the key's bucket and ``units`` announcements from its daily quota."""
+        if self.store.blocking:
+            # Keep the event loop running while the store waits for a lock
+            return await asyncio.to_thread(self.store.acquire, api_key, tokens, units, time.time())
+        return self.store.acquire(api_key, tokens, units, time.time())
+
+    @staticmethod
+    def headers(api_key: ApiKey, decision: RateDecision) -> Dict[str, str]:
+        if decision.reason == "busy":
+            return {"Retry-After": str(max(1, int(decision.retry_after + 0.999)))}
+        headers = {}
+        if api_key.rate > 0:
+            headers["X-RateLimit-Limit"] = str(api_key.burst)
+            headers["X-RateLimit-Remaining"] = str(int(decision.tokens))
+        if api_key.daily_quota:
+            headers["X-Quota-Limit"] = str(api_key.daily_quota)
+            headers["X-Quota-Remaining"] = str(max(0, api_key.daily_quota - decision.quota_used))
+        if not decision.allowed:
+            headers["Retry-After"] = str(max(1, int(decision.retry_after + 0.999)))
+        return headers
@@ -0,0 +1,92 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# The phases of a scheduled item: prepared ``lead`` seconds before it is due, then released
+PREPARE, RELEASE = 0, 1
+
+class Scheduler:
+    """Holds items until a wall-clock time, with one event loop timer for all of them.
+
+    Every item is passed to ``on_prepare`` ``lead`` seconds before its due
+    time and to ``on_release`` when it is due. The pending times are kept
+    in a heap, and a single timer is armed for the earliest one, so tens of
+    thousands of pending items cost a heap entry each and no coroutines.
+    """
+
+    def __init__(self, lead: float, on_prepare: Callable[[Hashable, Any], None], on_release: Callable[[Hashable, Any], None]):
+        self.lead = lead
+        self.on_prepare = on_prepare
+        self.on_release = on_release
+        self._heap: List[Tuple[float, int, Hashable, int]] = []
+        self._pending: Dict[Hashable, Tuple[float, Any]] = {}
+        self._counter = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._pending
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._pending.get(key)
+        return entry[1] if entry else None
+
+    def schedule(self, key: Hashable, deliver_at: float, item: Any):
+        """Hold ``item`` until ``deliver_at``, a Unix timestamp."""
+        loop = asyncio.get_running_loop()
+        # The timer runs on the loop's monotonic clock, so clock adjustments do not move it
+        due = loop.time() + (deliver_at - time.time())
+        self._pending[key] = (due, item)
+        heapq.heappush(self._heap, (due - self.lead, next(self._counter), key, PREPARE))
+        self._arm(loop)
+
+    def cancel(self, key: Hashable) -> Optional[Any]:
+        """Drop a pending item and return it, or None if it is not pending."""
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return None
+        # The heap entries are skipped when they come up; rebuild the heap once they pile up
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            self._heap = [entry for entry in self._heap if entry[2] in self._pending]
+            heapq.heapify(self._heap)
+        return entry[1]
+
+    def close(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _arm(self, loop: asyncio.AbstractEventLoop):
+        if not self._heap:
+            self.close()
+            return
+        when = self._heap[0][0]
+        if self._timer and self._timer.when() <= when:
+            return
+        self.close()
+        self._timer = loop.call_at(when, self._fire)
+
+    def _fire(self):
+        self._timer = None
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        try:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, key, phase = heapq.heappop(self._heap)
+                entry = self._pending.get(key)
+                if entry is None:
+                    continue
+                due, item = entry
+                if phase == PREPARE:
+                    heapq.heappush(self._heap, (due, next(self._counter), key, RELEASE))
+                    self.on_prepare(key, item)
+                else:
+                    del self._pending[key]
+                    self.on_release(key, item)
+        finally:
+            # Items left behind by a failing callback are picked up right away
+            self._arm(loop)
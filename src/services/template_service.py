@@ -0,0 +1,133 @@
+import asyncio
+import json
+import string
+from typing import Dict, List, Optional
+from src.config.settings import Settings
+from src.models.requests import TTSRequest
+from src.services.tts_service import TTSService, TTSUnavailableError
+from src.utils.audio_processing import decode_pcm16, encode_pcm16, prepend_chime
+from src.utils.wav_utils import concat_wav, read_wav
+import structlog
+
+TEMPLATE_VARIANT = "template"
+
+class AnnouncementTemplate:
+    """A templated announcement such as ``"Package delivered at {door}"``.
+
+    The template is split into static text fragments and slots. Slots list
+    the values they are expected to take; those values are synthesized once
+    and joined with the static fragments instead of synthesizing the whole
+    sentence for every message.
+    """
+
+    def __init__(self, name: str, template: str, slots: Optional[Dict[str, List[str]]] = None):
+        self.name = name
+        self.template = template
+        self.slots = {slot: list(values) for slot, values in (slots or {}).items()}
+        self.parts = []
+        for literal, field, _, _ in string.Formatter().parse(template):
+            if literal.strip():
+                self.parts.append((False, literal.strip()))
+            if field is not None:
+                if not field.isidentifier():
+                    raise ValueError(f"Template '{name}' has an invalid slot '{{{field}}}'")
+                self.parts.append((True, field))
+        self.slot_names = [value for is_slot, value in self.parts if is_slot]
+
+    def missing_slots(self, values: Dict[str, str]) -> List[str]:
+        return [slot for slot in self.slot_names if slot not in values]
+
+    def render(self, values: Dict[str, str]) -> str:
+        """Return the full announcement text."""
+        return self.template.format(**values)
+
+    def is_enumerated(self, values: Dict[str, str]) -> bool:
+        """Whether every slot value is one of the enumerated values."""
+        return all(values[slot] in self.slots.get(slot, ()) for slot in self.slot_names)
+
+    def fragments(self, values: Dict[str, str]) -> List[str]:
+        """Return the texts to synthesize, in playback order."""
+        return [values[value] if is_slot else value for is_slot, value in self.parts]
+
+    def all_fragments(self) -> List[str]:
+        """Return every static fragment and enumerated slot value."""
+        texts = [value for is_slot, value in self.parts if not is_slot]
+        for slot in self.slot_names:
+            texts.extend(self.slots.get(slot, []))
+        return texts
+
+def load_templates(path: str) -> Dict[str, AnnouncementTemplate]:
+    """Load announcement templates from a JSON file.
+
+    The file maps template names to ``{"template": ..., "slots": {...}}``,
+    where ``slots`` maps each slot name to its enumerated values.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {
+        name: AnnouncementTemplate(name, definition["template"], definition.get("slots"))
+        for name, definition in data.items()
+    }
+
+class TemplateService:
+    """Composes templated announcements from cached audio fragments."""
+
+    def __init__(self, tts_service: TTSService, settings: Settings, templates: Optional[Dict[str, AnnouncementTemplate]] = None):
+        self.tts_service = tts_service
+        self.settings = settings
+        if templates is None and settings.TEMPLATES_FILE:
+            templates = load_templates(settings.TEMPLATES_FILE)
+        self.templates = templates or {}
+        self.log = structlog.get_logger(__name__)
+
+    def get_template(self, name: str) -> Optional[AnnouncementTemplate]:
+        return self.templates.get(name)
+
+    def fragment_texts(self) -> List[str]:
+        """Return the fragments of every template, for prewarming."""
+        texts = []
+        for template in self.templates.values():
+            texts.extend(template.all_fragments())
+        return list(dict.fromkeys(texts))
+
+    async def compose(self, name: str, values: Dict[str, str], voice: Optional[str] = None) -> str:
+        """Return the path of the audio for a template with the given slot values.
+
+        Enumerated slot values are joined from cached fragments at sample
+        level. Unseen slot values fall back to synthesizing the full text.
+        """
+        template = self.templates[name]
+        voice = voice or self.settings.DEEPGRAM_MODEL
+        text = template.render(values)
+
+        variant = ",".join(filter(None, [TEMPLATE_VARIANT, self.tts_service.postprocess_variant()]))
+        cached_path = self.tts_service.get_cached_audio(text, voice, variant)
+        if cached_path:
+            return cached_path
+
+        if template.is_enumerated(values):
+            try:
+                # Never compose with the fallback chime standing in for a
+                # fragment, and prepend the attention chime only once.
+                fragment_paths = await asyncio.gather(*(
+                    self.tts_service.generate_audio(TTSRequest(text=fragment, voice=voice), fallback=False, chime=False)
+                    for fragment in template.fragments(values)
+                ))
+                parts = [self._read(path) for path in fragment_paths]
+                data = concat_wav(parts)
+                if self.settings.AUDIO_PREPEND_CHIME:
+                    audio = read_wav(data)
+                    data = encode_pcm16(audio.params, prepend_chime(decode_pcm16(audio), audio.params.sample_rate))
+                file_path = self.tts_service.save_audio(data, text, voice, variant)
+                self.log.info("Composed template audio", template=name, fragments=len(parts), path=file_path)
+                return file_path
+            except (ValueError, TTSUnavailableError) as e:
+                self.log.warning("Could not compose template audio, synthesizing full text", template=name, error=str(e))
+
+        return await self.tts_service.generate_audio(TTSRequest(text=text, voice=voice))
+
+    def _read(self, path: str) -> bytes:
+        # Fragments are short clips; a direct read is cheaper than a
+        # round trip through a worker thread.
+        with open(path, "rb") as f:
+            return f.read()
@@ -0,0 +1,127 @@
+import asyncio
+import math
+import sys
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Protocol
+import httpx
+from deepgram import DeepgramClient
+from src.config.settings import Settings
+from src.utils.wav_utils import WavParams, encode_wav
+
+class TTSBackend(Protocol):
+    """A text-to-speech engine.
+
+    ``synthesize`` returns the complete encoded audio file for ``text``
+    spoken with ``voice`` in format ``fmt`` (e.g. ``"wav"``).
+    """
+
+    name: str
+
+    async def synthesize(self, text: str, voice: str, fmt: str) -> bytes:
+        ...
+
+class DeepgramBackend:
+    """Synthesizes speech with the Deepgram REST API."""
+
+    name = "deepgram"
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.deepgram = DeepgramClient(self.settings.DEEPGRAM_API_KEY)
+
+    def speak_options(self, voice: str, fmt: str) -> dict:
+        """Return the Deepgram speak options for an audio format."""
+        options = {"model": voice}
+        if fmt == "wav":
+            # Request uncompressed PCM so cached fragments can be joined
+            # at sample level.
+            options.update({
+                "encoding": "linear16",
+                "container": "wav",
+                "sample_rate": self.settings.AUDIO_SAMPLE_RATE,
+            })
+        return options
+
+    async def synthesize(self, text: str, voice: str, fmt: str) -> bytes:
+        response = await asyncio.to_thread(
+            self.deepgram.speak.rest.v("1").stream_memory,
+            {"text": text},
+            self.speak_options(voice, fmt),
+            timeout=httpx.Timeout(self.settings.DEEPGRAM_TIMEOUT),
+        )
+        return response.stream_memory.getvalue()
+
+_process_pool = None
+
+def get_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Returns the process pool shared by local synthesis."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=max_workers)
+    return _process_pool
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+def render_tone_speech(text: str, voice: str, sample_rate: int) -> bytes:
+    """Render text as a deterministic sequence of tones, one per word.
+
+    Each word becomes a tone whose pitch is derived from the word and the
+    voice and whose length grows with the word, separated by short pauses
+    and longer ones after punctuation. The output has the shape of speech
+    (duration, pauses) without any network access.
+    """
+    base_frequency = 180.0 + zlib.crc32(voice.encode("utf-8")) % 120
+    samples = array("h")
+    for word in text.split():
+        frequency = base_frequency * 2 ** ((zlib.crc32(word.lower().encode("utf-8")) % 12) / 12)
+        frames = int(sample_rate * max(0.1, 0.06 * len(word)))
+        fade_frames = max(1, frames // 8)
+        step = 2 * math.pi * frequency / sample_rate
+        for i in range(frames):
+            envelope = min(1.0, i / fade_frames, (frames - i) / fade_frames)
+            samples.append(int(0.4 * 32767 * envelope * math.sin(step * i)))
+        pause = 0.25 if word[-1] in ".,;:!?" else 0.05
+        samples.extend([0] * int(sample_rate * pause))
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return encode_wav(WavParams(1, 2, sample_rate), samples.tobytes())
+
+class LocalToneBackend:
+    """Offline backend that renders tone sequences in a process pool.
+
+    Meant for load testing without network access and as a fallback when
+    Deepgram is unavailable.
+    """
+
+    name = "local"
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+
+    async def synthesize(self, text: str, voice: str, fmt: str) -> bytes:
+        if fmt != "wav":
+            raise ValueError(f"The local TTS backend cannot produce '{fmt}' audio")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_process_pool(self.settings.LOCAL_TTS_WORKERS),
+            render_tone_speech, text, voice, self.settings.AUDIO_SAMPLE_RATE,
+        )
+
+BACKENDS = {
+    DeepgramBackend.name: DeepgramBackend,
+    LocalToneBackend.name: LocalToneBackend,
+}
+
+def create_backend(name: Optional[str], settings: Settings) -> Optional[TTSBackend]:
+    """Create the backend registered under ``name``, or None if no name is given."""
+    if not name:
+        return None
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name](settings)
@@ -1,38 +1,329 @@
-import os
+import time
 import httpx
 import asyncio
-from deepgram import DeepgramClient
+import hashlib
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 from src.config.settings import Settings
 from src.models.requests import TTSRequest
+from src.services.audio_store import AudioStore
+from src.services.tts_backends import TTSBackend, create_backend
+from src.utils.audio_processing import (
+    decode_pcm16,
+    encode_pcm16,
+    normalize_loudness,
+    prepend_chime,
+    time_stretch,
+    trim_silence,
+)
+from src.utils.circuit_breaker import CircuitBreaker, LatencyTracker
+from src.utils.wav_utils import generate_chime, read_wav
 import structlog
-import time
+
+class TTSUnavailableError(Exception):
+    """Raised when synthesis is rejected because the primary TTS backend is failing."""
+
+_circuit_breaker = None
+_latency_tracker = None
+
+def get_circuit_breaker(settings: Settings) -> CircuitBreaker:
+    """Returns the process-wide circuit breaker of the primary TTS backend."""
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        _circuit_breaker = CircuitBreaker(
+            failure_rate=settings.DEEPGRAM_BREAKER_FAILURE_RATE,
+            window=settings.DEEPGRAM_BREAKER_WINDOW,
+            min_calls=settings.DEEPGRAM_BREAKER_MIN_CALLS,
+            reset_timeout=settings.DEEPGRAM_BREAKER_RESET_TIMEOUT,
+        )
+    return _circuit_breaker
+
+def get_latency_tracker() -> LatencyTracker:
+    """Returns the process-wide latency tracker of the primary TTS backend."""
+    global _latency_tracker
+    if _latency_tracker is None:
+        _latency_tracker = LatencyTracker()
+    return _latency_tracker
 
 class TTSService:
     def __init__(self, settings: Settings):
         self.settings = settings
-        self.deepgram = DeepgramClient(self.settings.DEEPGRAM_API_KEY)
+        self.backend: TTSBackend = create_backend(self.settings.TTS_BACKEND, self.settings)
+        fallback_backend = self.settings.TTS_FALLBACK_BACKEND
+        if fallback_backend == self.backend.name:
+            fallback_backend = None
+        self.fallback_backend: Optional[TTSBackend] = create_backend(fallback_backend, self.settings)
         self.log = structlog.get_logger(__name__)
+        self.circuit_breaker = get_circuit_breaker(settings)
+        self.latency_tracker = get_latency_tracker()
+        self.store = AudioStore(settings)
 
-    async def generate_audio(self, tts_request: TTSRequest) -> str:
-        self.log.info("Requesting TTS from Deepgram", text=tts_request.text, voice=tts_request.voice)
-        try:
-            # Ensure the audio directory exists
-            os.makedirs(self.settings.AUDIO_OUTPUT_DIR, exist_ok=True)
+    def cache_key(self, text: str, voice: Optional[str] = None, variant: str = "", backend: Optional[str] = None) -> str:
+        """Return the cache key for a text/voice pair.
+
+        ``variant`` distinguishes audio derived from the same text, such as a
+        composed template, from the plain synthesis. ``backend`` defaults to
+        the primary backend, so fallback audio never shadows real audio.
+        """
+        voice = voice or self.settings.DEEPGRAM_MODEL
+        backend = backend or self.backend.name
+        parts = [backend, voice, self.settings.AUDIO_FORMAT, str(self.settings.AUDIO_SAMPLE_RATE), variant, text]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def get_audio_path(self, text: str, voice: Optional[str] = None, variant: str = "", backend: Optional[str] = None) -> str:
+        """Return the path the audio for a text/voice pair is stored at."""
+        return self.store.path(self.cache_key(text, voice, variant, backend))
+
+    def get_cached_audio(self, text: str, voice: Optional[str] = None, variant: str = "", backend: Optional[str] = None) -> Optional[str]:
+        """Return the path of previously rendered audio, or None on a cache miss."""
+        if not self.settings.AUDIO_CACHE_ENABLED:
+            return None
+        return self.store.get(self.cache_key(text, voice, variant, backend))
+
+    def save_audio(self, data: bytes, text: str, voice: Optional[str] = None, variant: str = "") -> str:
+        """Store audio produced locally (e.g. by composition) in the cache."""
+        return self.store.put(self.cache_key(text, voice, variant), data)
+
+    async def _put(self, key: str, data: bytes) -> str:
+        # Write in a worker thread, but record the file in the index on the event loop
+        file_path = await asyncio.to_thread(self.store.write, key, data)
+        self.store.index.record(file_path, len(data))
+        return file_path
 
-            file_path = os.path.join(self.settings.AUDIO_OUTPUT_DIR, f"{int(time.time())}.wav")
+    def get_fallback_audio(self) -> Optional[str]:
+        """Return the path of the "service unavailable" chime, rendering it on first use."""
+        if not self.settings.TTS_FALLBACK_CHIME or self.settings.AUDIO_FORMAT != "wav":
+            return None
+        key = self.cache_key("service unavailable", "chime", "chime")
+        return self.store.get(key) or self.store.put(key, generate_chime(self.settings.AUDIO_SAMPLE_RATE))
 
-            await asyncio.to_thread(
-                self.deepgram.speak.rest.v("1").save,
-                file_path,
-                {"text": tts_request.text},
-                {"model": tts_request.voice}
+    def postprocess_variant(self, chime: Optional[bool] = None) -> str:
+        """Return the cache variant describing the configured post-processing.
+
+        Returns an empty string when no post-processing applies. The
+        settings are part of the variant so changing them re-renders.
+        """
+        if self.settings.AUDIO_FORMAT != "wav":
+            return ""
+        chime = self.settings.AUDIO_PREPEND_CHIME if chime is None else chime
+        steps = []
+        if self.settings.AUDIO_TRIM_SILENCE:
+            steps.append(f"trim:{self.settings.AUDIO_SILENCE_THRESHOLD_DB:g}:{self.settings.AUDIO_SILENCE_PADDING_MS}")
+        if self.settings.AUDIO_NORMALIZE_LOUDNESS:
+            steps.append(f"loudness:{self.settings.AUDIO_TARGET_LOUDNESS:g}")
+        if chime:
+            steps.append("chime")
+        return ",".join(steps)
+
+    def postprocess(self, samples: np.ndarray, sample_rate: int, chime: Optional[bool] = None) -> np.ndarray:
+        """Apply the configured silence trimming, loudness normalization and chime."""
+        chime = self.settings.AUDIO_PREPEND_CHIME if chime is None else chime
+        if self.settings.AUDIO_TRIM_SILENCE:
+            samples = trim_silence(
+                samples, sample_rate, self.settings.AUDIO_SILENCE_THRESHOLD_DB, self.settings.AUDIO_SILENCE_PADDING_MS
             )
-            
+        if self.settings.AUDIO_NORMALIZE_LOUDNESS:
+            samples = normalize_loudness(samples, sample_rate, self.settings.AUDIO_TARGET_LOUDNESS)
+        if chime:
+            samples = prepend_chime(samples, sample_rate)
+        return samples
+
+    async def generate_audio(self, tts_request: TTSRequest, force: bool = False, fallback: bool = True, chime: Optional[bool] = None) -> str:
+        """Return the path of the audio for a request, synthesizing it on a cache miss.
+
+        Only the raw normal-speed audio is synthesized. Post-processing and
+        other speeds are applied to it locally and cached as variants next
+        to it. While the circuit breaker is open the request fails fast.
+        With ``fallback``, a failed request is retried on the fallback
+        backend and, if the breaker is open, the "service unavailable" chime
+        is returned as a last resort. ``chime`` overrides AUDIO_PREPEND_CHIME.
+        """
+        voice = tts_request.voice or self.settings.DEEPGRAM_MODEL
+        speed = tts_request.speed or 1.0
+        if self.settings.AUDIO_FORMAT != "wav":
+            speed = 1.0
+
+        post_variant = self.postprocess_variant(chime)
+        variant = post_variant
+        if speed != 1.0:
+            variant = ",".join(filter(None, [post_variant, f"speed:{speed:g}"]))
+        if not variant:
+            return await self._synthesize(tts_request.text, voice, force, fallback)
+
+        if not force:
+            cached_path = self.get_cached_audio(tts_request.text, voice, variant)
+            if cached_path:
+                self.log.info("Using cached audio", text=tts_request.text, voice=voice, variant=variant, path=cached_path)
+                return cached_path
+
+        raw_path = await self._synthesize(tts_request.text, voice, force, fallback)
+        if raw_path != self.get_audio_path(tts_request.text, voice):
+            # Fallback audio is played as is rather than cached as a variant
+            return raw_path
+
+        keys = {
+            result_variant: self.cache_key(tts_request.text, voice, result_variant)
+            for result_variant in filter(None, [post_variant, variant])
+        }
+        try:
+            written = await asyncio.to_thread(self._process_file, raw_path, keys, speed, chime, post_variant, variant)
+        except ValueError as e:
+            self.log.warning("Could not process audio, playing it unprocessed", path=raw_path, error=str(e))
+            return raw_path
+        for file_path, size in written:
+            self.store.index.record(file_path, size)
+        self.log.info("Generated processed audio", variant=variant, path=file_path)
+        return file_path
+
+    def _process_file(
+        self, raw_path: str, keys: Dict[str, str], speed: float, chime: Optional[bool], post_variant: str, variant: str
+    ) -> List[Tuple[str, int]]:
+        """Process the raw audio at ``raw_path`` and write every variant to the store.
+
+        Runs in a worker thread, as it reads and writes files. Returns the
+        path and size of each written file, the requested variant last.
+        """
+        with open(raw_path, "rb") as f:
+            data = f.read()
+        return [
+            (self.store.write(keys[result_variant], audio), len(audio))
+            for result_variant, audio in self._process(data, speed, chime, post_variant, variant)
+        ]
+
+    def _process(self, data: bytes, speed: float, chime: Optional[bool], post_variant: str, variant: str) -> List[Tuple[str, bytes]]:
+        # Decode once and run every stage on the in-memory samples. The
+        # post-processed audio is returned too so other speeds can reuse it.
+        audio = read_wav(data)
+        samples = decode_pcm16(audio)
+        results = []
+        if post_variant:
+            samples = self.postprocess(samples, audio.params.sample_rate, chime)
+            results.append((post_variant, encode_pcm16(audio.params, samples)))
+        if speed != 1.0:
+            samples = time_stretch(samples, speed, audio.params.sample_rate)
+            results.append((variant, encode_pcm16(audio.params, samples)))
+        return results
+
+    async def _synthesize(self, text: str, voice: str, force: bool, fallback: bool) -> str:
+        if not force:
+            cached_path = self.get_cached_audio(text, voice)
+            if cached_path:
+                self.log.info("Using cached audio", text=text, voice=voice, path=cached_path)
+                return cached_path
+
+        self.log.info("Requesting TTS", backend=self.backend.name, text=text, voice=voice)
+        try:
+            if not self.circuit_breaker.allow_request():
+                raise TTSUnavailableError(f"Circuit breaker for the {self.backend.name} backend is open")
+
+            audio = await self._request_with_deadline(text, voice, self.circuit_breaker.trial)
+            file_path = await self._put(self.cache_key(text, voice), audio)
+
             self.log.info("Successfully generated audio file", path=file_path)
             return file_path
-        except httpx.HTTPStatusError as e:
-            self.log.error("Deepgram API error", status_code=e.response.status_code, response=e.response.text)
+        except Exception as e:
+            self._log_failure(e)
+            fallback_path = await self._fallback(text, voice, e) if fallback else None
+            if fallback_path:
+                return fallback_path
+            raise
+
+    def _log_failure(self, error: Exception):
+        if isinstance(error, TTSUnavailableError):
+            self.log.warning("TTS backend unavailable", backend=self.backend.name, error=str(error))
+        elif isinstance(error, TimeoutError):
+            self.log.error("TTS request timed out", backend=self.backend.name, timeout=self.settings.DEEPGRAM_TIMEOUT)
+        elif isinstance(error, httpx.HTTPStatusError):
+            self.log.error("Deepgram API error", status_code=error.response.status_code, response=error.response.text)
+        else:
+            self.log.error("Error generating audio", backend=self.backend.name, error=str(error))
+
+    async def _fallback(self, text: str, voice: str, error: Exception) -> Optional[str]:
+        if self.fallback_backend:
+            backend = self.fallback_backend.name
+            cached_path = self.get_cached_audio(text, voice, backend=backend)
+            if cached_path:
+                return cached_path
+            try:
+                audio = await asyncio.wait_for(
+                    self.fallback_backend.synthesize(text, voice, self.settings.AUDIO_FORMAT),
+                    timeout=self.settings.DEEPGRAM_TIMEOUT,
+                )
+                file_path = await self._put(self.cache_key(text, voice, backend=backend), audio)
+                self.log.warning("Generated audio with fallback TTS backend", backend=backend, path=file_path)
+                return file_path
+            except Exception as e:
+                self.log.error("Fallback TTS backend failed", backend=backend, error=str(e))
+        if isinstance(error, TTSUnavailableError):
+            return self.get_fallback_audio()
+        return None
+
+    async def _request_with_deadline(self, text: str, voice: str, trial: Optional[int] = None) -> bytes:
+        start = time.perf_counter()
+        try:
+            audio = await asyncio.wait_for(self._request_hedged(text, voice), timeout=self.settings.DEEPGRAM_TIMEOUT)
+        except asyncio.CancelledError:
+            # A cancelled request says nothing about the backend; give back its trial, if it holds one
+            self.circuit_breaker.release_trial(trial)
             raise
         except Exception as e:
-            self.log.error("Error generating audio", error=str(e))
+            if self._is_upstream_failure(e):
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+            raise
+        self.latency_tracker.record(time.perf_counter() - start)
+        self.circuit_breaker.record_success()
+        return audio
+
+    async def _request_hedged(self, text: str, voice: str) -> bytes:
+        """Request audio, sending a second request if the first one is slow.
+
+        The second request goes out once the first has taken longer than the
+        configured latency percentile; whichever succeeds first wins.
+        """
+        first = asyncio.ensure_future(self._request_audio(text, voice))
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return await first
+
+        try:
+            done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+        except asyncio.CancelledError:
+            first.cancel()
             raise
+        if done:
+            return first.result()
+
+        self.log.info("Deepgram request is slow, sending hedged request", after=round(hedge_delay, 3))
+        pending = {first, asyncio.ensure_future(self._request_audio(text, voice))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _request_audio(self, text: str, voice: str) -> bytes:
+        return await self.backend.synthesize(text, voice, self.settings.AUDIO_FORMAT)
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.settings.DEEPGRAM_HEDGE_ENABLED:
+            return None
+        if len(self.latency_tracker) < self.settings.DEEPGRAM_HEDGE_MIN_SAMPLES:
+            return None
+        return self.latency_tracker.percentile(self.settings.DEEPGRAM_HEDGE_PERCENTILE)
+
+    def _is_upstream_failure(self, error: Exception) -> bool:
+        # Client errors other than throttling mean Deepgram is up but
+        # rejected this particular request.
+        if isinstance(error, httpx.HTTPStatusError):
+            status_code = error.response.status_code
+            return status_code >= 500 or status_code == 429
+        return True
@@ -0,0 +1,157 @@
+from functools import lru_cache
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from src.utils.wav_utils import WavAudio, WavParams, encode_wav, generate_chime, read_wav
+
+FULL_SCALE = 32768.0
+
+def decode_pcm16(audio: WavAudio) -> np.ndarray:
+    """Return the samples of 16-bit PCM audio as float32 of shape (frames, channels)."""
+    if audio.params.sample_width != 2:
+        raise ValueError(f"Only 16-bit PCM is supported, got {audio.params.sample_width * 8}-bit")
+    samples = np.frombuffer(audio.frames, dtype="<i2").astype(np.float32)
+    return samples.reshape(-1, audio.params.channels)
+
+def encode_pcm16(params: WavParams, samples: np.ndarray) -> bytes:
+    """Encode float samples of shape (frames, channels) as a 16-bit PCM WAV file."""
+    pcm = np.clip(np.rint(samples), -32768, 32767).astype("<i2")
+    return encode_wav(params, pcm.tobytes())
+
+def time_stretch(samples: np.ndarray, rate: float, sample_rate: int, frame_ms: float = 40.0, tolerance_ms: float = 10.0) -> np.ndarray:
+    """Change the tempo of audio without changing its pitch (WSOLA).
+
+    ``rate`` above 1 speeds the audio up. Output frames are overlap-added
+    with a Hann window at 50% overlap; each analysis frame is taken from
+    within ``tolerance_ms`` of its nominal position, at the offset that best
+    continues the previously chosen frame. ``samples`` has shape
+    (frames, channels); alignment is computed on the channel mix.
+    """
+    if rate == 1.0 or len(samples) == 0:
+        return samples
+
+    frame = max(2, int(sample_rate * frame_ms / 1000) // 2 * 2)
+    hop = frame // 2
+    tolerance = int(sample_rate * tolerance_ms / 1000)
+    window = np.hanning(frame + 1)[:frame].astype(np.float32)
+
+    out_length = int(round(len(samples) / rate))
+    n_frames = out_length // hop + 1
+    pad_end = int(n_frames * hop * rate) + frame + 2 * tolerance + hop - len(samples)
+    padded = np.pad(samples, ((tolerance, max(0, pad_end)), (0, 0)))
+    mix = padded.mean(axis=1)
+
+    output = np.zeros((n_frames * hop + frame, samples.shape[1]), dtype=np.float32)
+    position = tolerance
+    for k in range(n_frames):
+        nominal = int(k * hop * rate) + tolerance
+        if k > 0:
+            natural = mix[position + hop:position + hop + frame]
+            region = mix[nominal - tolerance:nominal + tolerance + frame]
+            scores = sliding_window_view(region, frame) @ natural
+            position = nominal - tolerance + int(np.argmax(scores))
+        else:
+            position = nominal
+        output[k * hop:k * hop + frame] += padded[position:position + frame] * window[:, None]
+    return output[:out_length]
+
+def trim_silence(samples: np.ndarray, sample_rate: int, threshold_db: float = -50.0, padding_ms: float = 50.0) -> np.ndarray:
+    """Remove leading and trailing silence, keeping ``padding_ms`` around the sound.
+
+    Audio is examined in 10 ms blocks; a block is silent when its peak stays
+    below ``threshold_db`` relative to full scale.
+    """
+    block = max(1, sample_rate // 100)
+    n_blocks = len(samples) // block
+    if n_blocks == 0:
+        return samples
+    peaks = np.abs(samples[:n_blocks * block]).reshape(n_blocks, -1).max(axis=1)
+    loud = np.flatnonzero(peaks >= FULL_SCALE * 10 ** (threshold_db / 20))
+    if len(loud) == 0:
+        return samples[:0]
+    padding = int(sample_rate * padding_ms / 1000)
+    start = max(0, loud[0] * block - padding)
+    end = min(len(samples), (loud[-1] + 1) * block + padding)
+    return samples[start:end]
+
+def _biquad_power_response(b, a, frequencies: np.ndarray, sample_rate: int) -> np.ndarray:
+    z = np.exp(-2j * np.pi * frequencies / sample_rate)
+    numerator = b[0] + b[1] * z + b[2] * z ** 2
+    denominator = a[0] + a[1] * z + a[2] * z ** 2
+    return np.abs(numerator / denominator) ** 2
+
+def _k_weighting_power(frequencies: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Power response of the ITU-R BS.1770 K-weighting filter (shelf + high-pass)."""
+    gain, w0 = 10 ** (4.0 / 40), 2 * np.pi * 1500.0 / sample_rate
+    alpha, cos = np.sin(w0) / (2 * (1 / np.sqrt(2))), np.cos(w0)
+    shelf_b = (
+        gain * ((gain + 1) + (gain - 1) * cos + 2 * np.sqrt(gain) * alpha),
+        -2 * gain * ((gain - 1) + (gain + 1) * cos),
+        gain * ((gain + 1) + (gain - 1) * cos - 2 * np.sqrt(gain) * alpha),
+    )
+    shelf_a = (
+        (gain + 1) - (gain - 1) * cos + 2 * np.sqrt(gain) * alpha,
+        2 * ((gain - 1) - (gain + 1) * cos),
+        (gain + 1) - (gain - 1) * cos - 2 * np.sqrt(gain) * alpha,
+    )
+    w0 = 2 * np.pi * 38.0 / sample_rate
+    alpha, cos = np.sin(w0) / (2 * 0.5), np.cos(w0)
+    highpass_b = ((1 + cos) / 2, -(1 + cos), (1 + cos) / 2)
+    highpass_a = (1 + alpha, -2 * cos, 1 - alpha)
+    return (
+        _biquad_power_response(shelf_b, shelf_a, frequencies, sample_rate)
+        * _biquad_power_response(highpass_b, highpass_a, frequencies, sample_rate)
+    )
+
+def measure_loudness(samples: np.ndarray, sample_rate: int) -> float:
+    """Return the integrated loudness in LUFS, following EBU R128 / BS.1770.
+
+    K-weighting is applied in the frequency domain, then the mean square is
+    taken over 400 ms blocks with 75% overlap, gated at -70 LUFS and at
+    10 LU below the ungated loudness. Returns ``-inf`` for silent audio.
+    """
+    if len(samples) == 0:
+        return float("-inf")
+    normalized = samples / FULL_SCALE
+    spectrum = np.fft.rfft(normalized, axis=0)
+    frequencies = np.fft.rfftfreq(len(normalized), 1 / sample_rate)
+    weighted = np.fft.irfft(spectrum * np.sqrt(_k_weighting_power(frequencies, sample_rate))[:, None], n=len(normalized), axis=0)
+
+    power = np.concatenate(([0.0], np.cumsum((weighted ** 2).sum(axis=1))))
+    block, step = int(0.4 * sample_rate), int(0.1 * sample_rate)
+    if len(weighted) < block:
+        block = step = len(weighted)
+    starts = np.arange(0, len(weighted) - block + 1, step)
+    block_power = (power[starts + block] - power[starts]) / block
+
+    with np.errstate(divide="ignore"):
+        block_loudness = -0.691 + 10 * np.log10(block_power)
+    gated = block_power[block_loudness > -70.0]
+    if len(gated) == 0:
+        return float("-inf")
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) - 10.0
+    gated = block_power[block_loudness > max(-70.0, relative_gate)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+def normalize_loudness(samples: np.ndarray, sample_rate: int, target_lufs: float = -16.0, peak_dbfs: float = -1.0) -> np.ndarray:
+    """Scale audio to ``target_lufs``, lowering the gain if the peak would exceed ``peak_dbfs``."""
+    loudness = measure_loudness(samples, sample_rate)
+    if not np.isfinite(loudness):
+        return samples
+    gain = 10 ** ((target_lufs - loudness) / 20)
+    peak = np.abs(samples).max() * gain
+    peak_limit = FULL_SCALE * 10 ** (peak_dbfs / 20)
+    if peak > peak_limit:
+        gain *= peak_limit / peak
+    return samples * gain
+
+@lru_cache(maxsize=8)
+def _chime_samples(sample_rate: int) -> np.ndarray:
+    chime = decode_pcm16(read_wav(generate_chime(sample_rate, tones=(587.33, 880.0), tone_duration=0.15)))
+    chime.setflags(write=False)
+    return chime
+
+def prepend_chime(samples: np.ndarray, sample_rate: int, gap_ms: float = 150.0) -> np.ndarray:
+    """Prepend a short rising attention chime followed by ``gap_ms`` of silence."""
+    chime = np.repeat(_chime_samples(sample_rate), samples.shape[1], axis=1)
+    gap = np.zeros((int(sample_rate * gap_ms / 1000), samples.shape[1]), dtype=np.float32)
+    return np.concatenate((chime, gap, samples))
@@ -0,0 +1,124 @@
+import time
+from collections import deque
+from typing import Callable, Optional
+
+class CircuitBreaker:
+    """Error-rate circuit breaker.
+
+    The breaker opens once at least ``min_calls`` outcomes have been recorded
+    in the sliding window and the share of failures reaches
+    ``failure_rate``. While open, calls are rejected until ``reset_timeout``
+    has passed; then a single trial call is let through (half-open) whose
+    outcome closes or re-opens the breaker. ``trial`` identifies the trial
+    just let through; a trial that ends without an outcome is given back by
+    passing it to ``release_trial``. A trial still running after
+    ``reset_timeout`` no longer blocks the next one.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._outcomes = deque(maxlen=window)
+        self._failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._trials = 0
+
+    @property
+    def trial(self) -> Optional[int]:
+        """The number of the trial in flight, or None outside of a trial."""
+        return self._trials if self._trial_in_flight else None
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and (
+            not self._trial_in_flight or self._clock() - self._trial_started >= self.reset_timeout
+        ):
+            self._trial_in_flight = True
+            self._trial_started = self._clock()
+            self._trials += 1
+            return True
+        return False
+
+    def release_trial(self, trial: Optional[int]):
+        """Let another trial through after trial ``trial`` ended without an outcome, e.g. when it was cancelled.
+
+        Does nothing unless ``trial`` is still the trial in flight.
+        """
+        if trial is not None and trial == self.trial:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        if self.state == self.HALF_OPEN:
+            self._reset()
+            return
+        self._record(False)
+
+    def record_failure(self):
+        if self.state == self.HALF_OPEN:
+            self._open()
+            return
+        self._record(True)
+        if len(self._outcomes) >= self.min_calls and self._failures / len(self._outcomes) >= self.failure_rate:
+            self._open()
+
+    def _record(self, failed: bool):
+        if len(self._outcomes) == self._outcomes.maxlen and self._outcomes[0]:
+            self._failures -= 1
+        self._outcomes.append(failed)
+        if failed:
+            self._failures += 1
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._trial_in_flight = False
+
+    def _reset(self):
+        self._state = self.CLOSED
+        self._outcomes.clear()
+        self._failures = 0
+        self._trial_in_flight = False
+
+class LatencyTracker:
+    """Keeps the most recent latencies to estimate percentiles."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, latency: float):
+        self._samples.append(latency)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
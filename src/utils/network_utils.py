@@ -1,4 +1,11 @@
 import socket
+import time
+
+# How long the source address chosen for a destination is reused before the
+# routing table is consulted again
+SOURCE_IP_TTL = 300.0
+
+_source_ips = {}
 
 def get_local_ip():
     """Get the local IP address of the machine."""
@@ -12,3 +19,27 @@ def get_local_ip():
     finally:
         s.close()
     return IP
+
+def get_source_ip(destination: str) -> str:
+    """Get the local IP address the machine uses to reach ``destination``.
+
+    Connecting a UDP socket sends no packets but makes the kernel pick the
+    interface and source address from the routing table, so on a host with
+    several networks the address is on the destination's network. Results
+    are cached for SOURCE_IP_TTL seconds. Falls back to get_local_ip().
+    """
+    now = time.monotonic()
+    cached = _source_ips.get(destination)
+    if cached and cached[1] > now:
+        return cached[0]
+    family = socket.AF_INET6 if ":" in destination else socket.AF_INET
+    s = socket.socket(family, socket.SOCK_DGRAM)
+    try:
+        s.connect((destination, 9))
+        ip = s.getsockname()[0]
+    except Exception:
+        ip = get_local_ip()
+    finally:
+        s.close()
+    _source_ips[destination] = (ip, now + SOURCE_IP_TTL)
+    return ip
@@ -0,0 +1,88 @@
+import math
+import struct
+import sys
+from array import array
+from typing import List, NamedTuple
+
+class WavParams(NamedTuple):
+    channels: int
+    sample_width: int
+    sample_rate: int
+
+class WavAudio(NamedTuple):
+    params: WavParams
+    frames: bytes
+
+def read_wav(data: bytes) -> WavAudio:
+    """Parse a PCM WAV file held in memory.
+
+    Streaming encoders (Deepgram included) may write a placeholder size for
+    the data chunk, so the data chunk is allowed to run to the end of the
+    buffer instead of trusting the header.
+    """
+    if len(data) < 12 or data[0:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("Not a WAV file")
+
+    params = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack("<I", data[offset + 4:offset + 8])[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            audio_format, channels, sample_rate = struct.unpack("<HHI", data[body:body + 8])
+            bits_per_sample = struct.unpack("<H", data[body + 14:body + 16])[0]
+            if audio_format not in (1, 0xFFFE):
+                raise ValueError(f"Unsupported WAV encoding: {audio_format}")
+            params = WavParams(channels, bits_per_sample // 8, sample_rate)
+        elif chunk_id == b"data":
+            if params is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            end = min(body + chunk_size, len(data))
+            frame_size = params.channels * params.sample_width
+            end -= (end - body) % frame_size
+            return WavAudio(params, data[body:end])
+        offset = body + chunk_size + (chunk_size & 1)
+    raise ValueError("WAV file has no data chunk")
+
+def encode_wav(params: WavParams, frames: bytes) -> bytes:
+    """Build a PCM WAV file from raw frames."""
+    block_align = params.channels * params.sample_width
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + len(frames), b"WAVE",
+        b"fmt ", 16, 1, params.channels, params.sample_rate,
+        params.sample_rate * block_align, block_align, params.sample_width * 8,
+        b"data", len(frames),
+    )
+    return header + frames
+
+def concat_wav(parts: List[bytes], gap: float = 0.0) -> bytes:
+    """Concatenate WAV files at sample level without re-encoding.
+
+    All parts must share channel count, sample width and sample rate.
+    ``gap`` seconds of silence are inserted between parts.
+    """
+    if not parts:
+        raise ValueError("Nothing to concatenate")
+    decoded = [read_wav(part) for part in parts]
+    params = decoded[0].params
+    for audio in decoded[1:]:
+        if audio.params != params:
+            raise ValueError(f"WAV format mismatch: {audio.params} != {params}")
+    silence = bytes(int(params.sample_rate * gap) * params.channels * params.sample_width)
+    return encode_wav(params, silence.join(audio.frames for audio in decoded))
+
+def generate_chime(sample_rate: int, tones=(880.0, 587.33), tone_duration: float = 0.25) -> bytes:
+    """Synthesize a short descending two-tone chime as 16-bit mono WAV."""
+    samples = array("h")
+    tone_frames = int(sample_rate * tone_duration)
+    fade_frames = max(1, tone_frames // 10)
+    for frequency in tones:
+        step = 2 * math.pi * frequency / sample_rate
+        for i in range(tone_frames):
+            envelope = min(1.0, i / fade_frames, (tone_frames - i) / fade_frames)
+            samples.append(int(0.5 * 32767 * envelope * math.sin(step * i)))
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return encode_wav(WavParams(1, 2, sample_rate), samples.tobytes())
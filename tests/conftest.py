@@ -17,4 +17,19 @@ def mock_get_local_ip_session():
 
 @pytest.fixture(autouse=True)
 def clear_settings_cache():
-    get_settings.cache_clear()
\ No newline at end of file
+    get_settings.cache_clear()
+@pytest.fixture(autouse=True)
+def reset_deepgram_health():
+    from src.services import tts_service
+    tts_service._circuit_breaker = None
+    tts_service._latency_tracker = None
+
+@pytest.fixture(autouse=True)
+def reset_audio_index():
+    from src.services import audio_janitor
+    audio_janitor._audio_index = None
+
+@pytest.fixture(autouse=True)
+def reset_hot_cache():
+    from src.services import audio_store
+    audio_store._hot_cache = None
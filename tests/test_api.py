@@ -4,6 +4,7 @@ from src.api.app import create_app
 from src.config.settings import Settings
 from unittest.mock import AsyncMock, MagicMock
 from src.api.security import get_api_key
+from src.services.rate_limiter import ApiKey, MemoryBucketStore, RateLimiter
 from fastapi import HTTPException
 
 @pytest.fixture
@@ -35,30 +36,24 @@ def test_tts_endpoint_no_api_key(client):
     assert response.status_code == 403
     assert response.json() == {"detail": "Could not validate credentials"}
 
+def make_limiter():
+    return RateLimiter(MagicMock(spec=Settings), keys=[ApiKey("default", "correct_api_key", rate=0.0, burst=0)], store=MemoryBucketStore())
+
 @pytest.mark.asyncio
 async def test_get_api_key_success():
-    settings_mock = MagicMock(spec=Settings)
-    settings_mock.API_KEY = "correct_api_key"
-    
-    result = await get_api_key(settings=settings_mock, api_key_header="correct_api_key")
-    assert result == "correct_api_key"
+    result = await get_api_key(limiter=make_limiter(), api_key_header="correct_api_key")
+    assert result.name == "default"
 
 @pytest.mark.asyncio
 async def test_get_api_key_unauthorized():
-    settings_mock = MagicMock(spec=Settings)
-    settings_mock.API_KEY = "correct_api_key"
-    
     with pytest.raises(HTTPException) as excinfo:
-        await get_api_key(settings=settings_mock, api_key_header="wrong_api_key")
+        await get_api_key(limiter=make_limiter(), api_key_header="wrong_api_key")
     assert excinfo.value.status_code == 403
     assert excinfo.value.detail == "Could not validate credentials"
 
 @pytest.mark.asyncio
 async def test_get_api_key_no_header():
-    settings_mock = MagicMock(spec=Settings)
-    settings_mock.API_KEY = "correct_api_key"
-    
     with pytest.raises(HTTPException) as excinfo:
-        await get_api_key(settings=settings_mock, api_key_header=None)
+        await get_api_key(limiter=make_limiter(), api_key_header=None)
     assert excinfo.value.status_code == 403
     assert excinfo.value.detail == "Could not validate credentials"
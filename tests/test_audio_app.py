@@ -0,0 +1,170 @@
+import pytest
+import os
+from starlette.testclient import TestClient
+from src.api.audio import RangeNotSatisfiable, create_audio_app, parse_range
+from src.config.settings import Settings
+from src.services.audio_janitor import AudioIndex
+from src.services.audio_store import AudioStore, content_digest
+
+KEY = "ab" + "c" * 62
+AUDIO = bytes(range(256)) * 4
+
+@pytest.fixture
+def settings(tmp_path):
+    return Settings(DEEPGRAM_API_KEY="test", AUDIO_OUTPUT_DIR=str(tmp_path / "audio"))
+
+@pytest.fixture
+def client(settings):
+    AudioStore(settings, AudioIndex()).put(KEY, AUDIO)
+    return TestClient(create_audio_app(settings))
+
+URL = f"/ab/{KEY}.{content_digest(AUDIO)}.wav"
+
+def test_serves_audio_with_immutable_caching(client, settings):
+    assert "/" + AudioStore(settings, AudioIndex()).url_path(os.path.join(settings.AUDIO_OUTPUT_DIR, "ab", f"{KEY}.wav")) == URL
+
+    response = client.get(URL)
+
+    assert response.status_code == 200
+    assert response.content == AUDIO
+    assert response.headers["content-type"] == "audio/wav"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"] == f'"{content_digest(AUDIO)}"'
+
+@pytest.mark.parametrize("hot_cache_bytes", [0, 1 << 20])
+def test_rerendered_audio_is_served_under_a_new_name(settings, hot_cache_bytes):
+    from src.services.audio_store import AudioDigests, HotAudioCache
+    # A store of another worker process, which shares neither memory tier
+    other = AudioStore(settings, AudioIndex(), HotAudioCache(hot_cache_bytes), AudioDigests())
+    path = other.put(KEY, AUDIO)
+    client = TestClient(create_audio_app(settings))
+    assert client.get(URL).status_code == 200
+
+    other.put(KEY, AUDIO[::-1])
+    new_url = "/" + other.url_path(path)
+
+    assert new_url != URL
+    assert client.get(URL).status_code == 404
+    response = client.get(new_url)
+    assert response.status_code == 200
+    assert response.content == AUDIO[::-1]
+
+def test_head_sends_headers_only(client):
+    response = client.head(URL)
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["content-length"] == str(len(AUDIO))
+
+def test_if_none_match_returns_not_modified(client):
+    etag = client.get(URL).headers["etag"]
+
+    response = client.get(URL, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+def test_range_request_returns_partial_content(client):
+    response = client.get(URL, headers={"Range": "bytes=100-199"})
+
+    assert response.status_code == 206
+    assert response.content == AUDIO[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(AUDIO)}"
+
+def test_suffix_range_and_unsatisfiable_range(client):
+    response = client.get(URL, headers={"Range": "bytes=-24"})
+    assert response.status_code == 206
+    assert response.content == AUDIO[-24:]
+
+    response = client.get(URL, headers={"Range": f"bytes={len(AUDIO)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(AUDIO)}"
+
+def test_if_range_with_stale_etag_returns_full_content(client):
+    response = client.get(URL, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+
+    assert response.status_code == 200
+    assert response.content == AUDIO
+
+@pytest.mark.parametrize("path", [
+    f"/cd/{KEY}.{content_digest(AUDIO)}.wav",
+    f"/ab/{KEY}.wav",
+    f"/ab/{KEY}.{'0' * 16}.wav",
+    "/ab/..%2F..%2Fsettings.py",
+    "/ab/not-a-key.wav",
+    f"/ab/{'ab' + 'd' * 62}.{content_digest(AUDIO)}.wav",
+])
+def test_rejects_unknown_and_malformed_paths(client, path):
+    assert client.get(path).status_code == 404
+
+def test_files_being_deleted_are_not_found(client, settings):
+    store = AudioStore(settings)
+    path = store.path(KEY)
+    store.index.begin_delete([path])
+    try:
+        assert client.get(URL).status_code == 404
+    finally:
+        store.index.cancel_delete(path)
+    assert client.get(URL).status_code == 200
+
+@pytest.fixture
+def hot_client(settings):
+    store = AudioStore(settings, AudioIndex())
+    path = store.put(KEY, AUDIO)
+    # Remove the cold copy so every response must come from memory
+    os.remove(path)
+    return TestClient(create_audio_app(settings))
+
+def test_serves_hot_audio_from_memory(hot_client, settings):
+    response = hot_client.get(URL)
+
+    assert response.status_code == 200
+    assert response.content == AUDIO
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["etag"] == f'"{content_digest(AUDIO)}"'
+    assert hot_client.get(URL, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+def test_hot_audio_range_requests(hot_client):
+    response = hot_client.get(URL, headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == AUDIO[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(AUDIO)}"
+
+    response = hot_client.get(URL, headers={"Range": "bytes=-24"})
+    assert response.content == AUDIO[-24:]
+
+    response = hot_client.get(URL, headers={"Range": f"bytes={len(AUDIO)}-"})
+    assert response.status_code == 416
+
+    response = hot_client.head(URL)
+    assert response.content == b""
+    assert response.headers["content-length"] == str(len(AUDIO))
+
+def test_hot_and_cold_etags_match(settings):
+    store = AudioStore(settings, AudioIndex())
+    path = store.put(KEY, AUDIO)
+    client = TestClient(create_audio_app(settings))
+    hot_etag = client.get(URL).headers["etag"]
+
+    store.hot.discard(path)
+
+    assert client.get(URL).headers["etag"] == hot_etag
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 10)),
+    ("bytes=10-", (10, 100)),
+    ("bytes=-10", (90, 100)),
+    ("bytes=90-1000", (90, 100)),
+    ("bytes=0-1,5-6", None),
+    ("bytes=9-1", None),
+    ("items=0-9", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+def test_parse_range_unsatisfiable():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
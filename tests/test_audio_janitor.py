@@ -0,0 +1,147 @@
+import pytest
+import os
+import time
+from src.config.settings import Settings
+from src.services.audio_janitor import AudioIndex, AudioJanitor
+from src.services.audio_store import AudioStore
+from src.services.tts_service import TTSService
+
+@pytest.fixture
+def audio_dir(tmp_path):
+    directory = tmp_path / "audio"
+    directory.mkdir()
+    return directory
+
+def write_file(directory, name, size=10, age=0.0):
+    path = directory / name
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+def make_janitor(audio_dir, index, **overrides):
+    settings = Settings(DEEPGRAM_API_KEY="test", AUDIO_OUTPUT_DIR=str(audio_dir), **overrides)
+    return AudioJanitor(settings, index)
+
+def test_scan_orders_by_mtime_and_skips_partial_files(audio_dir):
+    new = write_file(audio_dir, "new.wav", size=5, age=10)
+    old = write_file(audio_dir, "old.wav", size=7, age=100)
+    (audio_dir / "ab").mkdir()
+    nested = write_file(audio_dir / "ab", "nested.wav", size=3, age=50)
+    write_file(audio_dir, "new.wav.123.part")
+
+    index = AudioIndex()
+    index.scan(str(audio_dir))
+
+    assert len(index) == 3
+    assert index.total_bytes == 15
+    assert index.expired(max_files=1) == [old, nested]
+    assert new in index
+
+def test_touch_moves_file_to_most_recently_used(audio_dir):
+    first = write_file(audio_dir, "first.wav", age=7200)
+    second = write_file(audio_dir, "second.wav", age=3600)
+    index = AudioIndex()
+    index.scan(str(audio_dir))
+
+    index.touch(first)
+
+    assert index.expired(max_files=1) == [second]
+    # Recency is persisted so it survives a restart
+    assert os.path.getmtime(first) > time.time() - 5
+
+def test_expired_by_age_bytes_and_pins():
+    index = AudioIndex()
+    now = time.time()
+    index._set("/a.wav", 100, now - 1000)
+    index._set("/b.wav", 100, now - 500)
+    index._set("/c.wav", 100, now)
+
+    assert index.expired(max_age=600, now=now) == ["/a.wav"]
+    assert index.expired(max_bytes=150, now=now) == ["/a.wav", "/b.wav"]
+    assert index.expired(now=now) == []
+
+    index.pin("/a.wav")
+    assert index.expired(max_bytes=150, now=now) == ["/b.wav", "/c.wav"]
+    index.unpin("/a.wav")
+    assert not index.is_pinned("/a.wav")
+
+@pytest.mark.asyncio
+async def test_run_once_deletes_expired_files(audio_dir):
+    old = write_file(audio_dir, "old.wav", age=10 * 86400)
+    playing = write_file(audio_dir, "playing.wav", age=9 * 86400)
+    fresh = write_file(audio_dir, "fresh.wav")
+    index = AudioIndex()
+    index.scan(str(audio_dir))
+    index.pin(playing)
+    janitor = make_janitor(audio_dir, index, AUDIO_RETENTION_DAYS=7)
+
+    assert await janitor.run_once() == 1
+
+    assert not os.path.exists(old)
+    assert os.path.exists(playing)
+    assert os.path.exists(fresh)
+    assert old not in index
+    assert await janitor.run_once() == 0
+
+@pytest.mark.asyncio
+async def test_run_once_tolerates_files_deleted_elsewhere(audio_dir):
+    gone = write_file(audio_dir, "gone.wav")
+    index = AudioIndex()
+    index.scan(str(audio_dir))
+    os.remove(gone)
+    janitor = make_janitor(audio_dir, index, AUDIO_MAX_FILES=0, AUDIO_MAX_BYTES=1)
+
+    assert await janitor.run_once() == 1
+    assert len(index) == 0
+
+def test_tts_service_records_writes_and_cache_hits(audio_dir):
+    settings = Settings(DEEPGRAM_API_KEY="test", AUDIO_OUTPUT_DIR=str(audio_dir))
+    service = TTSService(settings)
+
+    first = service.save_audio(b"one", "first")
+    second = service.save_audio(b"two", "second")
+    assert service.store.index.total_bytes == 6
+
+    assert service.get_cached_audio("first") == first
+    assert service.store.index.expired(max_files=1) == [second]
+
+def test_merge_keeps_files_used_during_the_scan_most_recent(audio_dir):
+    scanned = write_file(audio_dir, "scanned.wav", age=100)
+    index = AudioIndex()
+    found = AudioIndex.list_files(str(audio_dir))
+    recorded = write_file(audio_dir, "recorded.wav", size=3)
+    index.record(recorded)
+
+    index.merge(found)
+
+    assert index.total_bytes == 13
+    assert index.expired(max_files=1) == [scanned]
+
+def test_files_being_deleted_are_cache_misses_until_written_again(audio_dir):
+    settings = Settings(DEEPGRAM_API_KEY="test", AUDIO_OUTPUT_DIR=str(audio_dir))
+    store = AudioStore(settings, AudioIndex())
+    key = "ab" + "0" * 62
+    path = store.put(key, b"old")
+
+    store.index.begin_delete([path])
+    assert store.get(key) is None
+    assert path not in store.index
+
+    store.put(key, b"new")
+    assert not store.index.delete(path)
+    assert store.get(key) == path
+
+@pytest.mark.asyncio
+async def test_run_once_drops_deleted_files_from_the_hot_tier(audio_dir):
+    from src.services.audio_store import HotAudioCache
+    settings = Settings(DEEPGRAM_API_KEY="test", AUDIO_OUTPUT_DIR=str(audio_dir), AUDIO_MAX_FILES=1)
+    index, hot = AudioIndex(), HotAudioCache(1 << 20)
+    store = AudioStore(settings, index, hot)
+    old = store.put("ab" + "0" * 62, b"old")
+    new = store.put("ab" + "1" * 62, b"new")
+
+    assert await AudioJanitor(settings, index, hot).run_once() == 1
+
+    assert hot.get(old) is None
+    assert hot.get(new) is not None
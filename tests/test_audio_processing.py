@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from src.utils.audio_processing import (
+    decode_pcm16,
+    encode_pcm16,
+    measure_loudness,
+    normalize_loudness,
+    prepend_chime,
+    time_stretch,
+    trim_silence,
+)
+from src.utils.wav_utils import WavParams, encode_wav, read_wav
+
+SAMPLE_RATE = 8000
+
+def sine(frequency, seconds, channels=1):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    samples = (8000 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+    return np.repeat(samples[:, None], channels, axis=1)
+
+def dominant_frequency(samples):
+    spectrum = np.abs(np.fft.rfft(samples[:, 0] * np.hanning(len(samples))))
+    return np.argmax(spectrum) * SAMPLE_RATE / len(samples)
+
+@pytest.mark.parametrize("rate", [0.5, 0.8, 1.5, 2.0])
+def test_time_stretch_changes_duration_not_pitch(rate):
+    stretched = time_stretch(sine(440, 2.0), rate, SAMPLE_RATE)
+    assert len(stretched) == round(2.0 * SAMPLE_RATE / rate)
+    assert dominant_frequency(stretched) == pytest.approx(440, abs=2)
+
+def test_time_stretch_keeps_channels():
+    assert time_stretch(sine(440, 1.0, channels=2), 1.25, SAMPLE_RATE).shape[1] == 2
+
+def test_pcm16_roundtrip():
+    params = WavParams(2, 2, SAMPLE_RATE)
+    samples = sine(440, 0.5, channels=2)
+    audio = read_wav(encode_pcm16(params, samples))
+    assert audio.params == params
+    np.testing.assert_allclose(decode_pcm16(audio), np.rint(samples))
+
+def test_decode_pcm16_rejects_other_widths():
+    with pytest.raises(ValueError):
+        decode_pcm16(read_wav(encode_wav(WavParams(1, 1, SAMPLE_RATE), b"\x00\x01")))
+
+def test_trim_silence():
+    silence = np.zeros((SAMPLE_RATE // 2, 1), dtype=np.float32)
+    samples = np.concatenate((silence, sine(440, 1.0), silence))
+    trimmed = trim_silence(samples, SAMPLE_RATE, threshold_db=-50.0, padding_ms=50.0)
+    assert len(trimmed) == SAMPLE_RATE + 2 * SAMPLE_RATE // 20
+    assert len(trim_silence(silence, SAMPLE_RATE)) == 0
+
+def test_measure_loudness_full_scale_sine():
+    # BS.1770: a full scale 997 Hz sine measures -3.01 LUFS
+    t = np.arange(48000 * 3) / 48000
+    samples = (32767 * np.sin(2 * np.pi * 997 * t))[:, None]
+    assert measure_loudness(samples, 48000) == pytest.approx(-3.01, abs=0.1)
+    assert measure_loudness(samples * 0, 48000) == float("-inf")
+
+def test_normalize_loudness():
+    quiet = sine(440, 2.0) * 0.05
+    normalized = normalize_loudness(quiet, SAMPLE_RATE, target_lufs=-16.0)
+    assert measure_loudness(normalized, SAMPLE_RATE) == pytest.approx(-16.0, abs=0.1)
+
+def test_normalize_loudness_limits_peak():
+    normalized = normalize_loudness(sine(440, 2.0), SAMPLE_RATE, target_lufs=0.0, peak_dbfs=-1.0)
+    assert np.abs(normalized).max() <= 32768 * 10 ** (-1 / 20) + 1
+
+def test_prepend_chime():
+    samples = sine(440, 1.0, channels=2)
+    with_chime = prepend_chime(samples, SAMPLE_RATE)
+    assert with_chime.shape[1] == 2
+    assert len(with_chime) > len(samples)
+    np.testing.assert_array_equal(with_chime[-len(samples):], samples)
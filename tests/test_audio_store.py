@@ -0,0 +1,80 @@
+import os
+from src.config.settings import Settings
+from src.services.audio_janitor import AudioIndex
+from src.services.audio_store import AudioStore, HotAudioCache, content_digest
+
+def make_store(tmp_path):
+    settings = Settings(DEEPGRAM_API_KEY="test", AUDIO_OUTPUT_DIR=str(tmp_path / "audio"))
+    return AudioStore(settings, AudioIndex())
+
+def test_paths_are_sharded_by_key(tmp_path):
+    store = make_store(tmp_path)
+    key = "ab" + "0" * 62
+
+    path = store.path(key)
+
+    assert path == os.path.join(str(tmp_path / "audio"), "ab", f"{key}.wav")
+    assert store.relative_path(path) == f"ab/{key}.wav"
+
+def test_put_writes_atomically_and_indexes(tmp_path):
+    store = make_store(tmp_path)
+    key = "cd" + "1" * 62
+
+    assert store.get(key) is None
+    path = store.put(key, b"audio")
+
+    with open(path, "rb") as f:
+        assert f.read() == b"audio"
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+    assert path in store.index
+    assert store.index.total_bytes == 5
+    assert store.get(key) == path
+
+def test_put_replaces_existing_file(tmp_path):
+    store = make_store(tmp_path)
+    key = "ef" + "2" * 62
+    store.put(key, b"old audio")
+
+    path = store.put(key, b"new")
+
+    with open(path, "rb") as f:
+        assert f.read() == b"new"
+    assert store.index.total_bytes == 3
+
+def test_hot_cache_evicts_least_recently_used():
+    hot = HotAudioCache(max_bytes=10)
+    hot.put("/a", b"aaaa", '"a"')
+    hot.put("/b", b"bbbb", '"b"')
+    hot.get("/a")
+
+    hot.put("/c", b"cccc", '"c"')
+
+    assert hot.get("/b") is None
+    assert bytes(hot.get("/a").data) == b"aaaa"
+    assert hot.total_bytes == 8
+
+    hot.put("/big", b"x" * 11, '"big"')
+    assert hot.get("/big") is None
+    assert len(hot) == 2
+
+def test_put_populates_hot_tier(tmp_path):
+    store = make_store(tmp_path)
+    path = store.put("ab" + "3" * 62, b"audio")
+
+    entry = store.hot.get(path)
+
+    assert bytes(entry.data) == b"audio"
+    assert entry.etag == f'"{content_digest(b"audio")}"'
+
+def test_url_path_adds_content_digest(tmp_path):
+    from src.services.audio_store import AudioDigests
+    store = make_store(tmp_path)
+    key = "ab" + "4" * 62
+    path = store.put(key, b"audio")
+
+    assert store.url_path(path) == f"ab/{key}.{content_digest(b'audio')}.wav"
+    # Files written before a restart are hashed on first use
+    restarted = AudioStore(store.settings, AudioIndex(), digests=AudioDigests())
+    assert restarted.url_path(path) == store.url_path(path)
+    restarted.put(key, b"other audio")
+    assert store.url_path(path) == f"ab/{key}.{content_digest(b'other audio')}.wav"
@@ -0,0 +1,81 @@
+from src.utils.circuit_breaker import CircuitBreaker, LatencyTracker
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_circuit_breaker_opens_on_failure_rate():
+    breaker = CircuitBreaker(failure_rate=0.5, window=4, min_calls=4, reset_timeout=10, clock=FakeClock())
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow_request() is False
+
+def test_circuit_breaker_sliding_window_forgets_old_failures():
+    breaker = CircuitBreaker(failure_rate=0.75, window=4, min_calls=4, reset_timeout=10, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_failure()
+    for _ in range(4):
+        breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_circuit_breaker_half_open_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_rate=0.5, window=2, min_calls=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow_request() is False
+
+    clock.now = 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False  # Only one trial at a time
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 20
+    assert breaker.allow_request() is True
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request() is True
+
+def test_circuit_breaker_releases_and_expires_trials():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_rate=0.5, window=2, min_calls=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    clock.now = 10
+    assert breaker.trial is None
+    assert breaker.allow_request() is True
+    first = breaker.trial
+    breaker.release_trial(first)
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False
+    # Only the holder of the trial in flight can give it back
+    breaker.release_trial(first)
+    breaker.release_trial(None)
+    assert breaker.allow_request() is False
+
+    # A trial that never reports back stops blocking after reset_timeout
+    clock.now = 20
+    assert breaker.allow_request() is True
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+def test_latency_tracker_percentile():
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentile(95) is None
+    for latency in range(1, 101):
+        tracker.record(latency / 100)
+    assert len(tracker) == 100
+    assert tracker.percentile(50) == 0.51
+    assert tracker.percentile(95) == 0.96
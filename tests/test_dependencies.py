@@ -1,22 +1,42 @@
-from src.api.dependencies import get_tts_service, get_cast_service, get_device_registry
-from src.services.tts_service import TTSService
-from src.config.settings import Settings
+import pytest
+from src.api.dependencies import get_app_settings, get_tts_service, get_cast_service, get_device_registry, get_queue_service, get_idempotency_store
 from unittest.mock import MagicMock
 from fastapi import Request
 
-def test_get_tts_service():
-    settings = Settings(DEEPGRAM_API_KEY="test")
-    tts_service = get_tts_service(settings)
-    assert isinstance(tts_service, TTSService)
+@pytest.mark.asyncio
+async def test_get_app_settings():
+    request = MagicMock(spec=Request)
+    request.app.state.settings = "test"
+    assert await get_app_settings(request) == "test"
+
+@pytest.mark.asyncio
+async def test_get_tts_service():
+    request = MagicMock(spec=Request)
+    request.app.state.tts_service = "test"
+    assert await get_tts_service(request) == "test"
 
-def test_get_cast_service():
+@pytest.mark.asyncio
+async def test_get_cast_service():
     request = MagicMock(spec=Request)
     request.app.state.cast_service = "test"
-    cast_service = get_cast_service(request)
+    cast_service = await get_cast_service(request)
     assert cast_service == "test"
 
-def test_get_device_registry():
+@pytest.mark.asyncio
+async def test_get_device_registry():
     request = MagicMock(spec=Request)
     request.app.state.device_registry = "test"
-    device_registry = get_device_registry(request)
+    device_registry = await get_device_registry(request)
     assert device_registry == "test"
+
+@pytest.mark.asyncio
+async def test_get_queue_service():
+    request = MagicMock(spec=Request)
+    request.app.state.queue_service = "test"
+    assert await get_queue_service(request) == "test"
+
+@pytest.mark.asyncio
+async def test_get_idempotency_store():
+    request = MagicMock(spec=Request)
+    request.app.state.idempotency_store = "test"
+    assert await get_idempotency_store(request) == "test"
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from src.services.fair_queue import FairQueue, FairSemaphore
+
+def drain(queue: FairQueue) -> list:
+    return [queue.pop() for _ in range(len(queue))]
+
+def test_tenants_take_turns_in_a_lane():
+    queue = FairQueue()
+    for i in range(3):
+        queue.push("kitchen", "bulk", f"bulk-{i}")
+    queue.push("kitchen", "alarms", "alarm-0")
+
+    # The alarm waits for one bulk item, not for the whole burst
+    assert drain(queue) == ["bulk-0", "alarm-0", "bulk-1", "bulk-2"]
+
+def test_items_are_served_in_proportion_to_weight():
+    queue = FairQueue()
+    for i in range(4):
+        queue.push("kitchen", "bulk", f"bulk-{i}", weight=1)
+        queue.push("kitchen", "alarms", f"alarm-{i}", weight=2)
+
+    assert drain(queue) == ["bulk-0", "alarm-0", "alarm-1", "bulk-1", "alarm-2", "alarm-3", "bulk-2", "bulk-3"]
+
+def test_fractional_weight_skips_rounds():
+    queue = FairQueue()
+    for i in range(2):
+        queue.push("kitchen", "slow", f"slow-{i}", weight=0.5)
+    for i in range(4):
+        queue.push("kitchen", "fast", f"fast-{i}")
+
+    assert drain(queue) == ["fast-0", "slow-0", "fast-1", "fast-2", "slow-1", "fast-3"]
+
+def test_lanes_take_turns_and_keep_tenant_order():
+    queue = FairQueue()
+    queue.push("kitchen", None, "k1")
+    queue.push("kitchen", None, "k2")
+    queue.push("office", None, "o1")
+
+    assert queue.lane_length("kitchen") == 2
+    assert list(queue) == ["k1", "k2", "o1"]
+    assert drain(queue) == ["k1", "o1", "k2"]
+    assert queue.lane_length("kitchen") == 0
+    with pytest.raises(IndexError):
+        queue.pop()
+
+def test_push_rejects_non_positive_weight():
+    with pytest.raises(ValueError):
+        FairQueue().push("kitchen", "bulk", "item", weight=0)
+
+@pytest.mark.asyncio
+async def test_semaphore_hands_out_slots_fairly():
+    semaphore = FairSemaphore(1)
+    order = []
+
+    async def work(tenant: str, name: str):
+        async with semaphore.slot(tenant):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    await semaphore.acquire("bulk")
+    waiters = [asyncio.create_task(work("bulk", f"bulk-{i}")) for i in range(3)]
+    waiters.append(asyncio.create_task(work("alarms", "alarm-0")))
+    await asyncio.sleep(0)
+    semaphore.release()
+    await asyncio.gather(*waiters)
+
+    assert order == ["bulk-0", "alarm-0", "bulk-1", "bulk-2"]
+
+@pytest.mark.asyncio
+async def test_semaphore_skips_cancelled_waiters():
+    semaphore = FairSemaphore(1)
+    await semaphore.acquire()
+    cancelled = asyncio.create_task(semaphore.acquire("a"))
+    waiting = asyncio.create_task(semaphore.acquire("b"))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+
+    semaphore.release()
+    await asyncio.wait_for(waiting, 1)
+    semaphore.release()
+    assert semaphore._value == 1
@@ -0,0 +1,37 @@
+import pytest
+from src.services.idempotency import IdempotencyStore, request_fingerprint
+
+def test_results_expire_after_ttl():
+    store = IdempotencyStore(ttl=10.0, max_keys=100)
+    fingerprint = request_fingerprint('{"text": "Hello"}')
+    store.put(("default", "a"), fingerprint, "task-1", now=0.0)
+    store.put(("default", "b"), fingerprint, "task-2", now=5.0)
+
+    assert store.get(("default", "a"), now=9.0).task_id == "task-1"
+    assert store.get(("default", "a"), now=10.0) is None
+    assert store.get(("default", "b"), now=10.0).task_id == "task-2"
+    assert len(store) == 1
+
+def test_oldest_keys_are_dropped_beyond_max_keys():
+    store = IdempotencyStore(ttl=10.0, max_keys=2)
+    for i in range(3):
+        store.put(("default", str(i)), b"", f"task-{i}", now=0.0)
+
+    assert store.get(("default", "0"), now=0.0) is None
+    assert [store.get(("default", str(i)), now=0.0).task_id for i in (1, 2)] == ["task-1", "task-2"]
+
+@pytest.mark.asyncio
+async def test_reserved_keys_are_held_until_put_or_released():
+    store = IdempotencyStore(ttl=10.0, max_keys=100)
+    assert store.reserve(("default", "a"), b"first") is None
+    pending = store.reserve(("default", "a"), b"retry")
+    assert pending.fingerprint == b"first"
+    assert not pending.done.done()
+
+    store.put(("default", "a"), b"first", "task-1")
+    assert pending.done.done()
+    assert store.reserve(("default", "b"), b"") is None
+    released = store.reserve(("default", "b"), b"")
+    store.release(("default", "b"))
+    assert released.done.done()
+    assert store.reserve(("default", "b"), b"") is None
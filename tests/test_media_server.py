@@ -0,0 +1,83 @@
+import pytest
+import socket
+import httpx
+from src.api.media_server import MediaServer
+from src.config.settings import Settings
+from src.services.audio_store import AudioStore
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.mark.asyncio
+async def test_media_server_serves_audio(tmp_path):
+    settings = Settings(
+        DEEPGRAM_API_KEY="test",
+        AUDIO_OUTPUT_DIR=str(tmp_path / "audio"),
+        MEDIA_HOST="127.0.0.1",
+        MEDIA_PORT=free_port(),
+    )
+    path = AudioStore(settings).put("ab" + "c" * 62, b"audio")
+    url_path = AudioStore(settings).url_path(path)
+    server = MediaServer(settings)
+
+    assert await server.start()
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"http://127.0.0.1:{settings.MEDIA_PORT}/audio/{url_path}")
+        assert response.status_code == 200
+        assert response.content == b"audio"
+    finally:
+        await server.stop()
+    assert server.thread is None
+
+@pytest.mark.asyncio
+async def test_media_server_reports_bind_failure(tmp_path):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        settings = Settings(
+            DEEPGRAM_API_KEY="test",
+            AUDIO_OUTPUT_DIR=str(tmp_path / "audio"),
+            MEDIA_HOST="127.0.0.1",
+            MEDIA_PORT=sock.getsockname()[1],
+        )
+        server = MediaServer(settings)
+
+        assert await server.start() is False
+        await server.stop()
+
+def make_app(tmp_path, mocker, port: int):
+    from unittest.mock import AsyncMock
+    from src.api.app import create_app
+    mocker.patch("src.api.app.DeviceRegistry").return_value.discover_devices = AsyncMock()
+    mocker.patch("src.api.app.CastService")
+    settings = Settings(
+        DEEPGRAM_API_KEY="test",
+        AUDIO_OUTPUT_DIR=str(tmp_path / "audio"),
+        PROJECT_ROOT=str(tmp_path),
+        MEDIA_SERVER_ENABLED=True,
+        MEDIA_HOST="127.0.0.1",
+        MEDIA_PORT=port,
+        PREWARM_ON_STARTUP=False,
+    )
+    return create_app(settings, skip_logging=True, skip_watchdog=True)
+
+@pytest.mark.asyncio
+async def test_queue_uses_media_port_once_the_server_started(tmp_path, mocker):
+    port = free_port()
+    app = make_app(tmp_path, mocker, port)
+
+    async with app.router.lifespan_context(app):
+        assert app.state.queue_service.media_port == port
+
+@pytest.mark.asyncio
+async def test_queue_keeps_api_port_when_the_server_failed_to_start(tmp_path, mocker):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        app = make_app(tmp_path, mocker, sock.getsockname()[1])
+
+        async with app.router.lifespan_context(app):
+            assert app.state.queue_service.media_port is None
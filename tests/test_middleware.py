@@ -0,0 +1,53 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from src.api.middleware import LoggingMiddleware
+
+async def ok(request):
+    return PlainTextResponse("ok")
+
+async def missing(request):
+    return PlainTextResponse("missing", status_code=404)
+
+async def boom(request):
+    raise RuntimeError("boom")
+
+def make_client(**kwargs):
+    app = Starlette(routes=[Route("/ok", ok), Route("/missing", missing), Route("/boom", boom)])
+    app.add_middleware(LoggingMiddleware, **kwargs)
+    return TestClient(app, raise_server_exceptions=False)
+
+@pytest.fixture
+def mock_log(mocker):
+    return mocker.patch("src.api.middleware.log")
+
+def test_logs_request_with_structured_fields(mock_log):
+    response = make_client().get("/ok?token=secret")
+
+    assert response.status_code == 200
+    mock_log.info.assert_called_once()
+    fields = mock_log.info.call_args.kwargs
+    assert fields["method"] == "GET"
+    assert fields["path"] == "/ok"
+    assert fields["status_code"] == 200
+    assert fields["duration_ms"] >= 0
+    assert fields["slow"] is False
+
+def test_sampling_skips_successful_requests_only(mock_log):
+    client = make_client(sample_rate=0.0)
+
+    client.get("/ok")
+    client.get("/missing")
+    client.get("/boom")
+
+    mock_log.info.assert_not_called()
+    assert mock_log.warning.call_args.kwargs["status_code"] == 404
+    assert mock_log.error.call_args.kwargs["path"] == "/boom"
+
+def test_slow_requests_are_always_logged(mock_log):
+    make_client(sample_rate=0.0, slow_request_ms=0.0).get("/ok")
+
+    mock_log.info.assert_not_called()
+    assert mock_log.warning.call_args.kwargs["slow"] is True
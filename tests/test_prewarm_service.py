@@ -0,0 +1,120 @@
+import pytest
+import asyncio
+import os
+from unittest.mock import MagicMock
+from src.config.settings import Settings
+from src.services.prewarm_service import PrewarmService, load_phrases
+from src.services.tts_service import TTSService
+
+@pytest.fixture
+def settings(tmp_path):
+    return Settings(DEEPGRAM_API_KEY="test", AUDIO_OUTPUT_DIR=str(tmp_path / "audio"), PREWARM_CONCURRENCY=2)
+
+@pytest.fixture
+def tts_service(settings, mocker):
+    service = TTSService(settings)
+    mocker.patch.object(service.log, "info")
+    return service
+
+def fake_generate_audio():
+    active = {"now": 0, "max": 0}
+
+    async def generate_audio(tts_request, force=False, fallback=True, chime=None):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        return "/tmp/x.wav"
+
+    return generate_audio, active
+
+def test_load_phrases(tmp_path):
+    phrases_file = tmp_path / "phrases.txt"
+    phrases_file.write_text("# Common announcements\nGarage door left open\n\nLaundry done\nLaundry done\n")
+    assert load_phrases(str(phrases_file)) == ["Garage door left open", "Laundry done"]
+
+@pytest.mark.asyncio
+async def test_prewarm_bounded_concurrency(tts_service, settings, mocker):
+    generate_audio, active = fake_generate_audio()
+    mocker.patch.object(tts_service, "generate_audio", side_effect=generate_audio)
+
+    result = await PrewarmService(tts_service, settings).prewarm([f"Phrase {i}" for i in range(10)])
+
+    assert result == {"rendered": 10, "cached": 0, "failed": 0}
+    assert active["max"] == settings.PREWARM_CONCURRENCY
+
+@pytest.mark.asyncio
+async def test_prewarm_skips_cached_phrases(tts_service, settings, mocker):
+    cached_path = tts_service.get_audio_path("Laundry done", variant=tts_service.postprocess_variant())
+    os.makedirs(os.path.dirname(cached_path))
+    open(cached_path, "wb").close()
+    mock_generate = mocker.patch.object(tts_service, "generate_audio", return_value=cached_path)
+
+    result = await PrewarmService(tts_service, settings).prewarm(["Laundry done", "Garage door left open"])
+
+    assert result == {"rendered": 1, "cached": 1, "failed": 0}
+    assert mock_generate.call_count == 1
+    assert mock_generate.call_args[0][0].text == "Garage door left open"
+
+@pytest.mark.asyncio
+async def test_prewarm_checks_the_post_processed_audio(tts_service, settings, mocker):
+    settings.AUDIO_PREPEND_CHIME = True
+    raw_path = tts_service.get_audio_path("Laundry done")
+    unchimed_path = tts_service.get_audio_path("Laundry done", variant=tts_service.postprocess_variant(chime=False))
+    for path in (raw_path, unchimed_path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+    mock_generate = mocker.patch.object(tts_service, "generate_audio", return_value="/tmp/x.wav")
+    service = PrewarmService(tts_service, settings)
+
+    assert await service.prewarm(["Laundry done"]) == {"rendered": 1, "cached": 0, "failed": 0}
+    assert mock_generate.call_args.kwargs["chime"] is None
+    assert await service.prewarm(["Laundry done"], chime=False) == {"rendered": 0, "cached": 1, "failed": 0}
+
+@pytest.mark.asyncio
+async def test_prewarm_library_renders_fragments_without_chime(tts_service, settings, mocker):
+    mock_generate = mocker.patch.object(tts_service, "generate_audio", return_value="/tmp/x.wav")
+
+    result = await PrewarmService(tts_service, settings).prewarm_library(["Laundry done"], ["Welcome home"])
+
+    assert result == {"rendered": 2, "cached": 0, "failed": 0}
+    assert [(call.args[0].text, call.kwargs["chime"]) for call in mock_generate.call_args_list] == [
+        ("Laundry done", None), ("Welcome home", False),
+    ]
+
+@pytest.mark.asyncio
+async def test_prewarm_rerenders_for_new_voice(tts_service, settings, mocker):
+    old_path = tts_service.get_audio_path("Laundry done", "aura-old")
+    os.makedirs(os.path.dirname(old_path))
+    open(old_path, "wb").close()
+    mock_generate = mocker.patch.object(tts_service, "generate_audio", return_value="/tmp/x.wav")
+
+    result = await PrewarmService(tts_service, settings).prewarm(["Laundry done"], voice="aura-new")
+
+    assert result["rendered"] == 1
+    assert mock_generate.call_args[0][0].voice == "aura-new"
+
+@pytest.mark.asyncio
+async def test_prewarm_counts_failures(tts_service, settings, mocker):
+    mocker.patch.object(tts_service, "generate_audio", side_effect=Exception("Deepgram down"))
+    service = PrewarmService(tts_service, settings)
+    mocker.patch.object(service.log, "warning")
+
+    result = await service.prewarm(["Laundry done"])
+
+    assert result == {"rendered": 0, "cached": 0, "failed": 1}
+
+@pytest.mark.asyncio
+async def test_tts_service_returns_cached_audio(tts_service, settings, mocker):
+    cached_path = tts_service.get_audio_path("Laundry done", "aura-2-helena-en", tts_service.postprocess_variant())
+    os.makedirs(os.path.dirname(cached_path))
+    open(cached_path, "wb").close()
+    mock_to_thread = mocker.patch("src.services.tts_service.asyncio.to_thread")
+
+    tts_request = MagicMock()
+    tts_request.text = "Laundry done"
+    tts_request.voice = "aura-2-helena-en"
+    tts_request.speed = 1.0
+
+    assert await tts_service.generate_audio(tts_request) == cached_path
+    mock_to_thread.assert_not_called()
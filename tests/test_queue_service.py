@@ -1,6 +1,8 @@
 import pytest
 import asyncio
+from collections import deque
 from unittest.mock import AsyncMock, MagicMock
+from src.services.audio_store import AudioStore
 from src.services.queue_service import QueueService
 from src.services.tts_service import TTSService
 from src.services.cast_service import CastService
@@ -9,6 +11,11 @@ from src.services.cast_service import CastService
 def mock_discord_handler_httpx_client(mocker):
     mocker.patch("src.utils.discord_handler.httpx.Client")
 
+@pytest.fixture(autouse=True)
+def mock_url_path(mocker):
+    # Most tests play made-up paths, which cannot be hashed; serve them under their relative path
+    return mocker.patch.object(AudioStore, "url_path", autospec=True, side_effect=lambda store, path: store.relative_path(path))
+
 @pytest.fixture
 def mock_tts_service():
     return AsyncMock(spec=TTSService)
@@ -20,6 +27,15 @@ def mock_cast_service():
 @pytest.fixture
 def queue_service(mock_tts_service, mock_cast_service, mocker):
     mock_settings = MagicMock()
+    mock_settings.CAST_PLAYBACK_TIMEOUT = 60.0
+    mock_settings.AUDIO_OUTPUT_DIR = "/tmp"
+    mock_settings.MEDIA_SERVER_ENABLED = False
+    mock_settings.QUEUE_MERGE_ENABLED = False
+    mock_settings.CAST_WARM_SESSION = False
+    mock_settings.TTS_SYNTHESIS_CONCURRENCY = 4
+    mock_settings.SCHEDULE_SYNTHESIS_LEAD = 30.0
+    mock_settings.GOOGLE_CAST_DEVICE_NAME = "Test Device"
+    mock_settings.REPLAY_HISTORY_SIZE = 2
     return QueueService(mock_tts_service, mock_cast_service, mock_settings)
 
 @pytest.mark.asyncio
@@ -33,7 +49,7 @@ async def test_add_to_queue(queue_service, mock_tts_service, mock_cast_service,
     queue_service.add_to_queue(task)
 
     assert len(queue_service.queue) == 1
-    assert queue_service.queue[0][1] == task
+    assert list(queue_service.queue)[0][1] == task
 
     # Allow the task to run and complete
     await asyncio.sleep(0.1)
@@ -127,4 +143,413 @@ async def test_add_to_queue_already_processing(queue_service, mock_tts_service,
     mock_cast_service.play_audio.assert_any_call(mocker.ANY, tts_request2.device_name)
     assert mock_cast_service.play_audio.call_count == 2
     assert len(queue_service.queue) == 0
-    assert queue_service.processing is False
\ No newline at end of file
+    assert queue_service.processing is False
+@pytest.mark.asyncio
+async def test_process_queue_template_task(mock_tts_service, mock_cast_service, mocker):
+    from src.services.template_service import TemplateService
+    mock_template_service = AsyncMock(spec=TemplateService)
+    mock_template_service.compose.return_value = "/tmp/composed.wav"
+    queue_service = QueueService(mock_tts_service, mock_cast_service, MagicMock(CAST_PLAYBACK_TIMEOUT=60.0, AUDIO_OUTPUT_DIR="/tmp", MEDIA_SERVER_ENABLED=False, QUEUE_MERGE_ENABLED=False, CAST_WARM_SESSION=False), mock_template_service)
+
+    tts_request = MagicMock()
+    tts_request.device_name = "Test Device"
+    tts_request.voice = "aura-2-helena-en"
+    template_request = MagicMock()
+    template_request.template = "home"
+    template_request.slots = {"name": "Alice"}
+    queue_service.add_to_queue({"tts_request": tts_request, "template": template_request, "port": 8080})
+
+    await asyncio.sleep(0.1)
+
+    mock_template_service.compose.assert_called_once_with("home", {"name": "Alice"}, "aura-2-helena-en")
+    mock_tts_service.generate_audio.assert_not_called()
+    assert mock_cast_service.audio_url.call_args[0][0] == "composed.wav"
+
+@pytest.mark.asyncio
+async def test_process_queue_pins_audio_while_playing(queue_service, mock_tts_service, mock_cast_service):
+    mock_tts_service.generate_audio.return_value = "/audio/abc.wav"
+    queue_service.settings.CAST_PLAYBACK_TIMEOUT = 0.05
+    pinned_during_playback = []
+    mock_cast_service.play_audio.side_effect = lambda *args: pinned_during_playback.append(queue_service.store.index.is_pinned("/audio/abc.wav"))
+    tts_request = MagicMock()
+    tts_request.device_name = "Test Device"
+
+    queue_service.add_to_queue({"tts_request": tts_request, "port": 8080})
+    await asyncio.sleep(0.01)
+    assert pinned_during_playback == [True]
+    assert queue_service.store.index.is_pinned("/audio/abc.wav")
+
+    await asyncio.sleep(0.1)
+    assert not queue_service.store.index.is_pinned("/audio/abc.wav")
+
+@pytest.mark.asyncio
+async def test_process_queue_serves_content_addressed_name(queue_service, mock_tts_service, mock_cast_service, mock_url_path):
+    mock_tts_service.generate_audio.return_value = "/tmp/ab/abc.wav"
+    mock_url_path.side_effect = lambda store, path: "ab/abc.0123456789abcdef.wav"
+    mock_cast_service.audio_url.return_value = "http://192.168.1.2:8080/audio/ab/abc.0123456789abcdef.wav"
+    tts_request = MagicMock()
+    tts_request.device_name = "Test Device"
+
+    queue_service.add_to_queue({"tts_request": tts_request, "port": 8080})
+    await asyncio.sleep(0.01)
+
+    mock_url_path.assert_called_once_with(queue_service.store, "/tmp/ab/abc.wav")
+    mock_cast_service.audio_url.assert_called_once_with("ab/abc.0123456789abcdef.wav", 8080, "Test Device")
+    mock_cast_service.play_audio.assert_called_once_with("http://192.168.1.2:8080/audio/ab/abc.0123456789abcdef.wav", "Test Device")
+
+@pytest.mark.asyncio
+async def test_process_queue_uses_media_server_port(queue_service, mock_tts_service, mock_cast_service):
+    queue_service.media_port = 8081
+    mock_tts_service.generate_audio.return_value = "/tmp/ab/abc.wav"
+    tts_request = MagicMock()
+    tts_request.device_name = "Test Device"
+
+    queue_service.add_to_queue({"tts_request": tts_request, "port": 8080})
+    await asyncio.sleep(0.01)
+
+    mock_cast_service.audio_url.assert_called_once_with("ab/abc.wav", 8081, "Test Device")
+
+@pytest.mark.asyncio
+async def test_process_queue_merges_consecutive_messages_for_one_device(tmp_path, mock_cast_service, mocker):
+    from src.config.settings import Settings
+    from src.utils.wav_utils import WavParams, encode_wav, read_wav
+    settings = Settings(
+        DEEPGRAM_API_KEY="test", AUDIO_OUTPUT_DIR=str(tmp_path), QUEUE_MERGE_ENABLED=True, QUEUE_MERGE_GAP_MS=1000,
+    )
+    tts_service = TTSService(settings)
+    params = WavParams(1, 2, 100)
+    audio = {
+        "One": tts_service.save_audio(encode_wav(params, b"\x01\x00"), "One"),
+        "Two": tts_service.save_audio(encode_wav(params, b"\x02\x00"), "Two"),
+        "Three": tts_service.save_audio(encode_wav(params, b"\x03\x00"), "Three"),
+    }
+    mocker.patch.object(tts_service, "generate_audio", side_effect=lambda tts_request: audio[tts_request.text])
+    queue_service = QueueService(tts_service, mock_cast_service, settings)
+    mock_cast_service.audio_url.side_effect = lambda path, port, device_name: path
+
+    for text, device in [("One", "Kitchen"), ("Two", "Kitchen"), ("Three", "Office")]:
+        tts_request = MagicMock(text=text, device_name=device)
+        queue_service.queue.push((device,), None, (text, {"tts_request": tts_request, "port": 8080}))
+    await queue_service._process_queue()
+
+    assert mock_cast_service.play_audio.call_count == 2
+    merged_path, device_name = mock_cast_service.play_audio.call_args_list[0][0]
+    assert device_name == "Kitchen"
+    with open(tmp_path / merged_path, "rb") as f:
+        merged = read_wav(f.read())
+    assert merged.frames == b"\x01\x00" + b"\x00" * 200 + b"\x02\x00"
+    assert mock_cast_service.play_audio.call_args_list[1][0] == (queue_service.store.relative_path(audio["Three"]), "Office")
+
+@pytest.mark.asyncio
+async def test_merge_follows_re_rendered_parts(tmp_path, mock_cast_service):
+    from src.config.settings import Settings
+    from src.utils.wav_utils import WavParams, encode_wav, read_wav
+    settings = Settings(DEEPGRAM_API_KEY="test", AUDIO_OUTPUT_DIR=str(tmp_path), QUEUE_MERGE_ENABLED=True)
+    tts_service = TTSService(settings)
+    queue_service = QueueService(tts_service, mock_cast_service, settings)
+    params = WavParams(1, 2, 100)
+    first = tts_service.save_audio(encode_wav(params, b"\x01\x00"), "One")
+    second = tts_service.save_audio(encode_wav(params, b"\x02\x00"), "Two")
+    merged = await queue_service._merge_audio([first, second])
+
+    # Rendering a part again replaces it under the same name
+    tts_service.save_audio(encode_wav(params, b"\x03\x00"), "One")
+    remerged = await queue_service._merge_audio([first, second])
+
+    assert remerged != merged
+    with open(remerged, "rb") as f:
+        assert read_wav(f.read()).frames.startswith(b"\x03\x00")
+
+@pytest.mark.asyncio
+async def test_process_queue_synthesizes_merged_messages_concurrently(queue_service, mock_tts_service, mock_cast_service, mocker):
+    queue_service.settings.QUEUE_MERGE_ENABLED = True
+    queue_service.settings.QUEUE_MERGE_MAX_MESSAGES = 3
+    queue_service.settings.AUDIO_FORMAT = "wav"
+    running = []
+    started = []
+
+    async def generate_audio(tts_request):
+        started.append(len(running))
+        running.append(tts_request)
+        await asyncio.sleep(0.01)
+        running.remove(tts_request)
+        return f"/tmp/{tts_request.text}.wav"
+
+    mock_tts_service.generate_audio.side_effect = generate_audio
+    merge_audio = mocker.patch.object(queue_service, "_merge_audio", AsyncMock(return_value="/tmp/merged.wav"))
+    for text in ["One", "Two", "Three"]:
+        queue_service.queue.push(("Kitchen",), None, (text, {"tts_request": MagicMock(text=text, device_name="Kitchen"), "port": 8080}))
+    await queue_service._process_queue()
+
+    assert started == [0, 1, 2]
+    merge_audio.assert_awaited_once_with(["/tmp/One.wav", "/tmp/Two.wav", "/tmp/Three.wav"])
+    assert [queue_service.get_task(text)["status"] for text in ["One", "Two", "Three"]] == ["completed"] * 3
+
+@pytest.mark.asyncio
+async def test_add_to_queue_warms_up_device(queue_service, mock_cast_service):
+    queue_service.settings.CAST_WARM_SESSION = True
+    tts_request = MagicMock()
+    tts_request.device_name = "Kitchen"
+
+    queue_service.add_to_queue({"tts_request": tts_request, "port": 8080})
+    await asyncio.sleep(0.01)
+
+    mock_cast_service.warm_up.assert_called_once_with("Kitchen")
+
+@pytest.mark.asyncio
+async def test_warm_up_tasks_are_kept_and_their_failures_logged(queue_service, mock_cast_service, mocker):
+    queue_service.settings.CAST_WARM_SESSION = True
+    mock_cast_service.warm_up.side_effect = RuntimeError("Device gone")
+    log_error = mocker.patch.object(queue_service.log, "error")
+    tts_request = MagicMock()
+    tts_request.device_name = "Kitchen"
+
+    queue_service.add_to_queue({"tts_request": tts_request, "port": 8080})
+    assert len(queue_service._background) == 2
+    await asyncio.sleep(0.01)
+
+    assert not queue_service._background
+    assert any(call.kwargs.get("error") == "Device gone" for call in log_error.call_args_list)
+
+@pytest.mark.asyncio
+async def test_failed_worker_does_not_block_the_queue(queue_service, mock_tts_service, mock_cast_service, mocker):
+    mocker.patch.object(queue_service.log, "error")
+    next_batch = mocker.patch.object(queue_service, "_next_batch", side_effect=RuntimeError("Broken"))
+    tts_request = MagicMock()
+    tts_request.device_name = "Kitchen"
+
+    queue_service.add_to_queue({"tts_request": tts_request, "port": 8080})
+    await asyncio.sleep(0.01)
+    assert queue_service.processing is False
+
+    # Both tasks are played once the queue works again
+    next_batch.side_effect = QueueService._next_batch.__get__(queue_service)
+    queue_service.add_to_queue({"tts_request": tts_request, "port": 8080})
+    await asyncio.sleep(0.01)
+    assert mock_cast_service.play_audio.call_count == 2
+
+@pytest.mark.asyncio
+async def test_process_queue_plays_group_task_in_sync(queue_service, mock_tts_service, mock_cast_service):
+    mock_tts_service.generate_audio.return_value = "/tmp/ab/abc.wav"
+    mock_cast_service.audio_url.side_effect = lambda path, port, device_name: f"http://{device_name}/audio/{path}"
+    playback = {"devices": {"Kitchen": 12.0, "Office": 20.5}, "skew_ms": 8.5, "unreachable": []}
+    mock_cast_service.play_group.return_value = playback
+    tts_request = MagicMock()
+    tts_request.device_name = None
+
+    task_id = queue_service.add_to_queue({"tts_request": tts_request, "port": 8080, "device_names": ["Kitchen", "Office"]})
+    assert queue_service.get_task(task_id)["status"] == "queued"
+    await asyncio.sleep(0.01)
+
+    mock_cast_service.play_group.assert_called_once_with({
+        "Kitchen": "http://Kitchen/audio/ab/abc.wav",
+        "Office": "http://Office/audio/ab/abc.wav",
+    })
+    mock_cast_service.play_audio.assert_not_called()
+    status = queue_service.get_task(task_id)
+    assert status["status"] == "completed"
+    assert status["devices"] == ["Kitchen", "Office"]
+    assert status["playback"] == playback
+
+@pytest.mark.asyncio
+async def test_process_queue_records_failed_task(queue_service, mock_tts_service):
+    mock_tts_service.generate_audio.side_effect = Exception("TTS error")
+    tts_request = MagicMock()
+    tts_request.device_name = "Test Device"
+
+    task_id = queue_service.add_to_queue({"tts_request": tts_request, "port": 8080})
+    await asyncio.sleep(0.01)
+
+    assert queue_service.get_task(task_id) == {"task_id": task_id, "status": "failed", "devices": ["Test Device"], "error": "TTS error"}
+    assert queue_service.get_task("unknown") is None
+
+@pytest.mark.asyncio
+async def test_add_batch_synthesizes_identical_requests_once(queue_service, mock_tts_service, mock_cast_service):
+    from src.models.requests import TTSRequest
+    queue_service.settings.TTS_SYNTHESIS_CONCURRENCY = 2
+    mock_tts_service.generate_audio.side_effect = lambda tts_request: f"/tmp/{tts_request.text}.wav"
+    tasks = [
+        {"tts_request": TTSRequest(text="Dinner", voice="v", device_name="Kitchen"), "port": 8080},
+        {"tts_request": TTSRequest(text="Dinner", voice="v", device_name="Office"), "port": 8080},
+        {"tts_request": TTSRequest(text="Laundry", voice="v", device_name="Kitchen"), "port": 8080},
+    ]
+
+    task_ids = queue_service.add_batch(tasks)
+    assert [queue_service.get_task(task_id)["status"] for task_id in task_ids] == ["queued"] * 3
+    await asyncio.sleep(0.05)
+
+    assert mock_tts_service.generate_audio.call_count == 2
+    assert mock_cast_service.play_audio.call_count == 3
+    assert [call.args[1] for call in mock_cast_service.play_audio.call_args_list] == ["Kitchen", "Office", "Kitchen"]
+    assert [queue_service.get_task(task_id)["status"] for task_id in task_ids] == ["completed"] * 3
+
+@pytest.mark.asyncio
+async def test_process_queue_interleaves_tenants(queue_service, mock_tts_service, mock_cast_service):
+    mock_tts_service.generate_audio.side_effect = lambda tts_request: f"/tmp/{tts_request.text}.wav"
+    mock_cast_service.audio_url.side_effect = lambda path, port, device_name: path
+
+    def task(text: str, tenant: str) -> dict:
+        tts_request = MagicMock(text=text, device_name="Kitchen")
+        return {"tts_request": tts_request, "port": 8080, "tenant": tenant, "weight": 1.0}
+
+    queue_service.add_batch([task(f"bulk-{i}", "bulk") for i in range(3)])
+    queue_service.add_to_queue(task("alarm", "alarms"))
+    await asyncio.sleep(0.05)
+
+    played = [call.args[0] for call in mock_cast_service.play_audio.call_args_list]
+    assert played == ["bulk-0.wav", "alarm.wav", "bulk-1.wav", "bulk-2.wav"]
+
+@pytest.mark.asyncio
+async def test_scheduled_task_is_synthesized_before_it_is_played(queue_service, mock_tts_service, mock_cast_service):
+    import time
+    queue_service.scheduler.lead = 0.05
+    mock_tts_service.generate_audio.return_value = "/tmp/ab/abc.wav"
+    tts_request = MagicMock()
+    tts_request.device_name = "Kitchen"
+
+    task_id = queue_service.add_to_queue({"tts_request": tts_request, "port": 8080, "deliver_at": time.time() + 0.1})
+    status = queue_service.get_task(task_id)
+    assert (status["status"], status["devices"]) == ("scheduled", ["Kitchen"])
+    assert len(queue_service.queue) == 0
+
+    await asyncio.sleep(0.07)
+    mock_tts_service.generate_audio.assert_called_once_with(tts_request)
+    mock_cast_service.play_audio.assert_not_called()
+
+    await asyncio.sleep(0.06)
+    mock_cast_service.play_audio.assert_called_once()
+    assert queue_service.get_task(task_id)["status"] == "completed"
+
+@pytest.mark.asyncio
+async def test_cancel_skips_queued_task_and_its_synthesis(queue_service, mock_tts_service, mock_cast_service):
+    from src.models.requests import TTSRequest
+    started = asyncio.Event()
+
+    async def generate_audio(tts_request):
+        started.set()
+        await asyncio.sleep(0.05)
+        return f"/tmp/{tts_request.text}.wav"
+    mock_tts_service.generate_audio.side_effect = generate_audio
+    mock_cast_service.audio_url.side_effect = lambda path, port, device_name: path
+    tasks = [
+        {"tts_request": TTSRequest(text="Door open", voice="v", device_name="Hall"), "port": 8080, "tags": ["door"]},
+        {"tts_request": TTSRequest(text="Door open", voice="v", device_name="Kitchen"), "port": 8080, "tags": ["door"]},
+        {"tts_request": TTSRequest(text="Laundry", voice="v", device_name="Kitchen"), "port": 8080},
+    ]
+    hall, kitchen, laundry = queue_service.add_batch(tasks)
+    await started.wait()
+
+    assert queue_service.cancel(kitchen)
+    assert not queue_service.cancel(kitchen)
+    assert queue_service.get_task(kitchen)["status"] == "cancelled"
+    # The first task is being synthesized and is skipped before its Cast load
+    assert queue_service.purge(tag="door") == [hall]
+    await asyncio.sleep(0.15)
+
+    assert [call.args for call in mock_cast_service.play_audio.call_args_list] == [("Laundry.wav", "Kitchen")]
+    assert [queue_service.get_task(task_id)["status"] for task_id in (hall, kitchen, laundry)] == ["cancelled", "cancelled", "completed"]
+    assert not queue_service.cancel(laundry)
+    assert queue_service._synthesis_users == {}
+
+@pytest.mark.asyncio
+async def test_purge_by_device_cancels_scheduled_tasks(queue_service, mock_tts_service, mock_cast_service):
+    import time
+    tts_request = MagicMock(text="Bedtime", device_name="Kids Room")
+    other_request = MagicMock(text="Bedtime", device_name="Office")
+    scheduled = queue_service.add_to_queue({"tts_request": tts_request, "port": 8080, "deliver_at": time.time() + 3600, "tags": ["bedtime"]})
+    other = queue_service.add_to_queue({"tts_request": other_request, "port": 8080, "deliver_at": time.time() + 3600, "tags": ["bedtime"]})
+
+    assert queue_service.purge(device_name="kids room", tag="bedtime") == [scheduled]
+    assert len(queue_service.scheduler) == 1
+    assert queue_service.get_task(scheduled)["status"] == "cancelled"
+    assert queue_service.get_task(other)["status"] == "scheduled"
+    assert queue_service.purge(tag="unknown") == []
+
+@pytest.mark.asyncio
+async def test_tasks_are_only_cancelled_and_replayed_by_their_tenant(queue_service, mock_tts_service, mock_cast_service, tmp_path):
+    import time
+    from src.models.requests import TTSRequest
+    audio = tmp_path / "played.wav"
+    audio.write_bytes(b"RIFF")
+    mock_tts_service.generate_audio.return_value = str(audio)
+    mock_cast_service.audio_url.side_effect = lambda path, port, device_name: path
+    played = queue_service.add_to_queue({"tts_request": TTSRequest(text="Hello", voice="v", device_name="Kitchen"), "port": 8080, "tenant": "bob"})
+    await asyncio.sleep(0.05)
+    deliver_at = time.time() + 3600
+    alice, bob = (
+        queue_service.add_to_queue({"tts_request": MagicMock(text="Door", device_name="Hall"), "port": 8080, "deliver_at": deliver_at, "tags": ["door"], "tenant": tenant})
+        for tenant in ("alice", "bob")
+    )
+
+    assert queue_service.get_task(bob, "alice") is None
+    assert not queue_service.cancel(bob, "alice")
+    assert queue_service.replay_task(played, 8080, "alice") is None
+    assert queue_service.purge(tag="door", tenant="alice") == [alice]
+    assert queue_service.get_task(bob, "bob")["status"] == "scheduled"
+    assert queue_service.replay_task(played, 8080, "bob") is not None
+    assert queue_service.cancel(bob, "bob")
+
+@pytest.mark.asyncio
+async def test_replay_plays_stored_audio_without_synthesis(queue_service, mock_tts_service, mock_cast_service, tmp_path):
+    from src.models.requests import TTSRequest
+    audio = {text: tmp_path / f"{text}.wav" for text in ("One", "Two", "Three")}
+    for path in audio.values():
+        path.write_bytes(b"RIFF")
+    mock_tts_service.generate_audio.side_effect = lambda tts_request: str(audio[tts_request.text])
+    mock_cast_service.audio_url.side_effect = lambda path, port, device_name: path
+    task_ids = queue_service.add_batch([
+        {"tts_request": TTSRequest(text=text, voice="v", device_name="Kitchen"), "port": 8080} for text in ("One", "Two", "Three")
+    ])
+    await asyncio.sleep(0.05)
+    mock_tts_service.generate_audio.reset_mock()
+    mock_cast_service.play_audio.reset_mock()
+
+    # Only the last REPLAY_HISTORY_SIZE announcements are kept per device
+    assert len(queue_service.replay_device("kitchen", 5, 8080)) == 2
+    await asyncio.sleep(0.05)
+    assert queue_service.replay_task(task_ids[0], 8080) is not None
+    audio["Three"].unlink()
+    assert queue_service.replay_task(task_ids[2], 8080) is None
+    assert queue_service.replay_task("unknown", 8080) is None
+    await asyncio.sleep(0.05)
+
+    mock_tts_service.generate_audio.assert_not_called()
+    played = [call.args[0] for call in mock_cast_service.play_audio.call_args_list]
+    assert played == [queue_service.store.relative_path(str(audio[text])) for text in ("Two", "Three", "One")]
+    # Replays are not recorded, so replaying again plays the same announcements
+    assert queue_service._device_history["kitchen"] == deque(task_ids[1:])
+
+@pytest.mark.asyncio
+async def test_tasks_due_together_are_played_one_at_a_time(queue_service, mock_tts_service, mock_cast_service):
+    import time
+    playing = []
+    overlaps = []
+
+    async def play_audio(audio_url, device_name):
+        overlaps.append(len(playing))
+        playing.append(audio_url)
+        await asyncio.sleep(0.01)
+        playing.remove(audio_url)
+        return True
+    mock_cast_service.play_audio.side_effect = play_audio
+    deliver_at = time.time() + 0.02
+    for _ in range(3):
+        queue_service.add_to_queue({"tts_request": MagicMock(device_name="Kitchen"), "port": 8080, "deliver_at": deliver_at})
+    await asyncio.sleep(0.1)
+
+    assert overlaps == [0, 0, 0]
+
+@pytest.mark.asyncio
+async def test_scheduled_audio_is_pinned_until_the_task_is_cancelled(queue_service, mock_tts_service):
+    import time
+    queue_service.scheduler.lead = 0.05
+    mock_tts_service.generate_audio.return_value = "/tmp/ab/scheduled.wav"
+    tts_request = MagicMock()
+    tts_request.device_name = "Kitchen"
+
+    task_id = queue_service.add_to_queue({"tts_request": tts_request, "port": 8080, "deliver_at": time.time() + 0.1})
+    await asyncio.sleep(0.07)
+    assert queue_service.store.index.is_pinned("/tmp/ab/scheduled.wav")
+
+    assert queue_service.cancel(task_id)
+    assert not queue_service.store.index.is_pinned("/tmp/ab/scheduled.wav")
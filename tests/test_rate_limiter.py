@@ -0,0 +1,89 @@
+import pytest
+from src.services.rate_limiter import DAY, ApiKey, MemoryBucketStore, RateLimiter, SQLiteBucketStore
+
+def test_bucket_refills_at_rate():
+    api_key = ApiKey("test", "secret", rate=1.0, burst=2)
+    store = MemoryBucketStore()
+    now = 10 * DAY
+
+    assert store.acquire(api_key, 1, 0, now).allowed
+    assert store.acquire(api_key, 1, 0, now).allowed
+    denied = store.acquire(api_key, 1, 0, now)
+    assert not denied.allowed and denied.reason == "rate"
+    assert denied.retry_after == 1.0
+    assert store.acquire(api_key, 1, 0, now + 1.0).allowed
+    # The bucket never holds more than the burst
+    assert store.acquire(api_key, 1, 0, now + 100.0).tokens == 1.0
+
+def test_daily_quota_resets_at_midnight():
+    api_key = ApiKey("test", "secret", rate=0.0, burst=0, daily_quota=3)
+    store = MemoryBucketStore()
+    now = 10 * DAY + 3600
+
+    assert store.acquire(api_key, 0, 2, now).allowed
+    denied = store.acquire(api_key, 0, 2, now)
+    assert not denied.allowed and denied.reason == "quota"
+    assert denied.retry_after == DAY - 3600
+    assert store.acquire(api_key, 0, 1, now).quota_used == 3
+    assert store.acquire(api_key, 0, 2, 11 * DAY).quota_used == 2
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    api_key = ApiKey("test", "secret", rate=1.0, burst=2)
+    path = str(tmp_path / "ratelimit.db")
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+    now = 10 * DAY
+
+    assert first.acquire(api_key, 1, 0, now).allowed
+    assert second.acquire(api_key, 1, 0, now).allowed
+    assert not first.acquire(api_key, 1, 0, now).allowed
+
+def test_load_api_keys_reads_weight_and_defaults(tmp_path):
+    import json
+    from unittest.mock import MagicMock
+    from src.services.rate_limiter import load_api_keys
+    path = tmp_path / "keys.json"
+    path.write_text(json.dumps({
+        "alarms": {"key": "alarm-secret", "weight": 4},
+        "bulk": {"key": "bulk-secret", "requests": 10, "window": 60},
+    }))
+    settings = MagicMock(RATE_LIMIT_REQUESTS=5, RATE_LIMIT_WINDOW=1, RATE_LIMIT_DAILY_QUOTA=0)
+
+    alarms, bulk = load_api_keys(str(path), settings)
+
+    assert (alarms.name, alarms.rate, alarms.burst, alarms.weight) == ("alarms", 5.0, 5, 4)
+    assert (bulk.rate, bulk.burst, bulk.weight) == (10 / 60, 10, 1.0)
+
+def test_sqlite_store_denies_as_busy_while_locked(tmp_path):
+    import sqlite3
+    api_key = ApiKey("test", "secret", rate=1.0, burst=2)
+    path = str(tmp_path / "ratelimit.db")
+    store = SQLiteBucketStore(path)
+    store._conn.execute("PRAGMA busy_timeout = 0")
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    denied = store.acquire(api_key, 1, 0, 10 * DAY)
+    assert (denied.allowed, denied.reason) == (False, "busy")
+
+    other.execute("ROLLBACK")
+    assert store.acquire(api_key, 1, 0, 10 * DAY).allowed
+
+@pytest.mark.asyncio
+async def test_limiter_runs_blocking_store_in_a_thread():
+    import threading
+    from unittest.mock import MagicMock
+    from src.config.settings import Settings
+    api_key = ApiKey("test", "secret", rate=1.0, burst=2)
+    threads = []
+
+    class RecordingStore(MemoryBucketStore):
+        blocking = True
+
+        def acquire(self, *args):
+            threads.append(threading.current_thread())
+            return super().acquire(*args)
+
+    limiter = RateLimiter(MagicMock(spec=Settings), keys=[api_key], store=RecordingStore())
+
+    assert (await limiter.acquire(api_key)).allowed
+    assert threads != [threading.main_thread()]
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
 from src.api.app import create_app
@@ -218,3 +219,334 @@ async def test_tts_endpoint_add_to_queue_exception(client, mocker):
 
     assert response.status_code == 500
     assert response.json() == {"detail": "An error occurred while adding request to queue."}
+
+@pytest.mark.asyncio
+async def test_template_endpoint(client, mocker):
+    from src.services.template_service import AnnouncementTemplate
+    client_instance, _, _ = client
+    client_instance.app.state.template_service.templates = {
+        "home": AnnouncementTemplate("home", "{name} is home", {"name": ["Alice"]}),
+    }
+    mock_add_to_queue = mocker.patch("src.services.queue_service.QueueService.add_to_queue", return_value="mock_task_id")
+
+    response = client_instance.post(
+        "/api/v1/tts/template",
+        headers={"X-API-Key": "test_api_key"},
+        json={"template": "home", "slots": {"name": "Alice"}, "device_name": "Living Room Speaker"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["task_id"] == "mock_task_id"
+    task = mock_add_to_queue.call_args[0][0]
+    assert task["tts_request"].text == "Alice is home"
+    assert task["template"].slots == {"name": "Alice"}
+
+@pytest.mark.asyncio
+async def test_template_endpoint_unknown_template(client):
+    client_instance, _, _ = client
+    response = client_instance.post(
+        "/api/v1/tts/template",
+        headers={"X-API-Key": "test_api_key"},
+        json={"template": "missing", "slots": {}}
+    )
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_template_endpoint_missing_slot(client):
+    from src.services.template_service import AnnouncementTemplate
+    client_instance, _, _ = client
+    client_instance.app.state.template_service.templates = {
+        "home": AnnouncementTemplate("home", "{name} is home", {"name": ["Alice"]}),
+    }
+    response = client_instance.post(
+        "/api/v1/tts/template",
+        headers={"X-API-Key": "test_api_key"},
+        json={"template": "home", "slots": {}}
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"]["slots"] == ["name"]
+
+@pytest.mark.asyncio
+async def test_tts_endpoint_with_device_names(client, mocker):
+    client_instance, _, mock_device_registry_instance = client
+    mock_device_registry_instance.get_device_by_name.side_effect = lambda name: {"friendly_name": name.title()}
+    mock_add_to_queue = mocker.patch("src.services.queue_service.QueueService.add_to_queue", return_value="mock_task_id")
+
+    response = client_instance.post(
+        "/api/v1/tts",
+        headers={"X-API-Key": "test_api_key"},
+        json={"text": "Dinner is ready", "device_names": ["kitchen", "office", "Kitchen"]}
+    )
+
+    assert response.status_code == 200
+    assert mock_add_to_queue.call_args[0][0]["device_names"] == ["Kitchen", "Office"]
+
+@pytest.mark.asyncio
+async def test_tts_endpoint_queues_device_name_under_its_friendly_name(client, mocker):
+    client_instance, _, mock_device_registry_instance = client
+    mock_device_registry_instance.get_device_by_name.side_effect = lambda name: {"friendly_name": name.title()}
+    mock_add_to_queue = mocker.patch("src.services.queue_service.QueueService.add_to_queue", return_value="mock_task_id")
+
+    for device_name in ("kitchen", "KITCHEN"):
+        response = client_instance.post(
+            "/api/v1/tts",
+            headers={"X-API-Key": "test_api_key"},
+            json={"text": "Dinner is ready", "device_name": device_name}
+        )
+        assert response.status_code == 200
+
+    assert [call[0][0]["tts_request"].device_name for call in mock_add_to_queue.call_args_list] == ["Kitchen", "Kitchen"]
+
+@pytest.mark.asyncio
+async def test_tts_endpoint_with_unknown_device_names(client):
+    client_instance, _, mock_device_registry_instance = client
+    mock_device_registry_instance.get_device_by_name.side_effect = lambda name: {"friendly_name": name} if name == "Kitchen" else None
+
+    response = client_instance.post(
+        "/api/v1/tts",
+        headers={"X-API-Key": "test_api_key"},
+        json={"text": "Dinner is ready", "device_names": ["Kitchen", "Garage"]}
+    )
+
+    assert response.status_code == 404
+    assert response.json()["detail"]["devices"] == ["Garage"]
+
+@pytest.mark.asyncio
+async def test_get_task_status(client, mocker):
+    client_instance, _, _ = client
+    mocker.patch("src.services.queue_service.QueueService.get_task", side_effect=lambda task_id, tenant: {"task_id": task_id, "status": "completed"} if task_id == "known" else None)
+
+    response = client_instance.get("/api/v1/tasks/known", headers={"X-API-Key": "test_api_key"})
+    assert response.status_code == 200
+    assert response.json() == {"task_id": "known", "status": "completed"}
+
+    response = client_instance.get("/api/v1/tasks/unknown", headers={"X-API-Key": "test_api_key"})
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_cancel_task_endpoint(client, mocker):
+    client_instance, _, _ = client
+    statuses = {"queued": {"task_id": "queued", "status": "cancelled"}, "done": {"task_id": "done", "status": "completed"}}
+    mocker.patch("src.services.queue_service.QueueService.cancel", side_effect=lambda task_id, tenant: task_id == "queued")
+    mocker.patch("src.services.queue_service.QueueService.get_task", side_effect=lambda task_id, tenant: statuses.get(task_id))
+    headers = {"X-API-Key": "test_api_key"}
+
+    response = client_instance.delete("/api/v1/tasks/queued", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+
+    response = client_instance.delete("/api/v1/tasks/done", headers=headers)
+    assert response.status_code == 409
+    assert response.json()["detail"]["status"] == "completed"
+
+    response = client_instance.delete("/api/v1/tasks/unknown", headers=headers)
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_purge_tasks_endpoint(client, mocker):
+    client_instance, _, _ = client
+    mock_purge = mocker.patch("src.services.queue_service.QueueService.purge", return_value=["task-1", "task-2"])
+    headers = {"X-API-Key": "test_api_key"}
+
+    response = client_instance.delete("/api/v1/tasks", params={"device_name": "Hall", "tag": "door"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"message": "2 tasks cancelled", "task_ids": ["task-1", "task-2"]}
+    mock_purge.assert_called_once_with(device_name="Hall", tag="door", tenant="default")
+
+    response = client_instance.delete("/api/v1/tasks", headers=headers)
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_replay_endpoints(client, mocker, settings):
+    client_instance, _, mock_device_registry_instance = client
+    mock_device_registry_instance.get_device_by_name.side_effect = lambda name: {"friendly_name": "Kitchen"} if name.lower() == "kitchen" else None
+    mock_replay_device = mocker.patch("src.services.queue_service.QueueService.replay_device", return_value=["replay-1", "replay-2"])
+    mocker.patch("src.services.queue_service.QueueService.replay_task", side_effect=lambda task_id, *args: "replay-3" if task_id == "played" else None)
+    headers = {"X-API-Key": "test_api_key"}
+
+    response = client_instance.post("/api/v1/devices/kitchen/replay", params={"count": 2}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["task_ids"] == ["replay-1", "replay-2"]
+    assert mock_replay_device.call_args[0][:2] == ("Kitchen", 2)
+
+    response = client_instance.post("/api/v1/devices/Garage/replay", headers=headers)
+    assert response.status_code == 404
+    response = client_instance.post("/api/v1/devices/kitchen/replay", params={"count": settings.REPLAY_HISTORY_SIZE + 1}, headers=headers)
+    assert response.status_code == 422
+
+    response = client_instance.post("/api/v1/tasks/played/replay", headers=headers)
+    assert response.json()["task_id"] == "replay-3"
+    response = client_instance.post("/api/v1/tasks/unknown/replay", headers=headers)
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_tts_batch_endpoint_reports_results_per_item(client, mocker):
+    client_instance, _, mock_device_registry_instance = client
+    mock_device_registry_instance.get_device_by_name.side_effect = lambda name: {"friendly_name": name} if name == "Kitchen" else None
+    mock_add_batch = mocker.patch("src.services.queue_service.QueueService.add_batch", return_value=["task-1", "task-2"])
+
+    response = client_instance.post(
+        "/api/v1/tts/batch",
+        headers={"X-API-Key": "test_api_key"},
+        json={"items": [
+            {"text": "Dinner is ready", "device_name": "Kitchen"},
+            {"text": ""},
+            {"text": "Laundry is done", "device_name": "Garage"},
+            {"text": "Good night"},
+        ]}
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0] == {"index": 0, "task_id": "task-1"}
+    assert results[1]["error"] == "Invalid TTS request"
+    assert results[2]["error"] == "No device available with the given device name"
+    assert results[3] == {"index": 3, "task_id": "task-2"}
+    tasks = mock_add_batch.call_args[0][0]
+    assert [task["tts_request"].text for task in tasks] == ["Dinner is ready", "Good night"]
+
+@pytest.mark.asyncio
+async def test_tts_batch_endpoint_limits_items(client, settings):
+    client_instance, _, _ = client
+    response = client_instance.post(
+        "/api/v1/tts/batch",
+        headers={"X-API-Key": "test_api_key"},
+        json={"items": [{"text": "Hello"}] * (settings.TTS_BATCH_MAX_ITEMS + 1)}
+    )
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_tts_endpoint_replays_idempotent_request(client, mocker):
+    client_instance, _, _ = client
+    mock_add_to_queue = mocker.patch("src.services.queue_service.QueueService.add_to_queue", side_effect=["task-1", "task-2"])
+    body = {"text": "Someone is at the door", "device_name": "Living Room Speaker"}
+    headers = {"X-API-Key": "test_api_key", "Idempotency-Key": "doorbell-42"}
+
+    first = client_instance.post("/api/v1/tts", headers=headers, json=body)
+    retry = client_instance.post("/api/v1/tts", headers=headers, json=body)
+
+    assert first.json()["task_id"] == retry.json()["task_id"] == "task-1"
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert mock_add_to_queue.call_count == 1
+
+    response = client_instance.post("/api/v1/tts", headers=headers, json={**body, "text": "Dinner is ready"})
+    assert response.status_code == 422
+    assert response.json()["detail"] == {"error": "Idempotency key was already used for a different request"}
+
+    response = client_instance.post("/api/v1/tts", headers={"X-API-Key": "test_api_key"}, json=body)
+    assert response.json()["task_id"] == "task-2"
+
+def test_tts_endpoint_queues_concurrent_idempotent_retries_once(client, mocker, tmp_path):
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from src.services.rate_limiter import SQLiteBucketStore
+    client_instance, _, _ = client
+    store = SQLiteBucketStore(str(tmp_path / "limits.db"))
+    acquire = store.acquire
+
+    def slow_acquire(*args):
+        # Keep the requests waiting on the limiter at the same time
+        time.sleep(0.05)
+        return acquire(*args)
+    mocker.patch.object(store, "acquire", side_effect=slow_acquire)
+    client_instance.app.state.rate_limiter.store = store
+    mock_add_to_queue = mocker.patch("src.services.queue_service.QueueService.add_to_queue", side_effect=[RuntimeError("queue is broken"), "task-1", "task-2"])
+    body = {"text": "Someone is at the door", "device_name": "Living Room Speaker"}
+    headers = {"X-API-Key": "test_api_key", "Idempotency-Key": "doorbell-42"}
+
+    with ThreadPoolExecutor(5) as executor:
+        responses = list(executor.map(lambda _: client_instance.post("/api/v1/tts", headers=headers, json=body), range(5)))
+
+    # The first request failed and released its key, and the next one queued the announcement
+    assert sorted(response.status_code for response in responses) == [200, 200, 200, 200, 500]
+    assert {response.json()["task_id"] for response in responses if response.status_code == 200} == {"task-1"}
+    assert mock_add_to_queue.call_count == 2
+
+@pytest.mark.asyncio
+async def test_tts_endpoint_schedules_delayed_request(client, mocker, settings):
+    import time
+    client_instance, _, _ = client
+    mock_add_to_queue = mocker.patch("src.services.queue_service.QueueService.add_to_queue", return_value="task-1")
+    headers = {"X-API-Key": "test_api_key"}
+
+    response = client_instance.post("/api/v1/tts", headers=headers, json={"text": "Time for school", "delay": 600})
+    assert response.status_code == 200
+    assert abs(mock_add_to_queue.call_args[0][0]["deliver_at"] - (time.time() + 600)) < 5
+
+    response = client_instance.post("/api/v1/tts", headers=headers, json={"text": "Time for school", "deliver_at": "2000-01-01T07:30:00Z"})
+    assert "deliver_at" not in mock_add_to_queue.call_args[0][0]
+
+    response = client_instance.post("/api/v1/tts", headers=headers, json={"text": "Time for school", "delay": settings.SCHEDULE_MAX_DELAY + 60})
+    assert response.status_code == 422
+
+    response = client_instance.post("/api/v1/tts", headers=headers, json={"text": "Time for school", "delay": 60, "deliver_at": "2030-01-01T07:30:00"})
+    assert response.status_code == 422
+
+def test_websocket_submission_acks_and_reports_status(client, mocker):
+    from starlette.websockets import WebSocketDisconnect
+    client_instance, mock_cast_service_instance, _ = client
+    mocker.patch("src.services.tts_service.TTSService.generate_audio", new_callable=AsyncMock, return_value="/tmp/ab/abc.wav")
+    mocker.patch("src.services.audio_store.AudioStore.url_path", return_value="ab/abc.0123456789abcdef.wav")
+    mock_cast_service_instance.play_audio = AsyncMock(return_value=True)
+
+    with client_instance.websocket_connect("/api/v1/ws", headers={"X-API-Key": "test_api_key"}) as websocket:
+        websocket.send_text("not json")
+        assert websocket.receive_json() == {"type": "error", "error": "Message is not valid JSON"}
+
+        websocket.send_json({"type": "tts", "id": "bad", "text": ""})
+        error = websocket.receive_json()
+        assert (error["id"], error["error"]) == ("bad", "Invalid TTS request")
+
+        websocket.send_json({"type": "tts", "id": "dinner", "text": "Dinner is ready", "device_name": "Living Room Speaker"})
+        ack = websocket.receive_json()
+        assert ack["type"] == "ack" and ack["id"] == "dinner"
+        statuses = [websocket.receive_json() for _ in range(2)]
+        assert [event["status"] for event in statuses] == ["processing", "completed"]
+        assert all(event["task_id"] == ack["task_id"] for event in statuses)
+
+    with pytest.raises(WebSocketDisconnect):
+        with client_instance.websocket_connect("/api/v1/ws", headers={"X-API-Key": "wrong_key"}) as websocket:
+            websocket.receive_json()
+
+def test_websocket_submission_limits_pending_tasks(client, mocker):
+    client_instance, _, _ = client
+    client_instance.app.state.settings.WS_MAX_PENDING_TASKS = 1
+    mocker.patch("src.services.queue_service.QueueService.add_to_queue", side_effect=["task-1", "task-2"])
+
+    with client_instance.websocket_connect("/api/v1/ws", headers={"X-API-Key": "test_api_key"}) as websocket:
+        websocket.send_json({"type": "tts", "text": "One"})
+        assert websocket.receive_json() == {"type": "ack", "task_id": "task-1"}
+        websocket.send_json({"type": "tts", "text": "Two"})
+        assert websocket.receive_json()["error"] == "Too many pending tasks"
+
+def test_websocket_submission_survives_a_failed_message(client, mocker):
+    client_instance, _, _ = client
+    mocker.patch("src.services.queue_service.QueueService.add_to_queue", side_effect=[RuntimeError("queue is broken"), "task-2"])
+
+    with client_instance.websocket_connect("/api/v1/ws", headers={"X-API-Key": "test_api_key"}) as websocket:
+        websocket.send_json({"type": "tts", "text": "One"})
+        assert websocket.receive_json() == {"type": "error", "error": "An error occurred while handling the message."}
+        websocket.send_json({"type": "tts", "text": "Two"})
+        assert websocket.receive_json() == {"type": "ack", "task_id": "task-2"}
+
+def test_websocket_submission_closes_on_binary_frames(client):
+    client_instance, _, _ = client
+
+    with client_instance.websocket_connect("/api/v1/ws", headers={"X-API-Key": "test_api_key"}) as websocket:
+        websocket.send_bytes(b"\x00\x01")
+        assert websocket.receive() == {"type": "websocket.close", "code": 1003, "reason": ""}
+
+@pytest.mark.asyncio
+async def test_websocket_channel_collects_task_failures(mocker):
+    from src.api.routes.ws import SubmissionChannel
+    mock_log = mocker.patch("src.api.routes.ws.log")
+
+    async def fail():
+        raise RuntimeError("socket is broken")
+
+    task = asyncio.create_task(fail())
+    await asyncio.wait({task})
+    SubmissionChannel._task_done(task)
+
+    mock_log.error.assert_called_once_with("WebSocket channel failed", task="test_websocket_channel_collects_task_failures.<locals>.fail", error="RuntimeError('socket is broken')")
@@ -0,0 +1,57 @@
+import asyncio
+import time
+import pytest
+from src.services.scheduler import Scheduler
+
+@pytest.mark.asyncio
+async def test_items_are_prepared_then_released_in_time_order():
+    events = []
+    scheduler = Scheduler(0.05, lambda key, item: events.append(("prepare", key)), lambda key, item: events.append(("release", key)))
+    now = time.time()
+    scheduler.schedule("late", now + 0.1, None)
+    scheduler.schedule("early", now + 0.06, None)
+    assert len(scheduler) == 2
+
+    await asyncio.sleep(0.03)
+    assert events == [("prepare", "early")]
+    await asyncio.sleep(0.1)
+
+    assert events == [("prepare", "early"), ("prepare", "late"), ("release", "early"), ("release", "late")]
+    assert len(scheduler) == 0
+
+@pytest.mark.asyncio
+async def test_one_timer_serves_all_items():
+    released = []
+    scheduler = Scheduler(0.0, lambda key, item: None, lambda key, item: released.append(item))
+    now = time.time()
+    for i in range(1000):
+        scheduler.schedule(i, now + 0.01 + (i % 10) / 1000, i)
+
+    # No coroutine waits for the items, only the timer for the earliest one
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+    assert scheduler._timer.when() == min(entry[0] for entry in scheduler._heap)
+    await asyncio.sleep(0.05)
+    assert sorted(released) == list(range(1000))
+    assert scheduler._timer is None
+
+@pytest.mark.asyncio
+async def test_cancelled_items_are_not_released():
+    released = []
+    scheduler = Scheduler(0.0, lambda key, item: None, lambda key, item: released.append(key))
+    scheduler.schedule("kept", time.time() + 0.01, "a")
+    scheduler.schedule("cancelled", time.time() + 0.01, "b")
+
+    assert scheduler.cancel("cancelled") == "b"
+    assert scheduler.cancel("cancelled") is None
+    await asyncio.sleep(0.03)
+
+    assert released == ["kept"]
+
+@pytest.mark.asyncio
+async def test_past_items_are_prepared_and_released_right_away():
+    events = []
+    scheduler = Scheduler(30.0, lambda key, item: events.append("prepare"), lambda key, item: events.append("release"))
+    scheduler.schedule("now", time.time() - 1, None)
+    await asyncio.sleep(0.001)
+
+    assert events == ["prepare", "release"]
@@ -1,8 +1,10 @@
 import pytest
 from fastapi import FastAPI, Depends
 from fastapi.testclient import TestClient
-from src.api.security import verify_cloudflare_access
-from src.config.settings import Settings, get_settings
+from src.api.security import get_api_key, rate_limit, verify_cloudflare_access
+from src.services.rate_limiter import RateLimiter
+from src.api.dependencies import get_app_settings
+from src.config.settings import Settings
 
 @pytest.fixture
 def settings_cf_enabled():
@@ -29,7 +31,7 @@ def create_test_app():
 
 def test_cloudflare_access_success(settings_cf_enabled):
     app = create_test_app()
-    app.dependency_overrides[get_settings] = lambda: settings_cf_enabled
+    app.dependency_overrides[get_app_settings] = lambda: settings_cf_enabled
     client = TestClient(app)
     headers = {
         "CF-Access-Client-Id": "test_client_id",
@@ -40,14 +42,14 @@ def test_cloudflare_access_success(settings_cf_enabled):
 
 def test_cloudflare_access_failure_missing_headers(settings_cf_enabled):
     app = create_test_app()
-    app.dependency_overrides[get_settings] = lambda: settings_cf_enabled
+    app.dependency_overrides[get_app_settings] = lambda: settings_cf_enabled
     client = TestClient(app)
     response = client.get("/")
     assert response.status_code == 403
 
 def test_cloudflare_access_failure_invalid_credentials(settings_cf_enabled):
     app = create_test_app()
-    app.dependency_overrides[get_settings] = lambda: settings_cf_enabled
+    app.dependency_overrides[get_app_settings] = lambda: settings_cf_enabled
     client = TestClient(app)
     headers = {
         "CF-Access-Client-Id": "wrong_client_id",
@@ -58,7 +60,77 @@ def test_cloudflare_access_failure_invalid_credentials(settings_cf_enabled):
 
 def test_cloudflare_access_disabled(settings_cf_disabled):
     app = create_test_app()
-    app.dependency_overrides[get_settings] = lambda: settings_cf_disabled
+    app.dependency_overrides[get_app_settings] = lambda: settings_cf_disabled
     client = TestClient(app)
     response = client.get("/")
     assert response.status_code == 200
+
+def create_api_key_app():
+    app = FastAPI(dependencies=[Depends(get_api_key)])
+
+    @app.get("/")
+    def read_root():
+        return {"Hello": "World"}
+
+    return app
+
+def test_api_key_success(settings_cf_disabled):
+    app = create_api_key_app()
+    app.state.rate_limiter = RateLimiter(settings_cf_disabled)
+    client = TestClient(app)
+    assert client.get("/", headers={"X-API-Key": "test_api_key"}).status_code == 200
+
+def test_api_key_failure(settings_cf_disabled):
+    app = create_api_key_app()
+    app.state.rate_limiter = RateLimiter(settings_cf_disabled)
+    client = TestClient(app)
+    assert client.get("/").status_code == 403
+    assert client.get("/", headers={"X-API-Key": "wrong_key"}).status_code == 403
+    # Non-ASCII keys are rejected rather than failing the comparison
+    assert client.get("/", headers={"X-API-Key": "t\u00e9st".encode()}).status_code == 403
+
+def test_rate_limit_per_api_key(settings_cf_disabled, tmp_path):
+    import json
+    keys_file = tmp_path / "api_keys.json"
+    keys_file.write_text(json.dumps({"automation": {"key": "automation_key", "requests": 2, "window": 60}}))
+    settings_cf_disabled.API_KEYS_FILE = str(keys_file)
+    app = FastAPI(dependencies=[Depends(rate_limit)])
+
+    @app.get("/")
+    def read_root():
+        return {"Hello": "World"}
+
+    app.state.rate_limiter = RateLimiter(settings_cf_disabled)
+    client = TestClient(app)
+
+    responses = [client.get("/", headers={"X-API-Key": "automation_key"}) for _ in range(3)]
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    assert responses[0].headers["X-RateLimit-Limit"] == "2"
+    assert responses[1].headers["X-RateLimit-Remaining"] == "0"
+    assert responses[2].json() == {"detail": {"error": "Rate limit exceeded"}}
+    assert int(responses[2].headers["Retry-After"]) >= 1
+    # Other keys have their own bucket
+    assert client.get("/", headers={"X-API-Key": "test_api_key"}).status_code == 200
+
+def test_rate_limit_reports_busy_store_as_unavailable(settings_cf_disabled, tmp_path):
+    import sqlite3
+    settings_cf_disabled.RATE_LIMIT_DB = str(tmp_path / "ratelimit.db")
+    app = FastAPI(dependencies=[Depends(rate_limit)])
+
+    @app.get("/")
+    def read_root():
+        return {"Hello": "World"}
+
+    app.state.rate_limiter = RateLimiter(settings_cf_disabled)
+    app.state.rate_limiter.store._conn.execute("PRAGMA busy_timeout = 0")
+    other = sqlite3.connect(settings_cf_disabled.RATE_LIMIT_DB, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    client = TestClient(app)
+
+    response = client.get("/", headers={"X-API-Key": "test_api_key"})
+    assert response.status_code == 503
+    assert response.json() == {"detail": {"error": "Rate limiter is busy"}}
+    assert response.headers["Retry-After"] == "1"
+
+    other.execute("ROLLBACK")
+    assert client.get("/", headers={"X-API-Key": "test_api_key"}).status_code == 200
@@ -1,4 +1,5 @@
 import pytest
+import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 from src.services.cast_service import CastService
 from src.config.settings import Settings
@@ -111,6 +112,45 @@ async def test_cast_service_play_audio_connection_error(cast_service, mocker):
 
     cast_service.discover_and_connect.assert_called_once_with("Test Device")
 
+@pytest.mark.asyncio
+async def test_cast_service_warm_session_reuses_receiver(settings, mocker):
+    from pychromecast.config import APP_MEDIA_RECEIVER
+    settings.CAST_WARM_SESSION = True
+    cast_service = CastService(settings)
+    mock_chromecast = create_mock_chromecast("Test Device", "test-uuid")
+    mock_chromecast.app_id = None
+    mock_chromecast.start_app.side_effect = lambda app_id: setattr(mock_chromecast, "app_id", app_id)
+
+    mocker.patch.object(cast_service, "_discover", new_callable=AsyncMock, return_value=mock_chromecast)
+    mock_sleep = mocker.patch("src.services.cast_service.asyncio.sleep", new_callable=AsyncMock)
+
+    await cast_service.warm_up("Test Device")
+    await cast_service.play_audio("http://example.com/1.wav", "Test Device")
+    await cast_service.play_audio("http://example.com/2.wav", "Test Device")
+
+    cast_service._discover.assert_called_once_with("Test Device")
+    mock_chromecast.start_app.assert_called_once_with(APP_MEDIA_RECEIVER)
+    assert mock_chromecast.media_controller.play_media.call_count == 2
+    mock_sleep.assert_not_called()
+    await cast_service.release("Test Device")
+
+@pytest.mark.asyncio
+async def test_cast_service_releases_idle_session(settings, mocker):
+    from pychromecast.config import APP_MEDIA_RECEIVER
+    settings.CAST_WARM_SESSION = True
+    settings.CAST_WARM_IDLE_TIMEOUT = 0.01
+    cast_service = CastService(settings)
+    mock_chromecast = create_mock_chromecast("Test Device", "test-uuid")
+    mock_chromecast.app_id = APP_MEDIA_RECEIVER
+
+    mocker.patch.object(cast_service, "_discover", new_callable=AsyncMock, return_value=mock_chromecast)
+
+    assert await cast_service.warm_up("Test Device") is mock_chromecast
+    await asyncio.sleep(0.1)
+
+    mock_chromecast.quit_app.assert_called_once()
+    mock_chromecast.disconnect.assert_called_once()
+
 @pytest.mark.asyncio
 async def test_cast_service_host_ip(settings, mocker):
     # Test when settings.HOST is 0.0.0.0
@@ -127,6 +167,31 @@ async def test_cast_service_host_ip(settings, mocker):
     assert cast_service.host_ip == "192.168.1.100"
     mock_get_local_ip.assert_not_called()
 
+def test_cast_service_audio_url_uses_route_to_device(settings, mock_browser_and_listener, mocker):
+    _, mock_listener = mock_browser_and_listener
+    mock_listener.devices = [create_mock_cast_info("Kitchen", "kitchen-uuid", host="10.20.0.5")]
+    mock_get_source_ip = mocker.patch("src.services.cast_service.get_source_ip", return_value="10.20.0.2")
+    settings.HOST = "0.0.0.0"
+    cast_service = CastService(settings)
+
+    assert cast_service.audio_url("ab/abc.wav", 8080, "Kitchen") == "http://10.20.0.2:8080/audio/ab/abc.wav"
+    mock_get_source_ip.assert_called_once_with("10.20.0.5")
+
+def test_cast_service_audio_url_unknown_device_uses_host_ip(settings, mock_browser_and_listener, mocker):
+    mocker.patch("src.services.cast_service.get_local_ip", return_value="192.168.1.1")
+    settings.HOST = "0.0.0.0"
+    cast_service = CastService(settings)
+
+    assert cast_service.audio_url("ab/abc.wav", 8080, "Missing") == "http://192.168.1.1:8080/audio/ab/abc.wav"
+
+def test_cast_service_audio_url_honors_external_url(settings, mocker):
+    mock_get_source_ip = mocker.patch("src.services.cast_service.get_source_ip")
+    settings.EXTERNAL_URL = "https://voicecast.example.com/"
+    cast_service = CastService(settings)
+
+    assert cast_service.audio_url("ab/abc.wav", 8080, "Kitchen") == "https://voicecast.example.com/audio/ab/abc.wav"
+    mock_get_source_ip.assert_not_called()
+
 @pytest.mark.asyncio
 async def test_cast_service_play_audio_stop_media(cast_service, mocker):
     mock_chromecast = create_mock_chromecast("Test Device", "test-uuid")
@@ -175,13 +240,14 @@ async def test_tts_service_generate_audio_http_error(tts_service, mocker):
     mock_deepgram_speak_rest_v = MagicMock()
     mock_deepgram_speak_rest_v.save = AsyncMock()
     mocker.patch("src.services.tts_service.asyncio.to_thread", side_effect=httpx.HTTPStatusError("Test HTTP Error", request=httpx.Request("POST", "url"), response=httpx.Response(400)))
-    mocker.patch.object(tts_service.deepgram.speak.rest, "v", return_value=mock_deepgram_speak_rest_v)
+    mocker.patch.object(tts_service.backend.deepgram.speak.rest, "v", return_value=mock_deepgram_speak_rest_v)
     mock_log_error = mocker.patch.object(tts_service.log, "error")
     mocker.patch("src.utils.discord_handler.DiscordHandler.emit")
 
     tts_request = MagicMock()
     tts_request.text = "Test text"
     tts_request.voice = "test-voice"
+    tts_request.speed = 1.0
 
     with pytest.raises(httpx.HTTPStatusError):
         await tts_service.generate_audio(tts_request)
@@ -194,13 +260,14 @@ async def test_tts_service_generate_audio_general_exception(tts_service, mocker)
     mock_deepgram_speak_rest_v = MagicMock()
     mock_deepgram_speak_rest_v.save = AsyncMock()
     mocker.patch("src.services.tts_service.asyncio.to_thread", side_effect=Exception("General error"))
-    mocker.patch.object(tts_service.deepgram.speak.rest, "v", return_value=mock_deepgram_speak_rest_v)
+    mocker.patch.object(tts_service.backend.deepgram.speak.rest, "v", return_value=mock_deepgram_speak_rest_v)
     mock_log_error = mocker.patch.object(tts_service.log, "error")
     mocker.patch("src.utils.discord_handler.DiscordHandler.emit")
 
     tts_request = MagicMock()
     tts_request.text = "Test text"
     tts_request.voice = "test-voice"
+    tts_request.speed = 1.0
 
     with pytest.raises(Exception, match="General error"):
         await tts_service.generate_audio(tts_request)
@@ -208,3 +275,280 @@ async def test_tts_service_generate_audio_general_exception(tts_service, mocker)
     mock_log_error.assert_called_once()
     assert "Error generating audio" in mock_log_error.call_args[0][0]
 
+
+def make_tts_request(text="Test text", voice="test-voice"):
+    tts_request = MagicMock()
+    tts_request.text = text
+    tts_request.voice = voice
+    tts_request.speed = 1.0
+    return tts_request
+
+def make_deepgram_response(data=b"audio"):
+    import io
+    response = MagicMock()
+    response.stream_memory = io.BytesIO(data)
+    return response
+
+@pytest.fixture
+def tts_settings(tmp_path):
+    return Settings(DEEPGRAM_API_KEY="test", AUDIO_OUTPUT_DIR=str(tmp_path), DEEPGRAM_TIMEOUT=0.2)
+
+@pytest.mark.asyncio
+async def test_tts_service_generate_audio_writes_file(tts_settings, mocker):
+    from src.services.tts_service import TTSService
+    tts_settings.AUDIO_TRIM_SILENCE = False
+    tts_settings.AUDIO_NORMALIZE_LOUDNESS = False
+    tts_service = TTSService(tts_settings)
+    import asyncio
+    to_thread = asyncio.to_thread
+
+    async def request_or_run(func, *args, **kwargs):
+        # Answer the Deepgram request, but write the file for real
+        if "timeout" in kwargs:
+            return make_deepgram_response(b"RIFF")
+        return await to_thread(func, *args, **kwargs)
+
+    mock_to_thread = mocker.patch("src.services.tts_service.asyncio.to_thread", new_callable=AsyncMock, side_effect=request_or_run)
+
+    file_path = await tts_service.generate_audio(make_tts_request())
+
+    with open(file_path, "rb") as f:
+        assert f.read() == b"RIFF"
+    assert file_path in tts_service.store.index
+    assert mock_to_thread.call_args_list[0].kwargs["timeout"].read == 0.2
+    assert mock_to_thread.call_args_list[1].args == (tts_service.store.write, tts_service.cache_key("Test text", "test-voice"), b"RIFF")
+
+@pytest.mark.asyncio
+async def test_tts_service_generate_audio_deadline(tts_settings, mocker):
+    import asyncio
+    from src.services.tts_service import TTSService
+    tts_service = TTSService(tts_settings)
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    mocker.patch.object(tts_service, "_request_audio", side_effect=hang)
+    mocker.patch.object(tts_service.log, "error")
+
+    with pytest.raises(TimeoutError):
+        await tts_service.generate_audio(make_tts_request())
+    assert len(tts_service.circuit_breaker._outcomes) == 1
+
+@pytest.mark.asyncio
+async def test_tts_service_hedged_request(tts_settings, mocker):
+    import asyncio
+    from src.services.tts_service import TTSService
+    tts_settings.DEEPGRAM_HEDGE_ENABLED = True
+    tts_settings.DEEPGRAM_HEDGE_MIN_SAMPLES = 1
+    tts_service = TTSService(tts_settings)
+    tts_service.latency_tracker.record(0.01)
+    calls = []
+
+    async def request_audio(text, voice):
+        calls.append(text)
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+        return b"hedged"
+
+    mocker.patch.object(tts_service, "_request_audio", side_effect=request_audio)
+
+    file_path = await tts_service.generate_audio(make_tts_request())
+
+    assert len(calls) == 2
+    with open(file_path, "rb") as f:
+        assert f.read() == b"hedged"
+
+@pytest.mark.asyncio
+async def test_tts_service_cancelled_trial_does_not_block_breaker(tts_settings, mocker):
+    import asyncio
+    from src.services.tts_service import TTSService
+    tts_settings.DEEPGRAM_HEDGE_ENABLED = True
+    tts_settings.DEEPGRAM_HEDGE_MIN_SAMPLES = 1
+    tts_service = TTSService(tts_settings)
+    tts_service.latency_tracker.record(5.0)
+    tts_service.circuit_breaker._state = tts_service.circuit_breaker.HALF_OPEN
+    started = asyncio.Event()
+    cancelled = []
+
+    async def hang(text, voice):
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(text)
+            raise
+
+    mocker.patch.object(tts_service, "_request_audio", side_effect=hang)
+    synthesis = asyncio.create_task(tts_service.generate_audio(make_tts_request()))
+    await started.wait()
+    synthesis.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await synthesis
+
+    # The request waiting for the hedge delay is cancelled, and the next call may try again
+    assert len(cancelled) == 1
+    assert tts_service.circuit_breaker.allow_request() is True
+
+@pytest.mark.asyncio
+async def test_tts_service_cancelled_request_keeps_trial_of_another(tts_settings, mocker):
+    import asyncio
+    from src.services.tts_service import TTSService
+    tts_service = TTSService(tts_settings)
+    started = asyncio.Event()
+
+    async def hang(text, voice):
+        started.set()
+        await asyncio.sleep(10)
+
+    mocker.patch.object(tts_service, "_request_audio", side_effect=hang)
+    # Started while the breaker was closed, so it holds no trial
+    synthesis = asyncio.create_task(tts_service.generate_audio(make_tts_request()))
+    await started.wait()
+    breaker = tts_service.circuit_breaker
+    breaker._state = breaker.HALF_OPEN
+    assert breaker.allow_request() is True
+
+    synthesis.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await synthesis
+
+    assert breaker.allow_request() is False
+
+@pytest.mark.asyncio
+async def test_tts_service_circuit_open_falls_back_to_chime(tts_settings, mocker):
+    from src.services.tts_service import TTSService, TTSUnavailableError
+    from src.utils.wav_utils import read_wav
+    tts_settings.DEEPGRAM_BREAKER_MIN_CALLS = 2
+    tts_service = TTSService(tts_settings)
+    mocker.patch.object(tts_service, "_request_audio", side_effect=Exception("Upstream error"))
+    mocker.patch.object(tts_service.log, "error")
+    mocker.patch.object(tts_service.log, "warning")
+
+    for _ in range(2):
+        with pytest.raises(Exception, match="Upstream error"):
+            await tts_service.generate_audio(make_tts_request())
+    tts_service._request_audio.reset_mock()
+
+    chime_path = await tts_service.generate_audio(make_tts_request())
+    with open(chime_path, "rb") as f:
+        assert read_wav(f.read()).params.sample_rate == tts_settings.AUDIO_SAMPLE_RATE
+
+    with pytest.raises(TTSUnavailableError):
+        await tts_service.generate_audio(make_tts_request(), fallback=False)
+    tts_service._request_audio.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_tts_service_client_error_does_not_trip_breaker(tts_settings, mocker):
+    from src.services.tts_service import TTSService
+    tts_service = TTSService(tts_settings)
+    error = httpx.HTTPStatusError("Bad request", request=httpx.Request("POST", "url"), response=httpx.Response(400))
+    mocker.patch.object(tts_service, "_request_audio", side_effect=error)
+    mocker.patch.object(tts_service.log, "error")
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await tts_service.generate_audio(make_tts_request())
+    assert tts_service.circuit_breaker._failures == 0
+
+@pytest.mark.asyncio
+async def test_tts_service_speed_variant_reuses_base_audio(tts_settings, mocker):
+    from src.services.tts_service import TTSService
+    from src.services.tts_backends import render_tone_speech
+    from src.utils.wav_utils import read_wav
+    tts_settings.AUDIO_TRIM_SILENCE = False
+    tts_service = TTSService(tts_settings)
+    base_audio = render_tone_speech("Test text", "test-voice", 8000)
+    mock_request_audio = mocker.patch.object(tts_service, "_request_audio", return_value=base_audio)
+
+    fast_request = make_tts_request()
+    fast_request.speed = 2.0
+    fast_path = await tts_service.generate_audio(fast_request)
+    slow_request = make_tts_request()
+    slow_request.speed = 0.5
+    await tts_service.generate_audio(slow_request)
+    assert await tts_service.generate_audio(fast_request) == fast_path
+
+    mock_request_audio.assert_called_once()
+    base_frames = len(read_wav(base_audio).frames)
+    with open(fast_path, "rb") as f:
+        fast_frames = len(read_wav(f.read()).frames)
+    assert abs(fast_frames - base_frames / 2) <= 2
+
+@pytest.mark.asyncio
+async def test_tts_service_postprocesses_and_caches_alongside_raw(tts_settings, mocker):
+    import numpy as np
+    from src.services.tts_service import TTSService
+    from src.services.tts_backends import render_tone_speech
+    from src.utils.audio_processing import decode_pcm16, measure_loudness
+    from src.utils.wav_utils import WavParams, encode_wav, read_wav
+    tts_service = TTSService(tts_settings)
+    speech = read_wav(render_tone_speech("Test text", "test-voice", 24000)).frames
+    raw_audio = encode_wav(WavParams(1, 2, 24000), b"\x00\x00" * 12000 + speech)
+    mock_request_audio = mocker.patch.object(tts_service, "_request_audio", return_value=raw_audio)
+
+    file_path = await tts_service.generate_audio(make_tts_request())
+
+    assert file_path == tts_service.get_audio_path("Test text", "test-voice", tts_service.postprocess_variant())
+    assert tts_service.get_cached_audio("Test text", "test-voice") is not None
+    with open(file_path, "rb") as f:
+        samples = decode_pcm16(read_wav(f.read()))
+    # Half a second of leading silence is trimmed down to the padding
+    assert np.abs(samples[:int(24000 * 0.06)]).max() > 0
+    assert measure_loudness(samples, 24000) == pytest.approx(tts_settings.AUDIO_TARGET_LOUDNESS, abs=0.5)
+
+    assert await tts_service.generate_audio(make_tts_request()) == file_path
+    mock_request_audio.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_cast_service_play_group_starts_devices_together(settings, mocker):
+    settings.CAST_GROUP_START_DELAY = 0.01
+    settings.CAST_WARM_SESSION = True
+    cast_service = CastService(settings)
+    chromecasts = {name: create_mock_chromecast(name, name) for name in ("Kitchen", "Office")}
+    for chromecast in chromecasts.values():
+        mc = chromecast.media_controller
+        mc.play_media.side_effect = lambda *args, mc=mc, **kwargs: setattr(mc.status, "player_state", "PAUSED")
+        mc.play.side_effect = lambda mc=mc: setattr(mc.status, "player_is_playing", True)
+    mocker.patch.object(cast_service, "warm_up", new_callable=AsyncMock, side_effect=lambda name: chromecasts.get(name))
+
+    result = await cast_service.play_group({
+        "Kitchen": "http://example.com/kitchen.wav",
+        "Office": "http://example.com/office.wav",
+        "Garage": "http://example.com/garage.wav",
+    })
+
+    chromecasts["Kitchen"].media_controller.play_media.assert_called_once_with("http://example.com/kitchen.wav", "audio/wav", autoplay=False)
+    for chromecast in chromecasts.values():
+        chromecast.media_controller.play.assert_called_once()
+    assert set(result["devices"]) == {"Kitchen", "Office"}
+    assert result["skew_ms"] >= 0
+    assert result["unreachable"] == ["Garage"]
+    assert result["not_loaded"] == []
+
+@pytest.mark.asyncio
+async def test_cast_service_play_group_leaves_out_devices_that_did_not_load(settings, mocker):
+    settings.CAST_GROUP_START_DELAY = 0.01
+    settings.CAST_PLAYBACK_TIMEOUT = 0.05
+    settings.CAST_WARM_SESSION = False
+    cast_service = CastService(settings)
+    chromecasts = {name: create_mock_chromecast(name, name) for name in ("Kitchen", "Office")}
+    for chromecast in chromecasts.values():
+        mc = chromecast.media_controller
+        mc.status.player_state = "IDLE"
+        mc.play.side_effect = lambda mc=mc: setattr(mc.status, "player_is_playing", True)
+    kitchen = chromecasts["Kitchen"].media_controller
+    kitchen.play_media.side_effect = lambda *args, **kwargs: setattr(kitchen.status, "player_state", "PAUSED")
+    mock_warm_up = mocker.patch.object(cast_service, "warm_up", new_callable=AsyncMock)
+    mocker.patch.object(cast_service, "_discover", new_callable=AsyncMock, side_effect=lambda name: chromecasts[name])
+
+    result = await cast_service.play_group({
+        "Kitchen": "http://example.com/kitchen.wav",
+        "Office": "http://example.com/office.wav",
+    })
+
+    mock_warm_up.assert_not_called()
+    kitchen.play.assert_called_once()
+    chromecasts["Office"].media_controller.play.assert_not_called()
+    assert set(result["devices"]) == {"Kitchen"}
+    assert result["not_loaded"] == ["Office"]
+    for chromecast in chromecasts.values():
+        chromecast.disconnect.assert_called_once()
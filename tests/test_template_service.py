@@ -0,0 +1,82 @@
+import pytest
+import json
+from src.config.settings import Settings
+from src.services.template_service import AnnouncementTemplate, TemplateService, load_templates
+from src.services.tts_service import TTSService
+from src.utils.wav_utils import WavParams, encode_wav, read_wav
+
+PARAMS = WavParams(channels=1, sample_width=2, sample_rate=24000)
+
+@pytest.fixture
+def settings(tmp_path):
+    return Settings(DEEPGRAM_API_KEY="test", AUDIO_OUTPUT_DIR=str(tmp_path / "audio"))
+
+@pytest.fixture
+def tts_service(settings, mocker):
+    service = TTSService(settings)
+    mocker.patch.object(service.log, "info")
+
+    async def generate_audio(tts_request, force=False, fallback=True, chime=None):
+        # Each fragment renders to two frames spelling out its first letter
+        frames = tts_request.text[0].encode() * 4
+        return service.save_audio(encode_wav(PARAMS, frames), tts_request.text, tts_request.voice)
+
+    mocker.patch.object(service, "generate_audio", side_effect=generate_audio)
+    return service
+
+@pytest.fixture
+def template_service(tts_service, settings):
+    templates = {
+        "package": AnnouncementTemplate("package", "Package delivered at {door}", {"door": ["front door", "back door"]}),
+    }
+    return TemplateService(tts_service, settings, templates)
+
+def test_template_parts():
+    template = AnnouncementTemplate("home", "{name} is home", {"name": ["Alice"]})
+    assert template.slot_names == ["name"]
+    assert template.fragments({"name": "Alice"}) == ["Alice", "is home"]
+    assert template.all_fragments() == ["is home", "Alice"]
+    assert template.missing_slots({}) == ["name"]
+    assert template.is_enumerated({"name": "Alice"})
+    assert not template.is_enumerated({"name": "Bob"})
+
+def test_load_templates(tmp_path):
+    templates_file = tmp_path / "templates.json"
+    templates_file.write_text(json.dumps({"home": {"template": "{name} is home", "slots": {"name": ["Alice"]}}}))
+    templates = load_templates(str(templates_file))
+    assert templates["home"].render({"name": "Alice"}) == "Alice is home"
+
+@pytest.mark.asyncio
+async def test_compose_enumerated_values(template_service, tts_service):
+    path = await template_service.compose("package", {"door": "front door"})
+
+    with open(path, "rb") as f:
+        audio = read_wav(f.read())
+    assert audio.params == PARAMS
+    assert audio.frames == b"PPPPffff"
+    texts = [call.args[0].text for call in tts_service.generate_audio.call_args_list]
+    assert texts == ["Package delivered at", "front door"]
+
+@pytest.mark.asyncio
+async def test_compose_reuses_composed_audio(template_service, tts_service):
+    first = await template_service.compose("package", {"door": "back door"})
+    tts_service.generate_audio.reset_mock()
+
+    assert await template_service.compose("package", {"door": "back door"}) == first
+    tts_service.generate_audio.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_compose_unseen_value_synthesizes_full_text(template_service, tts_service):
+    await template_service.compose("package", {"door": "garage"})
+
+    tts_service.generate_audio.assert_called_once()
+    assert tts_service.generate_audio.call_args[0][0].text == "Package delivered at garage"
+
+@pytest.mark.asyncio
+async def test_compose_format_mismatch_falls_back(template_service, tts_service, mocker):
+    mocker.patch("src.services.template_service.concat_wav", side_effect=ValueError("WAV format mismatch"))
+    mocker.patch.object(template_service.log, "warning")
+
+    await template_service.compose("package", {"door": "front door"})
+
+    assert tts_service.generate_audio.call_args[0][0].text == "Package delivered at front door"
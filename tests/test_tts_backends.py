@@ -0,0 +1,82 @@
+import pytest
+from src.config.settings import Settings
+from src.models.requests import TTSRequest
+from src.services.tts_backends import (
+    DeepgramBackend,
+    LocalToneBackend,
+    create_backend,
+    render_tone_speech,
+    shutdown_process_pool,
+)
+from src.services.tts_service import TTSService
+from src.utils.wav_utils import read_wav
+
+@pytest.fixture
+def settings(tmp_path):
+    return Settings(DEEPGRAM_API_KEY="test", AUDIO_OUTPUT_DIR=str(tmp_path), LOCAL_TTS_WORKERS=1)
+
+@pytest.fixture(autouse=True)
+def process_pool():
+    yield
+    shutdown_process_pool()
+
+def test_render_tone_speech_is_deterministic():
+    first = render_tone_speech("Laundry done.", "aura-2-helena-en", 8000)
+    assert first == render_tone_speech("Laundry done.", "aura-2-helena-en", 8000)
+    assert first != render_tone_speech("Laundry done.", "aura-2-thalia-en", 8000)
+
+    audio = read_wav(first)
+    assert audio.params.sample_rate == 8000
+    # Two words of at least 0.1 s each plus the pauses after them
+    assert len(audio.frames) // 2 >= 8000 * (0.1 + 0.05 + 0.1 + 0.25)
+
+def test_create_backend(settings):
+    assert isinstance(create_backend("deepgram", settings), DeepgramBackend)
+    assert isinstance(create_backend("local", settings), LocalToneBackend)
+    assert create_backend(None, settings) is None
+    with pytest.raises(ValueError, match="Unknown TTS backend"):
+        create_backend("espeak", settings)
+
+def test_deepgram_speak_options(settings):
+    backend = DeepgramBackend(settings)
+    assert backend.speak_options("aura-2-helena-en", "wav") == {
+        "model": "aura-2-helena-en",
+        "encoding": "linear16",
+        "container": "wav",
+        "sample_rate": settings.AUDIO_SAMPLE_RATE,
+    }
+    assert backend.speak_options("aura-2-helena-en", "mp3") == {"model": "aura-2-helena-en"}
+
+@pytest.mark.asyncio
+async def test_local_backend_synthesize(settings):
+    audio = await LocalToneBackend(settings).synthesize("Hello world", "voice", "wav")
+    assert audio == render_tone_speech("Hello world", "voice", settings.AUDIO_SAMPLE_RATE)
+
+@pytest.mark.asyncio
+async def test_local_backend_rejects_other_formats(settings):
+    with pytest.raises(ValueError):
+        await LocalToneBackend(settings).synthesize("Hello world", "voice", "mp3")
+
+@pytest.mark.asyncio
+async def test_tts_service_with_local_backend(settings):
+    settings.TTS_BACKEND = "local"
+    tts_service = TTSService(settings)
+    file_path = await tts_service.generate_audio(TTSRequest(text="Laundry done", voice="voice"))
+
+    assert file_path == tts_service.get_audio_path("Laundry done", "voice", tts_service.postprocess_variant())
+    with open(tts_service.get_audio_path("Laundry done", "voice"), "rb") as f:
+        assert f.read() == render_tone_speech("Laundry done", "voice", settings.AUDIO_SAMPLE_RATE)
+
+@pytest.mark.asyncio
+async def test_tts_service_falls_back_to_local_backend(settings, mocker):
+    settings.TTS_FALLBACK_BACKEND = "local"
+    tts_service = TTSService(settings)
+    mocker.patch.object(tts_service.backend, "synthesize", side_effect=Exception("Deepgram down"))
+    mocker.patch.object(tts_service.log, "error")
+    mocker.patch.object(tts_service.log, "warning")
+
+    file_path = await tts_service.generate_audio(TTSRequest(text="Laundry done", voice="voice"))
+
+    assert file_path == tts_service.get_audio_path("Laundry done", "voice", backend="local")
+    # Fallback audio must not be served as a cache hit for the primary backend
+    assert tts_service.get_cached_audio("Laundry done", "voice") is None
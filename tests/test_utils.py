@@ -1,4 +1,5 @@
-from src.utils.network_utils import get_local_ip
+from src.utils import network_utils
+from src.utils.network_utils import get_local_ip, get_source_ip
 from unittest.mock import patch
 import builtins
 
@@ -28,4 +29,44 @@ def test_get_local_ip_finally_close(mock_socket):
 
     ip = get_local_ip()
     assert ip == "127.0.0.1"
-    mock_close.assert_called_once()
\ No newline at end of file
+    mock_close.assert_called_once()
+def test_concat_wav():
+    from src.utils.wav_utils import WavParams, concat_wav, encode_wav, read_wav
+    params = WavParams(channels=1, sample_width=2, sample_rate=24000)
+    joined = read_wav(concat_wav([encode_wav(params, b"\x01\x00"), encode_wav(params, b"\x02\x00\x03\x00")]))
+    assert joined.params == params
+    assert joined.frames == b"\x01\x00\x02\x00\x03\x00"
+
+def test_read_wav_placeholder_data_size():
+    import struct
+    from src.utils.wav_utils import WavParams, encode_wav, read_wav
+    data = bytearray(encode_wav(WavParams(1, 2, 24000), b"\x01\x00\x02\x00"))
+    data[40:44] = struct.pack("<I", 0xFFFFFFFF)
+    assert read_wav(bytes(data)).frames == b"\x01\x00\x02\x00"
+
+def test_concat_wav_format_mismatch():
+    import pytest
+    from src.utils.wav_utils import WavParams, concat_wav, encode_wav
+    with pytest.raises(ValueError):
+        concat_wav([encode_wav(WavParams(1, 2, 24000), b""), encode_wav(WavParams(1, 2, 16000), b"")])
+
+@patch('socket.socket')
+def test_get_source_ip_is_cached_per_destination(mock_socket):
+    network_utils._source_ips.clear()
+    mock_socket.return_value.getsockname.return_value = ["10.20.0.2", 40000]
+
+    assert get_source_ip("10.20.0.5") == "10.20.0.2"
+    assert get_source_ip("10.20.0.5") == "10.20.0.2"
+
+    mock_socket.return_value.connect.assert_called_once_with(("10.20.0.5", 9))
+    network_utils._source_ips.clear()
+
+@patch('src.utils.network_utils.get_local_ip', return_value="192.168.1.1")
+@patch('socket.socket')
+def test_get_source_ip_falls_back_to_local_ip(mock_socket, mock_get_local_ip):
+    network_utils._source_ips.clear()
+    mock_socket.return_value.connect.side_effect = OSError("Network is unreachable")
+
+    assert get_source_ip("10.99.0.5") == "192.168.1.1"
+    mock_socket.return_value.close.assert_called_once()
+    network_utils._source_ips.clear()